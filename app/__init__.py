@@ -1,28 +1,13 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 
-app = Flask(__name__)
-from .config import Config # Import the Config class
-app.config.from_object(Config) # Load config from Config class
-
-# Update SQLALCHEMY_DATABASE_URI to also come from config or use a default
-app.config.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///app.db')
-app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-
-from app import routes, models # Import models here
-from app.llm_service import init_llm_client
-
-# Initialize LLM client
-init_llm_client(app)
-
-# Initialize Flask-Login
+# Extensions are created unbound and attached to each app by create_app()
+db = SQLAlchemy()
+migrate = Migrate()
 login_manager = LoginManager()
-login_manager.init_app(app)
 # The login view for google_bp (named 'google' by default from make_google_blueprint)
 # registered under auth_bp will be 'auth_bp.google.login'
 login_manager.login_view = 'auth_bp.google.login'
@@ -30,24 +15,78 @@ login_manager.login_view = 'auth_bp.google.login'
 # User loader callback for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    # Ensure models are imported before this is called, or move User import here
-    from app.models import User
-    return User.query.get(int(user_id))
+    # A cached snapshot for up to USER_CACHE_TTL seconds instead of a query on every request
+    from app.user_cache import load_cached_user
+    return load_cached_user(int(user_id))
 
-# Import and register blueprints
-from .auth_routes import auth_bp
-app.register_blueprint(auth_bp)
-
-@app.context_processor
 def utility_processor():
     from flask_login import current_user # Import current_user here
+    from app.user_cache import render_preferences
     def get_current_theme():
-        if current_user.is_authenticated and hasattr(current_user, 'settings') and current_user.settings:
-            return current_user.settings.theme
+        if current_user.is_authenticated:
+            return render_preferences(current_user)['theme'] # From the session, not UserSettings
         return 'system' # Default if no user, no settings, or no theme set on settings
     return dict(get_current_theme=get_current_theme)
 
-# It's common to also register the specific OAuth blueprint (google_bp) if it's not nested,
-# but since google_bp is registered with auth_bp, registering auth_bp is sufficient.
-# from .auth_routes import google_bp
-# app.register_blueprint(google_bp, url_prefix="/login") # Example if not nested
+def create_app(config=None):
+    """Build the app. `config` (a dict or a config class/object) is applied over app.config.Config.
+
+    Importing this package builds nothing: run.py holds the served app, and `flask --app app:create_app`
+    (which `flask --app app` finds as well) builds one per CLI command.
+    """
+    app = Flask(__name__)
+    from .config import Config # Import the Config class
+    app.config.from_object(Config) # Load config from Config class
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    # Update SQLALCHEMY_DATABASE_URI to also come from config or use a default
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', os.environ.get('DATABASE_URL', 'sqlite:///app.db')) # DATABASE_URL: benchmarks, deployments
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+
+    # WAL/busy timeout etc. for SQLite, pool settings for server databases (app/db_tuning.py)
+    from app.db_tuning import configure_engine_options, init_db_tuning
+    configure_engine_options(app)
+    db.init_app(app)
+    init_db_tuning(app, db)
+    migrate.init_app(app, db)
+
+    from app import models # Import models here
+    from app.routes import init_routes
+    init_routes(app)
+
+    # Initialize LLM client (the Google SDK itself is only imported on the first Gemini call)
+    from app.llm_service import init_llm_client
+    init_llm_client(app)
+
+    # Request/SQL metrics and the /metrics endpoint
+    from app.instrumentation import init_instrumentation
+    init_instrumentation(app, db)
+
+    # Per-process cache of the logged-in user and their settings (app/user_cache.py)
+    from app.user_cache import init_user_cache
+    init_user_cache(app)
+
+    # Rendered recipe-list rows cached per recipe version (app/fragment_cache.py)
+    from app.fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
+
+    # Initialize Flask-Login
+    login_manager.init_app(app)
+
+    # Import and register blueprints
+    from .auth_routes import auth_bp
+    app.register_blueprint(auth_bp)
+
+    # `flask llm-standin`: local fake LLM providers for offline load/latency testing
+    from .llm_standin import llm_standin_command
+    app.cli.add_command(llm_standin_command)
+
+    # `flask recipes import|export`: bulk JSONL/CSV catalog transfer
+    from .recipe_io import recipes_cli
+    app.cli.add_command(recipes_cli)
+
+    app.context_processor(utility_processor)
+    return app
@@ -1,10 +1,11 @@
-from flask import Blueprint, redirect, url_for, current_app, flash
+from flask import Blueprint, redirect, url_for, current_app, flash, session
 from flask_dance.contrib.google import make_google_blueprint
 from flask_dance.consumer import oauth_authorized, oauth_error
 from flask_login import login_user, logout_user
 # Assuming 'db' and 'User' are accessible from '.models' relative to 'app' directory
 # If app factory pattern is used, db might be imported differently or accessed via current_app.
 from .models import db, User
+from .user_cache import RENDER_PREFS_KEY, invalidate_user, store_render_preferences
 from . import login_manager # To potentially refresh user or for other login_manager uses
 
 auth_bp = Blueprint('auth_bp', __name__, url_prefix='/auth')
@@ -62,7 +63,9 @@ def google_auth_authorized_callback(blueprint, token): # Renamed for clarity
 
     try:
         db.session.commit()
+        invalidate_user(user.id) # Name/picture may have changed; drop this worker's cached copy
         login_user(user)
+        store_render_preferences(user.id, user.settings)
         flash("Successfully logged in with Google!", "success")
     except Exception as e:
         db.session.rollback()
@@ -89,6 +92,7 @@ def google_oauth_error_handler(blueprint, message, error=None, error_description
 @auth_bp.route('/logout')
 def logout():
     logout_user()
+    session.pop(RENDER_PREFS_KEY, None)
     flash("You have been logged out.", "info")
     return redirect(url_for('index')) # Main index route
 
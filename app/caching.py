@@ -0,0 +1,182 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Small caching building blocks shared across the app: a thread-safe in-process LRU with
+# per-entry expiry, a persistent SQLite-backed tier, and a two-tier front for both.
+# Cached values must be JSON-serializable to go through the persistent tier.
+
+
+class LRUCache:
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl # Seconds; None keeps entries until evicted
+        self._entries = OrderedDict() # key -> (expires_at or None, value), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Persistent key/value tier stored in its own SQLite file.
+
+    Survives restarts and is shared by every worker process on the host. Storage errors
+    are logged and treated as misses so a broken cache file never breaks the caller.
+    """
+
+    PRUNE_EVERY = 500 # Writes between sweeps of expired rows
+
+    def __init__(self, path, ttl=None, table='cache_entries'):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self._conn = None # Opened on first use
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL") # Readers in other workers don't block writers
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key, default=None):
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    f"SELECT value FROM {self.table} WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                    (key, time.time())).fetchone()
+        except sqlite3.Error as e:
+            print(f"Persistent cache read failed ({self.path}): {e}")
+            return default
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                             (key, json.dumps(value), expires_at))
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            print(f"Persistent cache write failed ({self.path}): {e}")
+
+    def delete(self, key):
+        try:
+            with self._lock:
+                self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Persistent cache delete failed ({self.path}): {e}")
+
+    def clear(self):
+        try:
+            with self._lock:
+                self._connection().execute(f"DELETE FROM {self.table}")
+        except sqlite3.Error as e:
+            print(f"Persistent cache clear failed ({self.path}): {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TieredCache:
+    """In-process LRU in front of an optional persistent tier, with hit/miss counters.
+
+    Hits from the persistent tier are promoted into memory. `stats` counts memory_hits,
+    persistent_hits, misses and stores since startup.
+    """
+
+    def __init__(self, memory, persistent=None):
+        self.memory = memory
+        self.persistent = persistent
+        self._stats_lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        if self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                self._count('persistent_hits')
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            self.persistent.set(key, value)
+        self._count('stores')
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.persistent is not None:
+            self.persistent.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def close(self):
+        if self.persistent is not None:
+            self.persistent.close()
+
+    def hit_ratio(self):
+        hits = self.stats['memory_hits'] + self.stats['persistent_hits']
+        lookups = hits + self.stats['misses']
+        return hits / lookups if lookups else 0.0
@@ -18,6 +18,99 @@ class Config:
     # if os.environ.get('FLASK_ENV') == 'development' and not GOOGLE_OAUTH_CLIENT_ID.startswith('YOUR'):
     #     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+    # Database engine tuning (app/db_tuning.py): 'tuned' applies the settings below, 'default' leaves
+    # SQLAlchemy/driver defaults. The SQLITE_* ones apply to SQLite, the DB_POOL_* ones to server databases.
+    DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'tuned')
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL') # FULL to fsync every commit
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) # Wait this long for the write lock
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20000)) # Page cache per connection
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)) # Bytes; 0 disables memory-mapped reads
+    SQLITE_FOREIGN_KEYS = os.environ.get('SQLITE_FOREIGN_KEYS', 'true').lower() in ['true', 'on', '1']
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10)) # Connections kept per worker process
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20)) # Extra connections under bursts
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30)) # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800)) # Seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+
+    # Recipe list pagination (keyset/cursor based, see app/pagination.py)
+    RECIPES_PER_PAGE = int(os.environ.get('RECIPES_PER_PAGE', 20))
+    RECIPES_MAX_PER_PAGE = int(os.environ.get('RECIPES_MAX_PER_PAGE', 100)) # Upper bound for ?per_page=
+    RECIPE_SEARCH_LIMIT = int(os.environ.get('RECIPE_SEARCH_LIMIT', 25)) # Max results for /recipes/search
+    # Search ranks only the newest N matches by bm25 when a query has more than N (the page says so).
+    # Ranking all 41k 'chicken' matches of a 100k catalog takes ~38 ms; with 1000, every bench_search.py
+    # query stays under 10 ms. 0 ranks every match.
+    RECIPE_SEARCH_RANK_CAP = int(os.environ.get('RECIPE_SEARCH_RANK_CAP', 1000))
+
+    # Conditional GETs for recipe pages (app/http_cache.py). Part of every page ETag: change it when a
+    # deploy changes templates, or browsers keep revalidating their old copies as current.
+    HTTP_CACHE_VERSION = os.environ.get('HTTP_CACHE_VERSION', '1')
+    # Rendered /recipes rows kept per process (app/fragment_cache.py); 0 renders every row every time
+    RECIPE_FRAGMENT_CACHE_SIZE = int(os.environ.get('RECIPE_FRAGMENT_CACHE_SIZE', 2000))
+    RECIPE_FRAGMENT_CACHE_HEADER = os.environ.get('RECIPE_FRAGMENT_CACHE_HEADER', 'false').lower() in ['true', 'on', '1'] # X-Fragment-Cache debug header
+
+    # Bulk recipe import/export (app/recipe_io.py)
+    RECIPE_IMPORT_BATCH_SIZE = int(os.environ.get('RECIPE_IMPORT_BATCH_SIZE', 1000)) # Rows per bulk INSERT and commit
+    RECIPE_EXPORT_YIELD_PER = int(os.environ.get('RECIPE_EXPORT_YIELD_PER', 1000)) # Rows fetched per round trip
+
+    # Hugging Face Inference API HTTP client: one keep-alive session with a bounded connection pool
+    HF_API_BASE_URL = os.environ.get('HF_API_BASE_URL', 'https://api-inference.huggingface.co/models')
+    HF_API_POOL_CONNECTIONS = int(os.environ.get('HF_API_POOL_CONNECTIONS', 2)) # Distinct hosts kept pooled
+    HF_API_POOL_MAXSIZE = int(os.environ.get('HF_API_POOL_MAXSIZE', 10)) # Connections per host, ~ concurrent calls
+    HF_API_MAX_RETRIES = int(os.environ.get('HF_API_MAX_RETRIES', 2)) # Connection errors and 502s only
+    HF_API_RETRY_BACKOFF = float(os.environ.get('HF_API_RETRY_BACKOFF', 0.5))
+    GEMINI_CLIENT_POOL_SIZE = int(os.environ.get('GEMINI_CLIENT_POOL_SIZE', 64)) # API keys with a cached Gemini client
+    GEMINI_API_ENDPOINT = os.environ.get('GEMINI_API_ENDPOINT') # e.g. http://127.0.0.1:8765 for `flask llm-standin`; unset: Google
+    # "Fastest" provider mode: start the backup provider if the primary hasn't answered after this many seconds
+    LLM_HEDGE_DELAY = float(os.environ.get('LLM_HEDGE_DELAY', 2.0)) # 0 races all providers at once
+    LLM_HEDGE_WORKERS = int(os.environ.get('LLM_HEDGE_WORKERS', 8))
+    # Batch generation (/generate-recipe-llm/batch): one shared thread pool, calls per provider capped
+    # across all batches in the process, and per-batch limits
+    LLM_BATCH_WORKERS = int(os.environ.get('LLM_BATCH_WORKERS', 8))
+    LLM_PROVIDER_CONCURRENCY = int(os.environ.get('LLM_PROVIDER_CONCURRENCY', 4))
+    LLM_BATCH_MAX_PROMPTS = int(os.environ.get('LLM_BATCH_MAX_PROMPTS', 14)) # Two weeks of dinners
+    LLM_BATCH_CONCURRENCY = int(os.environ.get('LLM_BATCH_CONCURRENCY', 4)) # One batch's calls in flight
+
+    # Per provider/model circuit breakers and adaptive timeouts (app/resilience.py)
+    LLM_BREAKER_WINDOW = int(os.environ.get('LLM_BREAKER_WINDOW', 20)) # Recent calls the failure rate is computed over
+    LLM_BREAKER_FAILURE_RATE = float(os.environ.get('LLM_BREAKER_FAILURE_RATE', 0.5)) # Failure share that opens the circuit
+    LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', 5)) # Calls needed before it can open
+    LLM_BREAKER_RESET_TIMEOUT = float(os.environ.get('LLM_BREAKER_RESET_TIMEOUT', 30)) # Seconds open before a probe call
+    LLM_TIMEOUT_MIN = float(os.environ.get('LLM_TIMEOUT_MIN', 10)) # Seconds; floor for the adaptive timeout
+    LLM_TIMEOUT_MAX = float(os.environ.get('LLM_TIMEOUT_MAX', 45)) # Ceiling, and the timeout until enough calls are seen
+    LLM_TIMEOUT_QUANTILE = float(os.environ.get('LLM_TIMEOUT_QUANTILE', 0.99))
+    LLM_TIMEOUT_MULTIPLIER = float(os.environ.get('LLM_TIMEOUT_MULTIPLIER', 1.5)) # Headroom over the observed quantile
+
+    # LLM response cache: in-process LRU in front of a SQLite file (default instance/llm_cache.sqlite3)
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    LLM_CACHE_MEMORY_SIZE = int(os.environ.get('LLM_CACHE_MEMORY_SIZE', 256)) # Entries kept per process
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600)) # Seconds
+    LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH') # Unset: instance folder; empty: memory only
+
+    # /metrics (app/instrumentation.py). With several worker processes set METRICS_MULTIPROC_DIR to a
+    # directory shared by all of them (emptied on restart) so /metrics reports every worker's numbers.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') # Unset: this process only
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0)) # Seconds between worker snapshots
+    # Scrapers send "Authorization: Bearer <token>". Unset: /metrics answers 404 unless DEBUG or TESTING is on
+    METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN')
+
+    # Per-view SQL statement budgets (@query_budget, app/query_budget.py): 'raise', 'warn' or 'off'.
+    # Unset: raise under TESTING, off otherwise.
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE')
+
+    # Logged-in user + settings snapshot cached per process by the user_loader (app/user_cache.py).
+    # Changes made through the app show up immediately for the session that made them.
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30)) # Seconds; 0 loads the user on every request
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024)) # Users kept per process
+
+    # Background LLM jobs (app/jobs.py)
+    LLM_JOB_WORKERS = int(os.environ.get('LLM_JOB_WORKERS', 4)) # Threads per process running provider calls; 0 runs inline
+    LLM_JOB_QUEUE_LIMIT = int(os.environ.get('LLM_JOB_QUEUE_LIMIT', 32)) # Pending jobs per process before 503
+    LLM_JOB_MAX_PER_USER = int(os.environ.get('LLM_JOB_MAX_PER_USER', 3)) # Concurrent jobs per user before 429
+    LLM_JOB_TIMEOUT = int(os.environ.get('LLM_JOB_TIMEOUT', 180)) # Seconds before an unfinished job is reported as lost
+    LLM_JOB_RETENTION_HOURS = int(os.environ.get('LLM_JOB_RETENTION_HOURS', 24))
+
 # To use this config:
 # from app.config import Config
 # app.config.from_object(Config)
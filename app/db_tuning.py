@@ -0,0 +1,68 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Engine settings for production use, chosen by DB_ENGINE_PROFILE: 'tuned' (default) or 'default',
+# which leaves SQLAlchemy and the driver alone (benchmarks/bench_db_writes.py compares the two).
+#
+# SQLite gets per-connection PRAGMAs from a connect event: WAL so readers and the writer don't block
+# each other, synchronous=NORMAL (one fsync per checkpoint instead of per commit; safe against app
+# crashes, a power loss can drop the last commits), a busy timeout so a writer waits for the lock
+# instead of failing with "database is locked", a larger page cache, mmap reads and enforced foreign
+# keys. Server databases (PostgreSQL, MySQL) get pool sizing, pre-ping and recycling instead.
+
+
+def _is_sqlite(app):
+    return make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'sqlite'
+
+
+def _tuned(app):
+    return app.config.get('DB_ENGINE_PROFILE', 'tuned') == 'tuned'
+
+
+def engine_options(app):
+    # Pool options for SQLALCHEMY_ENGINE_OPTIONS; anything set there explicitly wins
+    if not _tuned(app) or _is_sqlite(app):
+        return {}
+    return {'pool_size': app.config.get('DB_POOL_SIZE', 10),
+            'max_overflow': app.config.get('DB_MAX_OVERFLOW', 20),
+            'pool_timeout': app.config.get('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': app.config.get('DB_POOL_RECYCLE', 1800), # Below typical server/proxy idle timeouts
+            'pool_pre_ping': app.config.get('DB_POOL_PRE_PING', True)}
+
+
+def sqlite_pragmas(config):
+    pragmas = [f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+               f"PRAGMA journal_mode = {config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+               f"PRAGMA synchronous = {config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+               f"PRAGMA cache_size = -{int(config.get('SQLITE_CACHE_SIZE_KB', 20000))}", # Negative: KiB, not pages
+               f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_SIZE', 0))}"]
+    if config.get('SQLITE_FOREIGN_KEYS', True):
+        pragmas.append("PRAGMA foreign_keys = ON")
+    return pragmas
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def configure_engine_options(app):
+    # Before db.init_app(app): Flask-SQLAlchemy creates the engine from these
+    options = engine_options(app)
+    if options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+
+def init_db_tuning(app, db):
+    # After db.init_app(app), before anything connects
+    if not _tuned(app) or not _is_sqlite(app):
+        return
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'connect', _pragma_listener(sqlite_pragmas(app.config)))
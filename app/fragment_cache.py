@@ -0,0 +1,76 @@
+from flask import current_app, g, request
+from markupsafe import Markup
+
+from app.caching import LRUCache
+from app.metrics import registry
+
+# Per-process cache of rendered recipe-list rows (templates/_recipe_item.html), so /recipes only
+# renders the rows that changed. Entries are keyed by recipe id and hold (stamp, html), where the
+# stamp is the recipe's version and updated_at plus what else the markup depends on. A stale stamp is a miss, so
+# edits and imports made by other worker processes never show old rows. edit_recipe/delete_recipe
+# also drop this process's entry right away, so memory isn't held for rows that can't be hit again.
+# Rows have no per-user markup and are shared by all users.
+#
+# With RECIPE_FRAGMENT_CACHE_HEADER (or in debug mode) responses carry this request's hit rate:
+#   X-Fragment-Cache: hits=18; misses=2; hit-rate=0.90
+
+FRAGMENT_TEMPLATE = '_recipe_item.html'
+DEBUG_HEADER = 'X-Fragment-Cache'
+STATS_KEY = 'fragment_cache_stats'
+
+FRAGMENT_LOOKUPS = registry.counter('recipe_fragment_cache_lookups_total', 'Recipe list row cache lookups', ('result',))
+
+
+def get_fragment_cache():
+    return current_app.extensions['fragment_cache'] # Built per app by init_fragment_cache
+
+
+def recipe_fragments(recipes):
+    """Rendered list rows for `recipes`, from the cache where the recipe's version still matches."""
+    fragment_cache = get_fragment_cache()
+    template = None
+    fragments, hits = [], 0
+    for recipe in recipes:
+        # updated_at too: SQLite can hand a deleted recipe's id to a new one, also at version 1. Links are
+        # relative to the mount point, and templates change between deploys.
+        stamp = (recipe.version, recipe.updated_at, request.script_root, current_app.config['HTTP_CACHE_VERSION'])
+        entry = fragment_cache.get(recipe.id)
+        if entry is not None and entry[0] == stamp:
+            hits += 1
+            fragments.append(entry[1])
+            continue
+        template = template or current_app.jinja_env.get_template(FRAGMENT_TEMPLATE)
+        html = Markup(template.render(recipe=recipe))
+        fragment_cache.set(recipe.id, (stamp, html))
+        fragments.append(html)
+    misses = len(fragments) - hits
+    stats = g.setdefault(STATS_KEY, {'hits': 0, 'misses': 0})
+    stats['hits'] += hits
+    stats['misses'] += misses
+    FRAGMENT_LOOKUPS.inc('hit', amount=hits)
+    FRAGMENT_LOOKUPS.inc('miss', amount=misses)
+    return fragments
+
+
+def invalidate_recipe(recipe_id):
+    # Call after committing an edit or delete of the recipe
+    get_fragment_cache().delete(recipe_id)
+
+
+def _reset_stats():
+    g.pop(STATS_KEY, None) # g outlives the request when an app context was already pushed (tests, CLI)
+
+
+def _debug_header(response):
+    stats = g.get(STATS_KEY)
+    if stats and (current_app.debug or current_app.config.get('RECIPE_FRAGMENT_CACHE_HEADER')):
+        lookups = stats['hits'] + stats['misses']
+        response.headers[DEBUG_HEADER] = (f"hits={stats['hits']}; misses={stats['misses']}; "
+                                          f"hit-rate={stats['hits'] / lookups if lookups else 0:.2f}")
+    return response
+
+
+def init_fragment_cache(app):
+    app.extensions['fragment_cache'] = LRUCache(maxsize=app.config.get('RECIPE_FRAGMENT_CACHE_SIZE', 2000))
+    app.before_request(_reset_stats)
+    app.after_request(_debug_header)
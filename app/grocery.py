@@ -0,0 +1,235 @@
+from datetime import datetime
+
+from sqlalchemy import case, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.ingredients import format_grocery_item
+from app.models import GroceryList, GroceryListItem, GroceryListRecipe, Recipe, RecipeIngredient, ingredient_item_values
+
+# Saved grocery lists, maintained incrementally.
+#
+# A list's items are the (name, unit) totals of its recipes: summed quantity, line count and
+# quantified line count, exactly the columns of the grocery list GROUP BY over RecipeIngredient.
+# Adding or removing a recipe applies that recipe's totals as a delta instead of re-aggregating every
+# recipe on the list, and the before_flush hook below does the same for recipes that are edited or
+# deleted while on someone's list.
+#
+# Totals are dicts {(name, unit): (quantity, line_count, quantified_count)}, quantity 0.0 when no line
+# had one. Deltas are added by the database itself (INSERT ... ON CONFLICT DO UPDATE on the unique
+# item key), and which recipes a change adds or removes is decided by the link rows it actually
+# inserted or deleted, so concurrent changes to the same list add up rather than overwrite each other.
+# Databases without ON CONFLICT and RETURNING (MySQL) get the same guarantees from plain statements:
+# update-then-insert in a savepoint on the unique key, and SELECT ... FOR UPDATE before a DELETE.
+
+_INSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert} # Same on_conflict_* API on both
+
+
+def _conflict_insert(table):
+    # INSERT with on_conflict_* and RETURNING, or None on a dialect without them
+    insert_for_dialect = _INSERTS.get(db.session.get_bind().dialect.name)
+    return insert_for_dialect(table) if insert_for_dialect else None
+
+
+def _insert_unless_duplicate(table, values):
+    # Plain INSERT in a savepoint; a unique key violation (a concurrent request inserted it first) gives None
+    try:
+        with db.session.begin_nested():
+            return db.session.execute(insert(table).values(values)).inserted_primary_key
+    except IntegrityError:
+        return None
+
+
+def recipe_totals(recipe_ids):
+    """Combined totals of the stored ingredient rows of `recipe_ids` (one indexed GROUP BY)."""
+    if not recipe_ids:
+        return {}
+    rows = (db.session.query(RecipeIngredient.normalized_name, RecipeIngredient.unit,
+                             func.sum(RecipeIngredient.quantity), func.count(RecipeIngredient.id),
+                             func.count(RecipeIngredient.quantity))
+            .filter(RecipeIngredient.recipe_id.in_(recipe_ids))
+            .group_by(RecipeIngredient.normalized_name, RecipeIngredient.unit))
+    return {(name, unit): (quantity or 0.0, lines, quantified) for name, unit, quantity, lines, quantified in rows}
+
+
+def text_totals(ingredients_text):
+    # The totals RecipeIngredient rows built from this text will have, before they are written
+    totals = {}
+    for values in ingredient_item_values(ingredients_text):
+        key = (values['normalized_name'], values['unit'])
+        quantity, lines, quantified = totals.get(key, (0.0, 0, 0))
+        if values['quantity'] is not None:
+            quantity, quantified = quantity + values['quantity'], quantified + 1
+        totals[key] = (quantity, lines + 1, quantified)
+    return totals
+
+
+def subtract_totals(new, old):
+    delta = dict(new)
+    for key, (quantity, lines, quantified) in old.items():
+        new_quantity, new_lines, new_quantified = delta.get(key, (0.0, 0, 0))
+        delta[key] = (new_quantity - quantity, new_lines - lines, new_quantified - quantified)
+    return {key: value for key, value in delta.items() if value[1] or value[2] or value[0]}
+
+
+def apply_delta(grocery_list, delta):
+    # One executemany upsert adds the delta to each item row (creating missing ones), then items left
+    # without lines are deleted in the same transaction. Nothing is computed from the loaded items.
+    if not delta:
+        return
+    session = db.session
+    table = GroceryListItem.__table__
+    rows = [{'grocery_list_id': grocery_list.id, 'normalized_name': name, 'unit': unit,
+             'quantity': quantity if quantified or quantity else None, 'line_count': lines, 'quantified_count': quantified}
+            for (name, unit), (quantity, lines, quantified) in delta.items()]
+    upsert = _conflict_insert(table)
+    if upsert is None:
+        for row in rows:
+            _add_to_item(table, row)
+    else:
+        quantified_count = table.c.quantified_count + upsert.excluded.quantified_count
+        upsert = upsert.on_conflict_do_update(index_elements=GroceryListItem.key_columns(table), set_={
+            'line_count': table.c.line_count + upsert.excluded.line_count,
+            'quantified_count': quantified_count,
+            # Float sums drift slightly when quantities are subtracted again; display rounds to 2 places
+            'quantity': case((quantified_count > 0, func.coalesce(table.c.quantity, 0.0) + func.coalesce(upsert.excluded.quantity, 0.0)),
+                             else_=None),
+        })
+        session.execute(upsert, rows)
+    if any(lines < 0 for _, lines, _ in delta.values()): # Only a removal can bring an item down to no lines
+        session.execute(delete(table).where(table.c.grocery_list_id == grocery_list.id, table.c.line_count <= 0))
+    if 'items' not in inspect(grocery_list).unloaded:
+        for item in grocery_list.items:
+            session.expire(item)
+        session.expire(grocery_list, ['items']) # Reloaded (one query) on next access
+    grocery_list.updated_at = datetime.utcnow()
+
+
+def _add_to_item(table, row):
+    # The upsert above without ON CONFLICT: add to the item row, or insert it when there is none yet
+    key = (table.c.grocery_list_id == row['grocery_list_id'], table.c.normalized_name == row['normalized_name'],
+           func.coalesce(table.c.unit, '') == (row['unit'] or ''))
+    # quantity first: MySQL evaluates SET left to right, so it must still see the old quantified_count
+    add = update(table).where(*key).ordered_values(
+        (table.c.quantity, case((table.c.quantified_count + row['quantified_count'] > 0,
+                                 func.coalesce(table.c.quantity, 0.0) + (row['quantity'] or 0.0)), else_=None)),
+        (table.c.line_count, table.c.line_count + row['line_count']),
+        (table.c.quantified_count, table.c.quantified_count + row['quantified_count']))
+    if db.session.execute(add).rowcount == 0 and _insert_unless_duplicate(table, row) is None:
+        db.session.execute(add) # A concurrent request inserted the item since the UPDATE
+
+
+def get_grocery_list(user_id, create=False):
+    query = (GroceryList.query.options(selectinload(GroceryList.items), selectinload(GroceryList.recipe_links))
+             .filter_by(user_id=user_id))
+    grocery_list = query.first()
+    if grocery_list is None and create:
+        # Insert-if-absent: a concurrent first request for the same user may have created it since the SELECT
+        table = GroceryList.__table__
+        values = {'user_id': user_id, 'updated_at': datetime.utcnow()}
+        new_list = _conflict_insert(table)
+        if new_list is None:
+            new_id = (_insert_unless_duplicate(table, values) or [None])[0]
+        else:
+            new_id = db.session.execute(new_list.values(values).on_conflict_do_nothing(index_elements=['user_id'])
+                                        .returning(table.c.id)).scalar()
+        if new_id is None:
+            return query.first()
+        grocery_list = db.session.get(GroceryList, new_id)
+        set_committed_value(grocery_list, 'items', []) # Known empty, no need to load them
+        set_committed_value(grocery_list, 'recipe_links', [])
+    return grocery_list
+
+
+def add_recipes(grocery_list, recipe_ids):
+    """Add the recipes not already on the list; returns the ids that were added."""
+    present = {link.recipe_id for link in grocery_list.recipe_links}
+    wanted = set(recipe_ids) - present
+    existing = [recipe_id for recipe_id, in db.session.query(Recipe.id).filter(Recipe.id.in_(wanted))] if wanted else []
+    if not existing:
+        return []
+    # Only the links inserted here count: a recipe a concurrent request added first is not added twice
+    links = GroceryListRecipe.__table__
+    now = datetime.utcnow()
+    rows = [{'grocery_list_id': grocery_list.id, 'recipe_id': recipe_id, 'added_at': now} for recipe_id in existing]
+    new_links = _conflict_insert(links)
+    if new_links is None:
+        added = [row['recipe_id'] for row in rows if _insert_unless_duplicate(links, row) is not None]
+    else:
+        inserted = db.session.execute(new_links.values(rows).on_conflict_do_nothing().returning(links.c.recipe_id))
+        added = [recipe_id for recipe_id, in inserted]
+    apply_delta(grocery_list, recipe_totals(added))
+    db.session.expire(grocery_list, ['recipe_links'])
+    return added
+
+
+def remove_recipes(grocery_list, recipe_ids):
+    recipe_ids = set(recipe_ids) & {link.recipe_id for link in grocery_list.recipe_links}
+    if not recipe_ids:
+        return []
+    # Only the links deleted here count: a recipe a concurrent request removed first is not subtracted twice
+    links = GroceryListRecipe.__table__
+    on_list = (links.c.grocery_list_id == grocery_list.id, links.c.recipe_id.in_(recipe_ids))
+    if not db.session.get_bind().dialect.delete_returning: # e.g. MySQL: lock the links, then delete them
+        removed = db.session.execute(select(links.c.recipe_id).where(*on_list).with_for_update()).scalars().all()
+        if removed:
+            db.session.execute(delete(links).where(*on_list))
+    else:
+        removed = db.session.execute(delete(links).where(*on_list).returning(links.c.recipe_id)).scalars().all()
+    apply_delta(grocery_list, subtract_totals({}, recipe_totals(removed)))
+    db.session.expire(grocery_list, ['recipe_links'])
+    return removed
+
+
+def set_recipes(grocery_list, recipe_ids):
+    # Make the list exactly `recipe_ids`, touching only the recipes that change
+    present = {link.recipe_id for link in grocery_list.recipe_links}
+    remove_recipes(grocery_list, present - set(recipe_ids))
+    add_recipes(grocery_list, recipe_ids)
+
+
+def formatted_items(grocery_list):
+    items = sorted(grocery_list.items, key=lambda item: (item.normalized_name, item.unit or ''))
+    return [format_grocery_item(item.normalized_name, item.quantity, item.unit, item.line_count, item.quantified_count)
+            for item in items]
+
+
+def list_recipes(grocery_list):
+    # (id, name) of the recipes on the list, for display
+    return (db.session.query(Recipe.id, Recipe.name)
+            .join(GroceryListRecipe, GroceryListRecipe.recipe_id == Recipe.id)
+            .filter(GroceryListRecipe.grocery_list_id == grocery_list.id)
+            .order_by(Recipe.name, Recipe.id).all())
+
+
+def _lists_containing(session, recipe_id):
+    return session.query(GroceryList).join(GroceryListRecipe).filter(GroceryListRecipe.recipe_id == recipe_id).all()
+
+
+@event.listens_for(db.session, 'before_flush')
+def _propagate_recipe_changes(session, flush_context, instances):
+    # The RecipeIngredient rows still hold the old ingredients here (the rebuilt ones are flushed
+    # after this hook), so recipe_totals gives exactly what the lists were credited with.
+    for recipe in [obj for obj in session.dirty if isinstance(obj, Recipe)]:
+        if not inspect(recipe).attrs.ingredients.history.has_changes():
+            continue
+        grocery_lists = _lists_containing(session, recipe.id)
+        if grocery_lists:
+            delta = subtract_totals(text_totals(recipe.ingredients), recipe_totals([recipe.id]))
+            for grocery_list in grocery_lists:
+                apply_delta(grocery_list, delta)
+    links = GroceryListRecipe.__table__
+    for recipe in [obj for obj in session.deleted if isinstance(obj, Recipe)]:
+        # Only the lists still linked once the links are locked: one a concurrent removal got to first
+        # is not subtracted twice. Most deleted recipes are on no list and need no DELETE at all.
+        on_recipe = links.c.recipe_id == recipe.id
+        list_ids = session.execute(select(links.c.grocery_list_id).where(on_recipe).with_for_update()).scalars().all()
+        if list_ids:
+            session.execute(delete(links).where(on_recipe))
+            delta = subtract_totals({}, recipe_totals([recipe.id]))
+            for grocery_list in session.query(GroceryList).filter(GroceryList.id.in_(list_ids)):
+                apply_delta(grocery_list, delta)
@@ -0,0 +1,42 @@
+import hashlib
+import json
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+# Conditional GETs for HTML pages. A view computes an ETag from the data the page shows (a recipe's
+# version, the (id, version) pairs of a list page) and passes the template rendering as a callable;
+# when the client's If-None-Match still matches, the response is an empty 304 and the template is
+# never rendered.
+#
+# Pages also vary by who is looking (the nav shows the user's name, <html> their theme), so those go
+# into every ETag, together with HTTP_CACHE_VERSION for template changes between deploys. Responses
+# are Cache-Control: private, no-cache: shared caches must not store per-user HTML, and browsers
+# revalidate on every visit, which is where the 304s come from. There is no Last-Modified: a date
+# can't say who the page was rendered for, and it only has one-second resolution.
+
+
+def page_etag(*parts):
+    """ETag value for a page showing `parts`, as seen by the current user."""
+    from app.user_cache import render_preferences
+    viewer = None
+    if current_user.is_authenticated:
+        viewer = (current_user.id, current_user.name, render_preferences(current_user)['theme'])
+    payload = json.dumps([current_app.config['HTTP_CACHE_VERSION'], viewer, parts], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def conditional_page(render, etag, weak=False):
+    """304 if the client's copy is current, otherwise the response from `render()`; the ETag is set on both.
+
+    Pending flash messages always render: a 304 would leave them queued for some later page.
+    """
+    # GET uses the weak comparison (RFC 9110 13.1.2). If-Modified-Since is ignored, as no Last-Modified is sent
+    if request.method in ('GET', 'HEAD') and '_flashes' not in session and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=weak)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
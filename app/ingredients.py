@@ -0,0 +1,202 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Ingredient-line parsing and unit-aware consolidation for grocery lists.
+#
+# Quantities are stored in the base unit of their family (ml for volume, g for mass) so that
+# "2 cups flour" and "3 tbsp flour" land in the same (name, unit) bucket and can be summed with
+# a plain SQL SUM(). Countable units (cloves, cans, ...) are their own bucket, and lines without
+# a recognised unit are plain counts (unit None).
+
+PARSE_CACHE_SIZE = 65536 # Distinct lines memoized per process
+
+VOLUME, MASS, COUNT = 'volume', 'mass', 'count'
+BASE_UNITS = {VOLUME: 'ml', MASS: 'g'}
+
+# canonical unit -> (family, factor to base unit, aliases)
+_UNIT_TABLE = {
+    'tsp': (VOLUME, 4.92892, ('tsp', 'tsps', 'teaspoon', 'teaspoons')),
+    'tbsp': (VOLUME, 14.7868, ('tbsp', 'tbsps', 'tbs', 'tbl', 'tablespoon', 'tablespoons')),
+    'fl oz': (VOLUME, 29.5735, ('fl oz', 'fl. oz', 'fluid ounce', 'fluid ounces')),
+    'cup': (VOLUME, 236.588, ('cup', 'cups', 'c')),
+    'pint': (VOLUME, 473.176, ('pint', 'pints', 'pt')),
+    'quart': (VOLUME, 946.353, ('quart', 'quarts', 'qt')),
+    'gallon': (VOLUME, 3785.41, ('gallon', 'gallons', 'gal')),
+    'ml': (VOLUME, 1.0, ('ml', 'milliliter', 'milliliters', 'millilitre', 'millilitres')),
+    'l': (VOLUME, 1000.0, ('l', 'liter', 'liters', 'litre', 'litres')),
+    'mg': (MASS, 0.001, ('mg', 'milligram', 'milligrams')),
+    'g': (MASS, 1.0, ('g', 'gr', 'gram', 'grams')),
+    'kg': (MASS, 1000.0, ('kg', 'kilogram', 'kilograms')),
+    'oz': (MASS, 28.3495, ('oz', 'ounce', 'ounces')),
+    'lb': (MASS, 453.592, ('lb', 'lbs', 'pound', 'pounds')),
+    'clove': (COUNT, 1.0, ('clove', 'cloves')),
+    'can': (COUNT, 1.0, ('can', 'cans')),
+    'jar': (COUNT, 1.0, ('jar', 'jars')),
+    'package': (COUNT, 1.0, ('package', 'packages', 'pkg', 'pkgs')),
+    'pinch': (COUNT, 1.0, ('pinch', 'pinches')),
+    'dash': (COUNT, 1.0, ('dash', 'dashes')),
+    'slice': (COUNT, 1.0, ('slice', 'slices')),
+    'piece': (COUNT, 1.0, ('piece', 'pieces')),
+    'stick': (COUNT, 1.0, ('stick', 'sticks')),
+    'bunch': (COUNT, 1.0, ('bunch', 'bunches')),
+    'head': (COUNT, 1.0, ('head', 'heads')),
+    'sprig': (COUNT, 1.0, ('sprig', 'sprigs')),
+    'handful': (COUNT, 1.0, ('handful', 'handfuls')),
+}
+UNIT_ALIASES = {alias: unit for unit, (_, _, aliases) in _UNIT_TABLE.items() for alias in aliases}
+
+# Display ladders for summed base quantities: (unit, factor, plural), largest first
+_DISPLAY_LADDER = {
+    'ml': (('cup', 236.588, 'cups'), ('tbsp', 14.7868, 'tbsp'), ('tsp', 4.92892, 'tsp')),
+    'g': (('lb', 453.592, 'lb'), ('oz', 28.3495, 'oz')),
+}
+_DISPLAY_THRESHOLD = {'cup': 0.25, 'tbsp': 1.0, 'lb': 1.0} # Minimum amount before a larger unit is used
+
+_UNICODE_FRACTIONS = {
+    '½': 0.5, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 0.25, '¾': 0.75, '⅕': 0.2,
+    '⅛': 0.125, '⅜': 0.375, '⅝': 0.625, '⅞': 0.875,
+}
+_UNI = '[' + ''.join(_UNICODE_FRACTIONS) + ']'
+_AMOUNT = (r'(?:\d+\s+\d+/\d+'           # mixed number: 1 1/2
+           r'|\d+\s*' + _UNI +            # mixed unicode: 1½
+           r'|\d+/\d+'                     # fraction: 3/4
+           r'|\d+(?:\.\d+)?'               # integer/decimal: 2, 1.5
+           r'|' + _UNI + r')')             # bare unicode: ½
+_UNIT_ALT = '|'.join(re.escape(a) for a in sorted(UNIT_ALIASES, key=len, reverse=True))
+
+_LINE_RE = re.compile(
+    r'^(?:[-*•]\s*)?'
+    r'(?P<qty>' + _AMOUNT + r')'
+    r'(?:\s*(?:-|–|to)\s*(?P<qty_hi>' + _AMOUNT + r'))?'
+    r'\s*(?:(?P<unit>' + _UNIT_ALT + r')\.?(?=\s|$))?'
+    r'\s*(?:of\s+)?(?P<name>.*)$'
+)
+_BULLET_RE = re.compile(r'^(?:[-*•]|\d+[.)])\s+')
+_PAREN_RE = re.compile(r'\([^)]*\)')
+_TRAILING_NOTES = (' to taste', ' as needed', ' optional')
+_SPACE_RE = re.compile(r'\s+')
+_MIXED_RE = re.compile(r'^(\d+)\s+(\d+)/(\d+)$')
+_MIXED_UNI_RE = re.compile(r'^(\d+)\s*(' + _UNI + r')$')
+
+ParsedIngredient = namedtuple('ParsedIngredient', 'name quantity unit')
+ConsolidatedItem = namedtuple('ConsolidatedItem', 'name quantity unit line_count quantified_count')
+
+
+def _amount_to_number(text):
+    text = text.strip()
+    if text.isdigit():
+        return float(text)
+    if text in _UNICODE_FRACTIONS:
+        return _UNICODE_FRACTIONS[text]
+    mixed = _MIXED_RE.match(text)
+    if mixed:
+        whole, num, den = (int(g) for g in mixed.groups())
+        return whole + num / den if den else None
+    mixed = _MIXED_UNI_RE.match(text)
+    if mixed:
+        return int(mixed.group(1)) + _UNICODE_FRACTIONS[mixed.group(2)]
+    if '/' in text:
+        num, den = text.split('/', 1)
+        return int(num) / int(den) if int(den) else None
+    return float(text)
+
+
+def _clean_name(text):
+    # Expects text that already went through the lowercase/parenthesis/whitespace pass in _parse_line
+    text = text.partition(',')[0].rstrip() # Drop preparation notes: "onion, diced"
+    for note in _TRAILING_NOTES:
+        if text.endswith(note):
+            text = text[:-len(note)]
+    return text.strip()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_line(line):
+    text = line.strip().lower()
+    if '(' in text:
+        text = _PAREN_RE.sub(' ', text)
+    text = _SPACE_RE.sub(' ', text).strip()
+    match = _LINE_RE.match(text)
+    name = _clean_name(match.group('name')) if match else ''
+    if not match or not name:
+        # No leading quantity (or nothing after it): the whole line is the ingredient
+        return ParsedIngredient(_clean_name(_BULLET_RE.sub('', text)) or text, None, None)
+
+    quantity = _amount_to_number(match.group('qty'))
+    if match.group('qty_hi'):
+        # Ranges ("2-3 cloves") are bought at the upper bound
+        quantity = _amount_to_number(match.group('qty_hi'))
+    if quantity is None:
+        return ParsedIngredient(name, None, None)
+
+    unit = UNIT_ALIASES.get(match.group('unit')) if match.group('unit') else None
+    if unit is None:
+        return ParsedIngredient(name, quantity, None)
+    family, factor, _ = _UNIT_TABLE[unit]
+    if family == COUNT:
+        return ParsedIngredient(name, quantity, unit)
+    return ParsedIngredient(name, quantity * factor, BASE_UNITS[family])
+
+
+def parse_ingredient_line(line):
+    """Parse one ingredient line into (name, quantity, unit).
+
+    Volume and mass quantities are converted to ml/g, countable units keep their canonical
+    name ('clove', 'can', ...) and plain counts have unit None. Lines without a quantity
+    return quantity None. Results are memoized per distinct line.
+    """
+    return _parse_line(line)
+
+
+def split_ingredient_lines(text):
+    return [line.strip() for line in (text or '').split('\n') if line.strip()]
+
+
+def consolidate(lines):
+    # In-memory equivalent of the grocery list GROUP BY: sum per (name, unit) bucket
+    buckets = {}
+    for line in lines:
+        name, quantity, unit = _parse_line(line)
+        total, count, quantified = buckets.get((name, unit), (None, 0, 0))
+        if quantity is not None:
+            total = quantity if total is None else total + quantity
+            quantified += 1
+        buckets[(name, unit)] = (total, count + 1, quantified)
+    return [ConsolidatedItem(name, total, unit, count, quantified)
+            for (name, unit), (total, count, quantified) in sorted(buckets.items(), key=lambda kv: (kv[0][0], kv[0][1] or ''))]
+
+
+def format_quantity(value):
+    if value is None:
+        return ''
+    value = round(value, 2)
+    return str(int(value)) if value == int(value) else f"{value:g}"
+
+
+def format_amount(quantity, unit):
+    # Render a summed quantity in the most readable unit of its family
+    ladder = _DISPLAY_LADDER.get(unit)
+    if ladder:
+        for name, factor, plural in ladder:
+            amount = quantity / factor
+            if amount >= _DISPLAY_THRESHOLD.get(name, 0) or name == ladder[-1][0]:
+                return f"{format_quantity(amount)} {name if round(amount, 2) == 1 else plural}"
+    if unit:
+        plural = unit if quantity == 1 else (unit + 'es' if unit.endswith(('ch', 'sh')) else unit + 's')
+        return f"{format_quantity(quantity)} {plural}"
+    return format_quantity(quantity)
+
+
+def format_grocery_item(name, total_quantity, unit, line_count, quantified_count):
+    # "Flour (3 cups)", "Eggs (2)", "Cheese (x2)"; unquantified duplicates keep the old "(xN)" style
+    label = name.capitalize()
+    parts = []
+    if total_quantity is not None and quantified_count:
+        parts.append(format_amount(total_quantity, unit))
+    unquantified = line_count - (quantified_count or 0)
+    if parts and unquantified:
+        parts.append(f"+ x{unquantified}")
+    elif not parts and unquantified > 1:
+        parts.append(f"x{unquantified}")
+    return f"{label} ({' '.join(parts)})" if parts else label
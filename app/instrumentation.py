@@ -0,0 +1,114 @@
+import atexit
+import hmac
+import time
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from app.metrics import MetricsExporter, registry
+
+# Request and SQL instrumentation feeding app/metrics.py, plus the /metrics endpoint.
+# LLM provider metrics are recorded by app/llm_service.py into the same registry. Metric values are
+# per process; where /metrics writes and merges worker snapshots is per app (app.extensions['metrics']).
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce the response (streams: until headers), by endpoint',
+    ('endpoint', 'method'))
+HTTP_REQUESTS = registry.counter('http_requests_total', 'Requests by endpoint and status code',
+                                 ('endpoint', 'method', 'status'))
+HTTP_REQUEST_QUERIES = registry.histogram('http_request_sql_queries', 'SQL statements executed per request',
+                                          ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+HTTP_REQUEST_SQL_SECONDS = registry.histogram('http_request_sql_duration_seconds', 'Time spent in SQL per request',
+                                              ('endpoint',))
+SQL_QUERY_SECONDS = registry.histogram('sql_query_duration_seconds', 'Duration of individual SQL statements',
+                                       ('statement',))
+
+
+def _statement_kind(statement):
+    # First keyword only (SELECT, INSERT, ...), so the label stays low-cardinality
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_start')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    SQL_QUERY_SECONDS.observe(elapsed, _statement_kind(statement))
+    if has_request_context() and 'metrics_start' in g: # Not after the response is recorded (streamed bodies)
+        g.metrics_queries += 1
+        g.metrics_sql_seconds += elapsed
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    started = context.connection.info.get('metrics_query_start') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched' # url_rule endpoints keep label cardinality bounded
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_sql_seconds = 0.0
+
+
+def _record_request(status):
+    started = g.pop('metrics_start', None) # Popped: g outlives the request when an app context was already pushed
+    if started is None:
+        return
+    endpoint = _endpoint()
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, request.method)
+    HTTP_REQUESTS.inc(endpoint, request.method, status)
+    HTTP_REQUEST_QUERIES.observe(g.metrics_queries, endpoint)
+    HTTP_REQUEST_SQL_SECONDS.observe(g.metrics_sql_seconds, endpoint)
+    current_app.extensions['metrics'].maybe_flush()
+
+
+def _after_request(response):
+    _record_request(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    if exc is not None: # after_request doesn't run for unhandled exceptions
+        _record_request(500)
+
+
+def metrics_view():
+    token = current_app.config.get('METRICS_AUTH_TOKEN')
+    if not token:
+        # Unauthenticated scrapes only for local debugging/tests; deployed apps need a token to expose it
+        if not (current_app.debug or current_app.testing):
+            abort(404)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        abort(401)
+    return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_instrumentation(app, db):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    exporter = app.extensions['metrics'] = MetricsExporter(registry, app.config.get('METRICS_MULTIPROC_DIR'),
+                                                           app.config.get('METRICS_FLUSH_INTERVAL', 1.0))
+    app.before_request(_start_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    atexit.register(exporter.flush) # Keep an exiting worker's counts in the merged totals
@@ -0,0 +1,193 @@
+import atexit
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.llm_service import get_llm_client
+from app.models import GenerationJob
+
+# Background execution of LLM generate/modify requests (and batches of generate requests).
+#
+# Provider calls can take 5-45 seconds, so request handlers only create a GenerationJob row
+# and hand the call to a bounded thread pool; the browser polls the job's status endpoint.
+# LLM_JOB_WORKERS=0 runs jobs inline at submit time (tests, single-threaded debugging).
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobRunner:
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0 # Jobs queued or running in this process
+
+    def _get_executor(self, workers):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-job')
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def reserve(self, limit):
+        # Claim a queue slot before the job row is written; raises JobQueueFull when saturated
+        with self._lock:
+            if self._pending >= limit:
+                raise JobQueueFull(f"{self._pending} LLM jobs already pending")
+            self._pending += 1
+
+    def release(self):
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def start(self, app, job_id, call):
+        workers = app.config.get('LLM_JOB_WORKERS', 4)
+        if workers <= 0:
+            try:
+                _execute_job(job_id, call)
+            finally:
+                self.release()
+            return
+        try:
+            self._get_executor(workers).submit(self._run_in_worker, app, job_id, call)
+        except RuntimeError as e: # Pool shut down under us (process exiting): the worker never runs to release
+            self.release()
+            raise JobQueueFull(f"LLM job pool is shut down: {e}") from e
+
+    def _run_in_worker(self, app, job_id, call):
+        try:
+            with app.app_context():
+                try:
+                    _execute_job(job_id, call)
+                finally:
+                    db.session.remove()
+        except Exception as e: # Never let a failure escape into the executor unseen
+            print(f"LLM job {job_id} crashed: {e}")
+        finally:
+            self.release()
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+job_runner = JobRunner()
+
+
+_UNFINISHED = (GenerationJob.QUEUED, GenerationJob.RUNNING)
+
+
+def _update_job(job_id, from_statuses, **values):
+    # Conditional write, so a worker and the status page's expiry can't overwrite each other's outcome.
+    # Returns False when the job had already left `from_statuses`.
+    result = db.session.execute(db.update(GenerationJob)
+                                .where(GenerationJob.id == job_id, GenerationJob.status.in_(from_statuses))
+                                .values(**values))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _execute_job(job_id, call):
+    job = db.session.get(GenerationJob, job_id)
+    if job is None or job.is_finished:
+        return
+    # Only a queued job is claimed: an expired job is never run, and a job is never run twice
+    if not _update_job(job_id, [GenerationJob.QUEUED], status=GenerationJob.RUNNING, started_at=datetime.utcnow()):
+        return
+    try:
+        response = call()
+    except Exception as e:
+        print(f"LLM job {job_id} raised: {e}")
+        response = {'error': 'AI request failed', 'details': str(e)}
+    values = job_result_values(response)
+    if not _update_job(job_id, _UNFINISHED, **values):
+        print(f"LLM job {job_id} finished after it had expired; result discarded")
+        return
+    print(f"LLM job {job_id} ({job.kind}, {job.provider}) finished: {values['status']}")
+
+
+def job_result_values(response):
+    # Mirrors how the synchronous views split an LLMServiceClient response into recipe data and error
+    if isinstance(response, dict) and 'error' in response:
+        partial = {k: v for k, v in response.items() if k not in ['error', 'details']}
+        return _failed_values(str(response['error']), response.get('details'),
+                              result_json=json.dumps(partial) if any(partial.values()) else None)
+    return {'status': GenerationJob.SUCCEEDED, 'result_json': json.dumps(response), 'finished_at': datetime.utcnow()}
+
+
+def _failed_values(error, details, result_json=None):
+    return {'status': GenerationJob.FAILED, 'error': error[:200], 'error_details': details,
+            'result_json': result_json, 'finished_at': datetime.utcnow()}
+
+
+def submit_generation_job(user_id, kind, provider, prompt, api_keys, original_recipe_data=None,
+                          recipe_id=None, use_cache=True):
+    """Queue an LLM generate/modify call and return its GenerationJob (status 'queued').
+
+    kind 'batch' generates a recipe for each line of `prompt` (generate_recipes_batch); the job's
+    result is then the list of per-prompt responses.
+
+    Raises JobQueueFull when LLM_JOB_QUEUE_LIMIT jobs are already pending in this process.
+    """
+    app = current_app._get_current_object()
+    job_runner.reserve(app.config.get('LLM_JOB_QUEUE_LIMIT', 32))
+    try:
+        prune_finished_jobs(app.config.get('LLM_JOB_RETENTION_HOURS', 24))
+        job = GenerationJob(user_id=user_id, kind=kind, provider=provider, prompt=prompt, recipe_id=recipe_id)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        job_runner.release()
+        raise
+
+    api_keys = dict(api_keys) # Worker gets its own copy; keys are never written to the job row
+    llm_client = get_llm_client()
+    if kind == 'modify':
+        original_recipe_data = dict(original_recipe_data)
+        call = lambda: llm_client.modify_recipe(original_recipe_data, prompt, provider=provider,
+                                                api_keys=api_keys, use_cache=use_cache)
+    elif kind == 'batch':
+        max_concurrency = app.config.get('LLM_BATCH_CONCURRENCY')
+        call = lambda: llm_client.generate_recipes_batch(prompt.splitlines(), provider=provider, api_keys=api_keys,
+                                                         max_concurrency=max_concurrency, use_cache=use_cache)
+    else:
+        call = lambda: llm_client.generate_recipe(prompt, provider=provider, api_keys=api_keys, use_cache=use_cache)
+    try:
+        job_runner.start(app, job.id, call)
+    except JobQueueFull:
+        _update_job(job.id, _UNFINISHED, **_failed_values('AI request could not be started',
+                                                          'The AI service is restarting. Please try again.'))
+        raise
+    return job
+
+
+def active_job_count(user_id):
+    return GenerationJob.query.filter(GenerationJob.user_id == user_id,
+                                      GenerationJob.status.in_([GenerationJob.QUEUED, GenerationJob.RUNNING])).count()
+
+
+def expire_stale_job(job, timeout_seconds):
+    # A job still queued/running long after any provider timeout was lost (worker restarted mid-call)
+    if not job.is_finished and job.created_at < datetime.utcnow() - timedelta(seconds=timeout_seconds):
+        _update_job(job.id, _UNFINISHED, **_failed_values('AI request expired',
+                                                          'The request did not finish in time. Please try again.'))
+        db.session.refresh(job) # Whichever outcome won
+    return job
+
+
+def prune_finished_jobs(retention_hours):
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    GenerationJob.query.filter(GenerationJob.created_at < cutoff,
+                               GenerationJob.status.in_([GenerationJob.SUCCEEDED, GenerationJob.FAILED])
+                               ).delete(synchronize_session=False)
@@ -1,43 +1,498 @@
+import atexit
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import requests # For making HTTP requests to Hugging Face API
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json # For parsing JSON responses
-import google.generativeai as genai # For Google Gemini API
-# Ensure google.auth.exceptions is available if you're catching it specifically.
-# It's usually pulled in with google-auth, which is a dependency of google-generativeai.
-import google.auth.exceptions
+import importlib
+import sys
+
+from flask import current_app, has_app_context
 
 from . import db
+from .caching import LRUCache, SQLiteCache, TieredCache
+from .metrics import registry as metrics
+from .recipe_parser import IncrementalRecipeParser, recipe_events
+from .resilience import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, ProviderGuards, percentile
 from .models import UserSettings # UserSettings is used by init_llm_client, but not directly by the class anymore
 
+
+class _LazyModule:
+    # Stands in for a module and imports it on first attribute access. The Google SDK (with grpc,
+    # protobuf and IPython behind it) is ~40% of the app's import time, which every worker boot,
+    # CLI command and test process paid even when Gemini was never called.
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+genai = _LazyModule('google.generativeai') # For Google Gemini API
+glm = _LazyModule('google.ai.generativelanguage') # Low-level Gemini service client, one per API key (see GeminiModelPool)
+google_auth_exceptions = _LazyModule('google.auth.exceptions') # google-auth, a dependency of google-generativeai
+google_api_exceptions = _LazyModule('google.api_core.exceptions')
+
+HF_API_BASE_URL = "https://api-inference.huggingface.co/models"
+HF_MODEL_ID = "mistralai/Mistral-7B-Instruct-v0.1"
+HF_CONNECT_TIMEOUT = 10 # Seconds; the read timeout adapts to observed latency (see app/resilience.py)
+GEMINI_MODEL_ID = "gemini-pro"
+PROVIDER_MODELS = {'hugging_face': HF_MODEL_ID, 'gemini': GEMINI_MODEL_ID}
+PROVIDER_TITLES = {'hugging_face': 'Hugging Face', 'gemini': 'Gemini'}
+FASTEST = "fastest" # Pseudo-provider: race every configured provider (see _generate_fastest)
+HEDGE_ORDER = ('gemini', 'hugging_face') # Primary first; Gemini has no cold starts
+# Bump whenever the prompt wording below changes so cached responses to the old prompts stop matching
+PROMPT_TEMPLATE_VERSION = 1
+
+LLM_CALL_SECONDS = metrics.histogram('llm_provider_call_duration_seconds', 'Provider API call latency (streams: until the last chunk)',
+                                     ('provider', 'mode'), buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60))
+LLM_CALLS = metrics.counter('llm_provider_calls_total',
+                            'Provider API calls by outcome: ok, rejected (bad key/prompt/response), error, timeout, '
+                            'circuit_open, abandoned', ('provider', 'mode', 'outcome'))
+LLM_PARSES = metrics.counter('llm_recipe_parses_total', 'Provider responses parsed into recipes, by result (ok, failed)',
+                             ('provider', 'result'))
+LLM_CIRCUIT_STATE = metrics.gauge('llm_circuit_state', 'Circuit breaker state per provider/model: 0 closed, 1 half-open, 2 open',
+                                  ('guard',))
+LLM_TIMEOUT_SECONDS = metrics.gauge('llm_adaptive_timeout_seconds', 'Current adaptive call timeout per provider/model',
+                                    ('guard',))
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def normalize_prompt(text):
+    # "Chicken  pasta " and "chicken pasta" are the same request
+    return ' '.join((text or '').lower().split())
+
+
+def recipe_fingerprint(recipe_data):
+    # Hash of the recipe fields that go into a modification prompt
+    fields = [recipe_data.get(k) or '' for k in ('name', 'description', 'ingredients', 'instructions')]
+    return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()
+
+
+class LLMProviderError(Exception):
+    # Raised inside streaming calls to end the stream with a ready-made {'error': ..., 'details': ...} dict
+    def __init__(self, response):
+        super().__init__(response.get('details') or response.get('error'))
+        self.response = response
+
+
+class HedgeStats:
+    # Outcome of "fastest" generations: which provider won, and how long the primary took.
+    # The hedge delay is best set near the primary's p95 latency, so only slow tails are raced.
+    def __init__(self, samples=200):
+        self._lock = threading.Lock()
+        self.wins = Counter()
+        self.hedged = 0 # Generations where a backup provider was started
+        self._primary_latencies = deque(maxlen=samples)
+
+    def record_win(self, provider, hedged):
+        with self._lock:
+            self.wins[provider] += 1
+            self.hedged += 1 if hedged else 0
+
+    def record_primary_latency(self, seconds):
+        with self._lock:
+            self._primary_latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._primary_latencies)
+            wins, hedged = dict(self.wins), self.hedged
+        return {'wins': wins, 'hedged': hedged, 'primary_samples': len(latencies),
+                'primary_p50': percentile(latencies, 0.5), 'primary_p95': percentile(latencies, 0.95),
+                'suggested_hedge_delay': percentile(latencies, 0.95)}
+
+
+def is_provider_fault(exc):
+    # Failures that say the provider is unhealthy (as opposed to a bad key or a refused prompt);
+    # only these count towards opening its circuit
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return exc.response is not None and exc.response.status_code >= 500
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    api_exceptions = sys.modules.get('google.api_core.exceptions') # Not loaded: no Gemini call has run, so not one of its errors
+    return api_exceptions is not None and isinstance(exc, (api_exceptions.ServerError, api_exceptions.RetryError))
+
+
+def observe_provider_call(provider, mode, started, healthy, outcome=None, latency=None):
+    # outcome is 'ok' or 'timeout' when the caller knows it, else derived from the circuit breaker verdict
+    if outcome is None:
+        outcome = 'abandoned' if healthy is None else ('rejected' if healthy else 'error')
+    LLM_CALL_SECONDS.observe(time.monotonic() - started if latency is None else latency, provider, mode)
+    LLM_CALLS.inc(provider, mode, outcome)
+
+
+def circuit_open_error(provider, exc):
+    title = PROVIDER_TITLES.get(provider, provider)
+    return {'error': f'{title} Temporarily Unavailable',
+            'details': f"{title} has been failing or timing out, so requests to it are paused. "
+                       f"Try again in {max(1, round(exc.retry_after))} seconds or choose another provider."}
+
+
+class _DeadlineClient:
+    # Wraps a Gemini service client so every RPC carries the current adaptive timeout as its deadline;
+    # GenerativeModel.generate_content() in google-generativeai 0.3 has no timeout argument of its own.
+    # The SDK's default policy also retries 503s for up to 60s, hiding an outage from the circuit
+    # breaker and the "fastest" hedge, so those retries are turned off.
+    def __init__(self, client, timeout):
+        self._client = client
+        self._timeout = timeout
+
+    def _call_options(self, kwargs):
+        kwargs.setdefault('timeout', self._timeout())
+        kwargs.setdefault('retry', None)
+        return kwargs
+
+    def generate_content(self, request, **kwargs):
+        return self._client.generate_content(request, **self._call_options(kwargs))
+
+    def stream_generate_content(self, request, **kwargs):
+        return self._client.stream_generate_content(request, **self._call_options(kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class GeminiModelPool:
+    """Bounded LRU of GenerativeModel instances, one per API key, each bound to its own service client.
+
+    genai.configure() sets process-wide credentials, so concurrent requests for different users
+    could race and send one user's prompt with another user's key. Binding a client per key avoids
+    that shared state and also skips rebuilding the client (~15 ms) on every call.
+    """
+
+    def __init__(self, maxsize=64, timeout=None, api_endpoint=None):
+        self._models = LRUCache(maxsize)
+        self._timeout = timeout # Zero-argument callable giving the per-call deadline in seconds
+        self.api_endpoint = api_endpoint # e.g. the local stand-in server; None uses Google's endpoint
+        self._build_lock = threading.Lock()
+
+    @staticmethod
+    def _pool_key(api_key):
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+    def get(self, api_key):
+        pool_key = self._pool_key(api_key)
+        model = self._models.get(pool_key)
+        if model is None:
+            with self._build_lock:
+                model = self._models.get(pool_key)
+                if model is None:
+                    model = self._build_model(api_key, self._timeout, self.api_endpoint)
+                    self._models.set(pool_key, model)
+        return model
+
+    def discard(self, api_key):
+        self._models.delete(self._pool_key(api_key))
+
+    def __len__(self):
+        return len(self._models)
+
+    @staticmethod
+    def _build_model(api_key, timeout=None, api_endpoint=None):
+        model = genai.GenerativeModel(GEMINI_MODEL_ID)
+        # google-generativeai 0.3 has no per-model credentials; GenerativeModel uses _client when it is set
+        # and only falls back to the globally configured client otherwise.
+        if api_endpoint: # Custom endpoints (app/llm_standin.py) speak the REST shape of the API, not gRPC
+            client = glm.GenerativeServiceClient(client_options={'api_key': api_key, 'api_endpoint': api_endpoint},
+                                                 transport='rest')
+        else:
+            client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+        model._client = _DeadlineClient(client, timeout) if timeout else client
+        return model
+
+
+def generation_prompt(provider, user_prompt):
+    # Prompts for generate_recipe/stream_recipe; bump PROMPT_TEMPLATE_VERSION when editing them
+    if provider == "hugging_face":
+        return (
+            f"Generate a detailed recipe based on the following request: '{user_prompt}'.\n\n"
+            "Please provide the output in the following structure:\n"
+            "Recipe Name: [Name of the recipe]\n"
+            "Description: [A short description of the dish]\n"
+            "Ingredients:\n[Ingredient 1]\n[Ingredient 2]\n[...]\n"
+            "Instructions:\n1. [Step 1]\n2. [Step 2]\n[...]"
+        )
+    return (
+        f"Generate a creative and detailed recipe for: '{user_prompt}'.\n\n"
+        "Output structure should be:\n"
+        "Recipe Name: [Name of the recipe]\n"
+        "Description: [A short description of the dish]\n"
+        "Ingredients:\n- [Ingredient 1]\n- [Ingredient 2]\n- [...]\n"
+        "Instructions:\n1. [Step 1]\n2. [Step 2]\n[...]"
+    )
+
+
+def response_cache_key(kind, provider, user_prompt, recipe_hash=None):
+    parts = [PROMPT_TEMPLATE_VERSION, kind, provider, PROVIDER_MODELS.get(provider), normalize_prompt(user_prompt), recipe_hash]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
 class LLMServiceClient:
-    def __init__(self, model_name="placeholder-model"): # API keys removed from constructor
+    def __init__(self, model_name="placeholder-model", hf_api_base_url=HF_API_BASE_URL,
+                 pool_connections=2, pool_maxsize=10, max_retries=2, retry_backoff=0.5, gemini_pool_size=64,
+                 hedge_delay=2.0, hedge_workers=8, breaker=None, timeout=None,
+                 gemini_api_endpoint=None, batch_workers=8, provider_concurrency=4): # API keys removed from constructor
         # API keys will now be passed per-call to generate/modify methods
         self.model_name = model_name
+        self.hf_api_base_url = hf_api_base_url.rstrip('/')
+        # Keep-alive connection pool shared by every Hugging Face call (see _get_http_session)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._http_session = None
+        self._http_session_lock = threading.Lock()
+        self.response_cache = None # TieredCache of parsed recipes, set by configure_response_cache
+        # Circuit breaker + adaptive timeout per provider/model; breaker/timeout are their settings
+        self.guards = ProviderGuards(breaker=breaker, timeout=timeout)
+        self.gemini_models = GeminiModelPool(gemini_pool_size, timeout=self.gemini_timeout,
+                                             api_endpoint=gemini_api_endpoint) # Per-key Gemini clients, built on first use
+        self.hedge_delay = hedge_delay # Seconds the primary gets before a backup provider is started
+        self.hedge_workers = hedge_workers
+        self.hedge_stats = HedgeStats()
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+        # Batch generation: one pool for every batch, and at most provider_concurrency calls per provider
+        self.batch_workers = batch_workers
+        self.provider_concurrency = provider_concurrency
+        self._batch_executor = None
+        self._provider_slots = {}
+        self._batch_lock = threading.Lock()
         print(f"LLMServiceClient initialized (key-agnostic at init).")
 
+    def gemini_timeout(self):
+        return self.guards.get('gemini', GEMINI_MODEL_ID).timeout.current()
+
+    def circuit_retry_after(self, provider):
+        # Seconds until an open provider circuit lets calls through again, 0 if it is usable now
+        if provider not in PROVIDER_MODELS:
+            return 0.0
+        return self.guards.get(provider, PROVIDER_MODELS[provider]).breaker.retry_after()
+
+    def configure_response_cache(self, enabled=True, memory_size=256, ttl=604800, path=None):
+        # In-process LRU in front of an optional SQLite file shared by all workers
+        old_cache = self.response_cache
+        if enabled:
+            persistent = SQLiteCache(path, ttl=ttl, table='llm_responses') if path else None
+            self.response_cache = TieredCache(LRUCache(memory_size, ttl=ttl), persistent)
+        else:
+            self.response_cache = None
+        if old_cache is not None:
+            old_cache.close()
+
+    def _get_hedge_executor(self):
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix='llm-hedge')
+            return self._hedge_executor
+
+    def _generate_fastest(self, user_prompt, api_keys, use_cache):
+        # Start the primary provider, add the next one if it hasn't answered within hedge_delay (or
+        # as soon as it fails), and return the first recipe that parses. Losing calls can't be
+        # aborted mid-request; their results are ignored (successful ones still land in the cache).
+        legs = [p for p in HEDGE_ORDER if api_keys.get(p)]
+        if not legs:
+            return {'error': 'Fastest API Error', 'details': 'No AI provider API keys are configured.',
+                    'name': "Fastest Recipe (API Error)", 'provider_name': 'Fastest'}
+        if len(legs) == 1:
+            return self.generate_recipe(user_prompt, provider=legs[0], api_keys=api_keys, use_cache=use_cache)
+
+        executor = self._get_hedge_executor()
+        started = time.monotonic()
+        futures = {}
+
+        def launch(provider):
+            future = executor.submit(self.generate_recipe, user_prompt, provider, api_keys, use_cache)
+            if provider == legs[0]:
+                future.add_done_callback(lambda f: self.hedge_stats.record_primary_latency(time.monotonic() - started))
+            futures[future] = provider
+
+        launch(legs[0])
+        waiting = legs[1:]
+        first_error = None
+        while futures:
+            done, _ = wait(futures, timeout=self.hedge_delay if waiting else None, return_when=FIRST_COMPLETED)
+            if not done: # Primary is slow: hedge with the next provider
+                launch(waiting.pop(0))
+                continue
+            for future in done:
+                provider = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'error': f"{provider.replace('_', ' ').title()} API Error", 'details': str(e)}
+                if 'error' not in result:
+                    for other in futures:
+                        other.cancel() # Only stops legs that haven't started
+                    self.hedge_stats.record_win(provider, hedged=len(legs) - len(waiting) > 1)
+                    print(f"Fastest generation won by {provider} after {time.monotonic() - started:.2f}s")
+                    result['provider_name'] = provider.replace('_', ' ').title()
+                    return result
+                first_error = first_error or result
+                if waiting: # A failed leg starts the next provider right away
+                    launch(waiting.pop(0))
+        return first_error
+
+    def _get_batch_executor(self):
+        with self._batch_lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=self.batch_workers, thread_name_prefix='llm-batch')
+            return self._batch_executor
+
+    def _provider_slot(self, provider):
+        with self._batch_lock:
+            slot = self._provider_slots.get(provider)
+            if slot is None:
+                slot = self._provider_slots[provider] = threading.BoundedSemaphore(self.provider_concurrency)
+            return slot
+
+    def _generate_batch_item(self, user_prompt, provider, api_keys, use_cache):
+        try:
+            with self._provider_slot(provider): # Shared by all batches, so concurrent users can't swamp a provider
+                return self.generate_recipe(user_prompt, provider=provider, api_keys=api_keys, use_cache=use_cache)
+        except Exception as e:
+            print(f"Batch generation of '{user_prompt[:50]}' raised: {e}")
+            return {'error': 'AI request failed', 'details': str(e), 'provider_name': provider.replace('_', ' ').title()}
+
+    def generate_recipes_batch(self, prompts, provider="placeholder", api_keys=None, max_concurrency=None, use_cache=True):
+        """Generate a recipe per prompt concurrently; returns results in prompt order.
+
+        Each result is what generate_recipe returns for that prompt, so failures are per item (an
+        'error' key) and never abort the rest. max_concurrency caps this batch's calls in flight.
+        """
+        if not prompts:
+            return []
+        api_keys = api_keys or {}
+        executor = self._get_batch_executor()
+        in_flight = threading.BoundedSemaphore(max(1, min(max_concurrency or len(prompts), len(prompts))))
+        futures = []
+        for user_prompt in prompts:
+            in_flight.acquire() # Waits for one of this batch's calls to finish
+            future = executor.submit(self._generate_batch_item, user_prompt, provider, api_keys, use_cache)
+            future.add_done_callback(lambda f: in_flight.release())
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def cache_stats(self):
+        return dict(self.response_cache.stats) if self.response_cache is not None else {}
+
+    def _cached_response(self, kind, provider, api_keys, user_prompt, use_cache, recipe_hash=None):
+        # Returns (cache_key, cached recipe or None). The key is None when the call is not cacheable:
+        # cache disabled, placeholder provider, or no key for the provider (that path only errors).
+        if self.response_cache is None or provider not in PROVIDER_MODELS or not api_keys.get(provider):
+            return None, None
+        cache_key = response_cache_key(kind, provider, user_prompt, recipe_hash)
+        if not use_cache:
+            return cache_key, None # Bypass: skip the lookup but still store the fresh result
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            print(f"LLM response cache hit ({kind}, {provider}). Stats: {self.response_cache.stats}")
+            return cache_key, dict(cached)
+        return cache_key, None
+
+    def _store_response(self, cache_key, recipe):
+        if cache_key is not None and self.response_cache is not None:
+            self.response_cache.set(cache_key, dict(recipe))
+
+    def configure_http_pool(self, hf_api_base_url=None, pool_connections=None, pool_maxsize=None,
+                            max_retries=None, retry_backoff=None):
+        # Applies new pool settings; the next call builds a fresh session with them
+        with self._http_session_lock:
+            if hf_api_base_url is not None: self.hf_api_base_url = hf_api_base_url.rstrip('/')
+            if pool_connections is not None: self.pool_connections = pool_connections
+            if pool_maxsize is not None: self.pool_maxsize = pool_maxsize
+            if max_retries is not None: self.max_retries = max_retries
+            if retry_backoff is not None: self.retry_backoff = retry_backoff
+            old_session, self._http_session = self._http_session, None
+        if old_session is not None:
+            old_session.close()
+
+    def _get_http_session(self):
+        # One Session per client, created on first use. Its urllib3 pool is thread-safe, so
+        # concurrent requests share warm TCP/TLS connections instead of handshaking per call.
+        session = self._http_session
+        if session is not None:
+            return session
+        with self._http_session_lock:
+            if self._http_session is None:
+                # Only failures where the POST never reached the model are retried: connection errors
+                # and 502s. A 504 may mean the model is still generating, so retrying it would repeat the
+                # work and stack another read timeout; Retry-After is ignored to keep the backoff bounded.
+                retry = Retry(total=self.max_retries, connect=self.max_retries, read=0,
+                              backoff_factor=self.retry_backoff,
+                              status_forcelist=(502,), allowed_methods=frozenset(['POST']),
+                              respect_retry_after_header=False, raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                      pool_maxsize=self.pool_maxsize, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._http_session = session
+            return self._http_session
+
+    def close(self):
+        # Release pooled connections and the cache file handle (registered with atexit by init_llm_client)
+        with self._http_session_lock:
+            session, self._http_session = self._http_session, None
+        if session is not None:
+            session.close()
+        with self._hedge_lock:
+            executor, self._hedge_executor = self._hedge_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        with self._batch_lock:
+            executor, self._batch_executor = self._batch_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self.response_cache is not None:
+            self.response_cache.close()
+
     def _call_huggingface_inference_api(self, model_id, hf_prompt, api_key):
-        api_url = f"https://api-inference.huggingface.co/models/{model_id}"
+        api_url = f"{self.hf_api_base_url}/{model_id}"
         headers = {"Authorization": f"Bearer {api_key}"}
         payload = {
             "inputs": hf_prompt,
             "parameters": {"max_new_tokens": 1024, "return_full_text": False}, # Increased tokens
             "options": {"wait_for_model": True }
         }
+        guard = self.guards.get('hugging_face', model_id)
+        try:
+            probe = guard.acquire()
+        except CircuitOpenError as e:
+            print(f"HF API skipped: {e}")
+            LLM_CALLS.inc('hugging_face', 'call', 'circuit_open')
+            return circuit_open_error('hugging_face', e)
         print(f"Calling HF API: {api_url} with prompt: '{hf_prompt[:100]}...'")
+        healthy, latency, outcome = False, None, None
+        started = time.monotonic()
         try:
-            response = requests.post(api_url, headers=headers, json=payload, timeout=45) # Adjusted timeout
+            response = self._get_http_session().post(api_url, headers=headers, json=payload,
+                                                     timeout=(HF_CONNECT_TIMEOUT, guard.timeout.current()))
             response.raise_for_status()
+            healthy = True
             result = response.json()
             # print(f"HF API Response: {result}") # Can be very verbose
             if result and isinstance(result, list) and result[0].get('generated_text'):
+                latency, outcome = time.monotonic() - started, 'ok'
                 return result[0]['generated_text']
             elif result and isinstance(result, dict) and result.get('error'):
                 return {'error': 'Hugging Face API Error', 'details': result.get('error')}
             else:
                 return {'error': 'Hugging Face API Error', 'details': f"Unexpected response format: {str(result)[:200]}"}
         except requests.exceptions.Timeout:
+            outcome = 'timeout'
             print(f"HF API Error: Request timed out.")
             return {'error': 'Hugging Face API Error', 'details': 'Request timed out.'}
         except requests.exceptions.HTTPError as e:
+            healthy = not is_provider_fault(e) # It answered, even if it refused this key or prompt
             error_text = e.response.text[:200] if hasattr(e.response, 'text') else 'No further details.'
             if e.response.status_code == 401:
                 return {'error': 'Hugging Face API Error', 'details': 'Invalid API Key or unauthorized.'}
@@ -49,20 +504,32 @@ class LLMServiceClient:
             resp_text = response.text if 'response' in locals() and hasattr(response, 'text') else 'No response object'
             print(f"HF API Error: Failed to parse JSON response - {e}. Response text: {resp_text[:200]}")
             return {'error': 'Hugging Face API Error', 'details': f"Failed to parse JSON response: {str(e)}"}
+        finally:
+            guard.record(healthy, probe, latency)
+            observe_provider_call('hugging_face', 'call', started, healthy, outcome, latency)
 
 
     def _call_gemini_api(self, gemini_prompt, api_key):
+        guard = self.guards.get('gemini', GEMINI_MODEL_ID)
+        try:
+            probe = guard.acquire()
+        except CircuitOpenError as e:
+            print(f"Gemini API skipped: {e}")
+            LLM_CALLS.inc('gemini', 'call', 'circuit_open')
+            return circuit_open_error('gemini', e)
         print(f"Calling Gemini API with prompt: '{gemini_prompt[:100]}...'")
+        healthy, latency, outcome = False, None, None
+        started = time.monotonic()
         try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-pro')
-            # response = model.generate_content(gemini_prompt, request_options={'timeout': 45}) # Removed unsupported request_options
-            response = model.generate_content(gemini_prompt)
+            model = self.gemini_models.get(api_key)
+            response = model.generate_content(gemini_prompt) # Deadline set by the pooled client (see _DeadlineClient)
+            healthy, latency = True, time.monotonic() - started
 
             if response.parts:
                 full_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
                 if full_text:
                     # print(f"Gemini API Response Text: {full_text[:200]}...")
+                    outcome = 'ok'
                     return full_text
 
             if response.prompt_feedback and response.prompt_feedback.block_reason:
@@ -71,58 +538,132 @@ class LLMServiceClient:
 
             print(f"Gemini API Error: No text in response and no block reason. Parts: {response.parts if hasattr(response, 'parts') else 'N/A'}")
             return {'error': 'Gemini API Error', 'details': 'No content generated or unexpected response structure.'}
-        except google.auth.exceptions.RefreshError as e:
+        except google_auth_exceptions.RefreshError as e:
+            healthy = True # Credentials problem, not an outage
             print(f"Gemini API Authentication Error: {e}")
+            self.gemini_models.discard(api_key) # Don't keep a client for a key that fails to authenticate
             return {'error': 'Gemini API Authentication Error', 'details': 'Failed to authenticate. Check API key and credentials.'}
         except Exception as e:
+            healthy = not is_provider_fault(e)
+            outcome = 'timeout' if isinstance(e, google_api_exceptions.DeadlineExceeded) else None
             print(f"Gemini API Error: {e}")
             if "API_KEY_INVALID" in str(e) or "API key not valid" in str(e):
+                 self.gemini_models.discard(api_key)
                  return {'error': 'Gemini API Error', 'details': 'Invalid API Key provided.'}
             return {'error': 'Gemini API Error', 'details': str(e)}
+        finally:
+            guard.record(healthy, probe, latency)
+            observe_provider_call('gemini', 'call', started, healthy, outcome, latency)
 
 
+    def _stream_huggingface_inference_api(self, model_id, hf_prompt, api_key):
+        # Yields generated text as the Inference API streams it (server-sent "data:" lines, one token each)
+        api_url = f"{self.hf_api_base_url}/{model_id}"
+        headers = {"Authorization": f"Bearer {api_key}", "Accept": "text/event-stream"}
+        payload = {
+            "inputs": hf_prompt,
+            "parameters": {"max_new_tokens": 1024, "return_full_text": False},
+            "options": {"wait_for_model": True},
+            "stream": True,
+        }
+        probe = self._acquire_for_stream('hugging_face', model_id) # CircuitOpenError ends the stream (see _stream_error)
+        guard = self.guards.get('hugging_face', model_id)
+        print(f"Streaming HF API: {api_url} with prompt: '{hf_prompt[:100]}...'")
+        healthy, outcome = None, None # healthy stays None if the consumer stops reading before the stream ends
+        started = time.monotonic()
+        response = None
+        try:
+            response = self._get_http_session().post(api_url, headers=headers, json=payload, stream=True,
+                                                     timeout=(HF_CONNECT_TIMEOUT, guard.timeout.current()))
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if event.get("error"):
+                    raise LLMProviderError({'error': 'Hugging Face API Error', 'details': event["error"]})
+                token = event.get("token") or {}
+                if token.get("text") and not token.get("special"):
+                    yield token["text"]
+            healthy, outcome = True, 'ok'
+        except Exception as e:
+            healthy = not is_provider_fault(e)
+            outcome = 'timeout' if isinstance(e, requests.exceptions.Timeout) else None
+            raise
+        finally:
+            guard.record(healthy, probe) # Stream durations aren't comparable with single-shot latencies
+            observe_provider_call('hugging_face', 'stream', started, healthy, outcome)
+            if response is not None:
+                response.close()
+
+    def _stream_gemini_api(self, gemini_prompt, api_key):
+        probe = self._acquire_for_stream('gemini', GEMINI_MODEL_ID)
+        guard = self.guards.get('gemini', GEMINI_MODEL_ID)
+        print(f"Streaming Gemini API with prompt: '{gemini_prompt[:100]}...'")
+        healthy, outcome = None, None
+        started = time.monotonic()
+        try:
+            model = self.gemini_models.get(api_key)
+            response = model.generate_content(gemini_prompt, stream=True)
+            produced = False
+            for chunk in response:
+                text = "".join(part.text for part in chunk.parts if hasattr(part, 'text'))
+                if text:
+                    produced = True
+                    yield text
+            healthy, outcome = True, 'ok'
+        except Exception as e:
+            healthy = not is_provider_fault(e)
+            outcome = 'timeout' if isinstance(e, google_api_exceptions.DeadlineExceeded) else None
+            raise
+        finally:
+            guard.record(healthy, probe)
+            observe_provider_call('gemini', 'stream', started, healthy, outcome)
+        if not produced and response.prompt_feedback and response.prompt_feedback.block_reason:
+            raise LLMProviderError({'error': 'Gemini API Content Filtered',
+                                    'details': f"Content generation blocked by API: {response.prompt_feedback.block_reason}"})
+
+    def _acquire_for_stream(self, provider, model_id):
+        try:
+            return self.guards.get(provider, model_id).acquire()
+        except CircuitOpenError:
+            LLM_CALLS.inc(provider, 'stream', 'circuit_open')
+            raise
+
+    def _stream_error(self, provider, exc):
+        # Same error shapes as the non-streaming _call_* methods
+        if isinstance(exc, LLMProviderError):
+            return exc.response
+        if isinstance(exc, CircuitOpenError):
+            return circuit_open_error(provider, exc)
+        if provider == "hugging_face":
+            if isinstance(exc, requests.exceptions.Timeout):
+                return {'error': 'Hugging Face API Error', 'details': 'Request timed out.'}
+            if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+                if exc.response.status_code == 401:
+                    return {'error': 'Hugging Face API Error', 'details': 'Invalid API Key or unauthorized.'}
+                return {'error': 'Hugging Face API Error', 'details': f"HTTP error: {exc.response.status_code}"}
+            return {'error': 'Hugging Face API Error', 'details': f"Request failed: {str(exc)}"}
+        if isinstance(exc, google_auth_exceptions.RefreshError):
+            return {'error': 'Gemini API Authentication Error', 'details': 'Failed to authenticate. Check API key and credentials.'}
+        if "API_KEY_INVALID" in str(exc) or "API key not valid" in str(exc):
+            return {'error': 'Gemini API Error', 'details': 'Invalid API Key provided.'}
+        return {'error': 'Gemini API Error', 'details': str(exc)}
+
     def _parse_recipe_text(self, generated_text, provider_name="AI"):
+        recipe_data = self._parse_recipe_fields(generated_text, provider_name)
+        LLM_PARSES.inc(provider_name, 'failed' if 'error' in recipe_data else 'ok')
+        return recipe_data
+
+    def _parse_recipe_fields(self, generated_text, provider_name):
         if not generated_text or not isinstance(generated_text, str):
              return {'error': f'Invalid text received for parsing from {provider_name}',
                      'details': f'Received {type(generated_text).__name__} instead of string.'}
         try:
-            lines = generated_text.strip().split('\n')
-            recipe_data = {"name": f"{provider_name} Generated Recipe", "description": "", "ingredients": "", "instructions": ""}
-            current_section = None
-            ingredients_list = []
-            instructions_list = []
-
-            for line in lines:
-                line_s = line.strip()
-                if not line_s: continue # Skip empty lines
-
-                line_l = line_s.lower()
-
-                if line_l.startswith("recipe name:"):
-                    recipe_data["name"] = line_s.split(":", 1)[1].strip()
-                    current_section = None
-                elif line_l.startswith("description:"):
-                    recipe_data["description"] = line_s.split(":", 1)[1].strip()
-                    current_section = "description"
-                elif line_l.startswith("ingredients:"):
-                    current_section = "ingredients"
-                    # If the line itself is "Ingredients:", don't add it as an ingredient
-                    if len(line_s.split(":", 1)) > 1 and line_s.split(":", 1)[1].strip():
-                        ingredients_list.append(line_s.split(":", 1)[1].strip())
-                elif line_l.startswith("instructions:"):
-                    current_section = "instructions"
-                    if len(line_s.split(":", 1)) > 1 and line_s.split(":", 1)[1].strip():
-                        instructions_list.append(line_s.split(":", 1)[1].strip())
-                elif current_section == "description":
-                    if recipe_data["description"]: recipe_data["description"] += "\n" + line_s
-                    else: recipe_data["description"] = line_s
-                elif current_section == "ingredients":
-                    ingredients_list.append(line_s)
-                elif current_section == "instructions":
-                    instructions_list.append(line_s)
-
-            recipe_data["ingredients"] = "\n".join(ingredients_list)
-            recipe_data["instructions"] = "\n".join(instructions_list)
+            parser = IncrementalRecipeParser(default_name=f"{provider_name} Generated Recipe")
+            parser.feed(generated_text)
+            parser.close()
+            recipe_data = parser.recipe_data()
 
             # Basic check if parsing yielded any content in crucial fields
             # If name is still the default or ingredients/instructions are empty, consider it a failure.
@@ -149,32 +690,22 @@ class LLMServiceClient:
                     'description': generated_text, 'ingredients': '', 'instructions': ''} # Use raw text for desc
 
 
-    def generate_recipe(self, user_prompt, provider="placeholder", api_keys=None):
+    def generate_recipe(self, user_prompt, provider="placeholder", api_keys=None, use_cache=True):
         if api_keys is None: api_keys = {}
         generated_text_or_error = None
         provider_name_for_title = provider.replace("_", " ").title() if provider != "placeholder" else "AI"
-
+        if provider == FASTEST:
+            return self._generate_fastest(user_prompt, api_keys, use_cache)
+        cache_key, cached = self._cached_response('generate', provider, api_keys, user_prompt, use_cache)
+        if cached is not None:
+            return cached
 
         if provider == "hugging_face" and api_keys.get('hugging_face'):
-            hf_prompt = (
-                f"Generate a detailed recipe based on the following request: '{user_prompt}'.\n\n"
-                "Please provide the output in the following structure:\n"
-                "Recipe Name: [Name of the recipe]\n"
-                "Description: [A short description of the dish]\n"
-                "Ingredients:\n[Ingredient 1]\n[Ingredient 2]\n[...]\n"
-                "Instructions:\n1. [Step 1]\n2. [Step 2]\n[...]"
-            )
-            generated_text_or_error = self._call_huggingface_inference_api("mistralai/Mistral-7B-Instruct-v0.1", hf_prompt, api_keys['hugging_face'])
+            hf_prompt = generation_prompt("hugging_face", user_prompt)
+            generated_text_or_error = self._call_huggingface_inference_api(HF_MODEL_ID, hf_prompt, api_keys['hugging_face'])
 
         elif provider == "gemini" and api_keys.get('gemini'):
-            gemini_prompt = (
-                f"Generate a creative and detailed recipe for: '{user_prompt}'.\n\n"
-                "Output structure should be:\n"
-                "Recipe Name: [Name of the recipe]\n"
-                "Description: [A short description of the dish]\n"
-                "Ingredients:\n- [Ingredient 1]\n- [Ingredient 2]\n- [...]\n"
-                "Instructions:\n1. [Step 1]\n2. [Step 2]\n[...]"
-            )
+            gemini_prompt = generation_prompt("gemini", user_prompt)
             generated_text_or_error = self._call_gemini_api(gemini_prompt, api_keys['gemini'])
 
         if generated_text_or_error: # This means an API call was attempted
@@ -189,6 +720,7 @@ class LLMServiceClient:
                 parsed_recipe['provider_name'] = provider_name_for_title
                 return parsed_recipe
             parsed_recipe["is_ai_generated"] = True
+            self._store_response(cache_key, parsed_recipe) # Only successfully parsed recipes are cached
             return parsed_recipe
 
         # Fallback to placeholder if no provider was matched or if API calls returned None without specific error dict
@@ -217,10 +749,64 @@ class LLMServiceClient:
             "is_ai_generated": True
         }
 
-    def modify_recipe(self, original_recipe_data, user_prompt, provider="placeholder", api_keys=None):
+    def stream_recipe(self, user_prompt, provider="placeholder", api_keys=None, use_cache=True):
+        """Generate a recipe like generate_recipe(), yielding (event, data) pairs as it arrives.
+
+        'name', 'description', 'ingredient' and 'instruction' events are yielded as soon as each
+        line of the provider's response is complete. The stream ends with ('done', recipe) or
+        ('error', error_dict), where both carry the same dicts generate_recipe() would return.
+        """
+        if api_keys is None: api_keys = {}
+        provider_name_for_title = provider.replace("_", " ").title() if provider != "placeholder" else "AI"
+        cache_key, cached = self._cached_response('generate', provider, api_keys, user_prompt, use_cache)
+        if cached is not None:
+            yield from recipe_events(cached)
+            yield 'done', cached
+            return
+
+        if provider not in PROVIDER_MODELS or not api_keys.get(provider):
+            recipe = self.generate_recipe(user_prompt, provider=provider, api_keys=api_keys, use_cache=False)
+            if 'error' in recipe:
+                yield 'error', recipe
+                return
+            yield from recipe_events(recipe) # Placeholder recipes are complete immediately
+            yield 'done', recipe
+            return
+
+        prompt = generation_prompt(provider, user_prompt)
+        parser = IncrementalRecipeParser(default_name=f"{provider_name_for_title} Generated Recipe")
+        try:
+            if provider == "hugging_face":
+                chunks = self._stream_huggingface_inference_api(HF_MODEL_ID, prompt, api_keys['hugging_face'])
+            else:
+                chunks = self._stream_gemini_api(prompt, api_keys['gemini'])
+            for chunk in chunks:
+                yield from parser.feed(chunk)
+            yield from parser.close()
+        except Exception as e:
+            print(f"{provider_name_for_title} streaming error: {e}")
+            error = self._stream_error(provider, e)
+            error['provider_name'] = provider_name_for_title
+            yield 'error', error
+            return
+
+        parsed_recipe = self._parse_recipe_text(parser.text, provider_name_for_title)
+        if 'error' in parsed_recipe:
+            parsed_recipe['provider_name'] = provider_name_for_title
+            yield 'error', parsed_recipe
+            return
+        parsed_recipe["is_ai_generated"] = True
+        self._store_response(cache_key, parsed_recipe)
+        yield 'done', parsed_recipe
+
+    def modify_recipe(self, original_recipe_data, user_prompt, provider="placeholder", api_keys=None, use_cache=True):
         if api_keys is None: api_keys = {}
         modified_text_or_error = None
         provider_name_for_title = provider.replace("_", " ").title() if provider != "placeholder" else "AI"
+        cache_key, cached = self._cached_response('modify', provider, api_keys, user_prompt, use_cache,
+                                                  recipe_hash=recipe_fingerprint(original_recipe_data))
+        if cached is not None:
+            return cached
 
         if provider == "hugging_face" and api_keys.get('hugging_face'):
             hf_prompt = (
@@ -228,7 +814,7 @@ class LLMServiceClient:
                 f"User request: Modify this recipe to '{user_prompt}'.\n\n"
                 "Please provide the full modified recipe in the following structure:\nRecipe Name: [New Name]\nDescription: [New Description]\nIngredients:\n[Ingredient 1]\n[...]\nInstructions:\n1. [Step 1]\n[...]"
             )
-            modified_text_or_error = self._call_huggingface_inference_api("mistralai/Mistral-7B-Instruct-v0.1", hf_prompt, api_keys['hugging_face'])
+            modified_text_or_error = self._call_huggingface_inference_api(HF_MODEL_ID, hf_prompt, api_keys['hugging_face'])
 
         elif provider == "gemini" and api_keys.get('gemini'):
             gemini_prompt = (
@@ -248,6 +834,7 @@ class LLMServiceClient:
                 parsed_recipe['provider_name'] = provider_name_for_title
                 return parsed_recipe
             parsed_recipe["is_ai_modified"] = True
+            self._store_response(cache_key, parsed_recipe)
             return parsed_recipe
 
         if provider != "placeholder": # API call was attempted but failed earlier
@@ -275,15 +862,55 @@ class LLMServiceClient:
         return modified_data_ph
 
 
-llm_client = LLMServiceClient()
+def _collect_llm_metrics():
+    # Circuit states of the app serving /metrics (or flushing its snapshot); none outside an app
+    client = current_app.extensions.get('llm_client') if has_app_context() else None
+    if client is None:
+        return
+    for name, state in client.guards.snapshot().items():
+        LLM_CIRCUIT_STATE.set(CIRCUIT_STATE_VALUES[state['state']], name)
+        LLM_TIMEOUT_SECONDS.set(state['timeout'], name)
+
+metrics.add_collector(_collect_llm_metrics)
 
 def init_llm_client(app):
-    global llm_client
-    # Keys are no longer pre-loaded into the global client at app startup.
-    # They will be fetched from current_user.settings in routes and passed per-call.
-    llm_client = LLMServiceClient()
-    print(f"Global LLMServiceClient instance created by init_llm_client (key-agnostic).")
+    # One client per app, kept in app.extensions: its pools, breakers and response cache are built from
+    # this app's config, and creating another app leaves them alone. Views reach it via get_llm_client().
+    # Keys are never held by the client; routes fetch them from current_user.settings and pass them per call.
+    client = LLMServiceClient(
+        hf_api_base_url=app.config.get('HF_API_BASE_URL', HF_API_BASE_URL),
+        pool_connections=app.config.get('HF_API_POOL_CONNECTIONS', 2),
+        pool_maxsize=app.config.get('HF_API_POOL_MAXSIZE', 10),
+        max_retries=app.config.get('HF_API_MAX_RETRIES', 2),
+        retry_backoff=app.config.get('HF_API_RETRY_BACKOFF', 0.5),
+        gemini_pool_size=app.config.get('GEMINI_CLIENT_POOL_SIZE', 64),
+        gemini_api_endpoint=app.config.get('GEMINI_API_ENDPOINT') or None,
+        hedge_delay=app.config.get('LLM_HEDGE_DELAY', 2.0),
+        hedge_workers=app.config.get('LLM_HEDGE_WORKERS', 8),
+        batch_workers=app.config.get('LLM_BATCH_WORKERS', 8),
+        provider_concurrency=app.config.get('LLM_PROVIDER_CONCURRENCY', 4),
+        breaker={'window': app.config.get('LLM_BREAKER_WINDOW', 20),
+                 'failure_rate': app.config.get('LLM_BREAKER_FAILURE_RATE', 0.5),
+                 'min_calls': app.config.get('LLM_BREAKER_MIN_CALLS', 5),
+                 'reset_timeout': app.config.get('LLM_BREAKER_RESET_TIMEOUT', 30.0)},
+        timeout={'minimum': app.config.get('LLM_TIMEOUT_MIN', 10.0),
+                 'maximum': app.config.get('LLM_TIMEOUT_MAX', 45.0),
+                 'quantile': app.config.get('LLM_TIMEOUT_QUANTILE', 0.99),
+                 'multiplier': app.config.get('LLM_TIMEOUT_MULTIPLIER', 1.5)},
+    )
+    cache_path = app.config.get('LLM_CACHE_PATH')
+    if cache_path is None:
+        cache_path = os.path.join(app.instance_path, 'llm_cache.sqlite3') # '' keeps the cache in memory only
+    client.configure_response_cache(
+        enabled=app.config.get('LLM_CACHE_ENABLED', True),
+        memory_size=app.config.get('LLM_CACHE_MEMORY_SIZE', 256),
+        ttl=app.config.get('LLM_CACHE_TTL', 604800),
+        path=cache_path,
+    )
+    app.extensions['llm_client'] = client
+    atexit.register(client.close)
+    print(f"LLMServiceClient configured for app by init_llm_client (key-agnostic).")
 
 
 def get_llm_client():
-    return llm_client
+    return current_app.extensions['llm_client']
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import random
+import threading
+import time
+
+import click
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Local stand-in for the LLM providers, for load and latency testing without network access or keys.
+#
+# Serves the Hugging Face Inference API shape (POST /models/<model_id>, plain or streamed) and the
+# Gemini REST shape (POST /v1beta/models/<model>:generateContent / :streamGenerateContent), answering
+# with canned recipes after a sampled latency. Errors, hangs and Hugging Face's 503 "model is
+# currently loading" cold start are injected at configurable rates. Point the app at it with
+#   HF_API_BASE_URL=http://127.0.0.1:8765/models GEMINI_API_ENDPOINT=http://127.0.0.1:8765
+# and run it with `flask llm-standin` (see --help).
+
+CANNED_RECIPES = [
+    ("Stand-in Tomato Soup", "A smooth tomato soup served from the local test server.",
+     ["2 tbsp olive oil", "1 onion, diced", "2 cloves garlic", "800 g canned tomatoes", "500 ml vegetable stock", "Salt to taste"],
+     ["Soften the onion and garlic in the oil.", "Add tomatoes and stock and simmer for 20 minutes.", "Blend until smooth and season."]),
+    ("Stand-in Lemon Chicken", "Roast chicken thighs with lemon and thyme.",
+     ["6 chicken thighs", "2 lemons", "4 sprigs thyme", "3 tbsp olive oil", "1 tsp salt", "1/2 tsp black pepper"],
+     ["Heat the oven to 200C.", "Toss the chicken with oil, lemon juice, thyme, salt and pepper.", "Roast for 40 minutes until golden."]),
+    ("Stand-in Veggie Stir-Fry", "Crisp vegetables tossed in a quick soy and ginger sauce.",
+     ["1 red pepper", "2 carrots", "200 g broccoli", "2 tbsp soy sauce", "1 tbsp grated ginger", "1 tbsp sesame oil"],
+     ["Slice the vegetables thinly.", "Stir-fry in sesame oil over high heat for 4 minutes.", "Add soy sauce and ginger and toss for 1 minute."]),
+    ("Stand-in Pasta Primavera", "Spring vegetables and pasta in a light parmesan sauce.",
+     ["400 g pasta", "1 cup peas", "1 zucchini", "2 tbsp butter", "1/2 cup parmesan cheese", "1 lemon"],
+     ["Cook the pasta.", "Saute the zucchini and peas in butter.", "Toss with pasta, parmesan and lemon zest."]),
+]
+
+
+def parse_distribution(spec):
+    """Latency sampler for a spec like 'fixed:1.5', 'uniform:0.5,3', 'normal:2,0.5' or 'lognormal:1.5,0.6'.
+
+    Values are seconds; lognormal takes the median and sigma. Returns a function of a Random instance.
+    """
+    kind, _, params = spec.partition(':')
+    try:
+        values = [float(v) for v in params.split(',')] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency distribution: {spec!r}")
+    samplers = {
+        'fixed': (1, lambda rng, v: v[0]),
+        'uniform': (2, lambda rng, v: rng.uniform(v[0], v[1])),
+        'normal': (2, lambda rng, v: rng.gauss(v[0], v[1])),
+        'lognormal': (2, lambda rng, v: v[0] * rng.lognormvariate(0, v[1])),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Invalid latency distribution: {spec!r}")
+    sample = samplers[kind][1]
+    return lambda rng: max(0.0, sample(rng, values))
+
+
+def recipe_text(prompt, gemini_style=False):
+    # Same prompt, same canned recipe, so the response cache behaves as it would with a real provider
+    digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+    name, description, ingredients, instructions = CANNED_RECIPES[digest % len(CANNED_RECIPES)]
+    bullet = '- ' if gemini_style else ''
+    return (f"Recipe Name: {name}\nDescription: {description}\nIngredients:\n"
+            + "\n".join(bullet + line for line in ingredients)
+            + "\nInstructions:\n" + "\n".join(f"{i}. {step}" for i, step in enumerate(instructions, 1)))
+
+
+def split_tokens(text):
+    # Word-sized pieces (with their trailing whitespace) to stream like a token-by-token model
+    tokens, start = [], 0
+    for i, char in enumerate(text):
+        if char in ' \n':
+            tokens.append(text[start:i + 1])
+            start = i + 1
+    if start < len(text):
+        tokens.append(text[start:])
+    return tokens
+
+
+class StandInBehaviour:
+    """Sampling of latency and failures for one stand-in server; counters are exposed at /stats."""
+
+    def __init__(self, latency='lognormal:1.5,0.5', token_delay=0.02, error_rate=0.0, error_status=500,
+                 hang_rate=0.0, hang_seconds=120.0, loading_seconds=0.0, seed=None):
+        self.sample_latency = parse_distribution(latency)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.loading_until = time.monotonic() + loading_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'hangs': 0, 'loading': 0, 'streams': 0}
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def draw(self):
+        # (outcome, latency) for one request: outcome is 'ok', 'error' or 'hang'
+        with self._lock:
+            roll = self._rng.random()
+            latency = self.sample_latency(self._rng)
+        if roll < self.error_rate:
+            return 'error', latency
+        if roll < self.error_rate + self.hang_rate:
+            return 'hang', self.hang_seconds
+        return 'ok', latency
+
+    def loading_remaining(self):
+        return max(0.0, self.loading_until - time.monotonic())
+
+
+def create_standin_app(behaviour):
+    standin = Flask('llm_standin')
+
+    def failure(outcome, latency, error_body):
+        # Sleeps as a slow/hung upstream would; returns an error response or None to carry on
+        behaviour.count('requests')
+        if outcome == 'hang':
+            behaviour.count('hangs')
+        time.sleep(latency)
+        if outcome == 'error':
+            behaviour.count('errors')
+            return jsonify(error_body), behaviour.error_status
+        return None
+
+    @standin.route('/models/<path:model_id>', methods=['POST'])
+    def huggingface(model_id):
+        payload = request.get_json(silent=True) or {}
+        remaining = behaviour.loading_remaining()
+        if remaining:
+            behaviour.count('loading')
+            if not (payload.get('options') or {}).get('wait_for_model'):
+                return jsonify(error=f"Model {model_id} is currently loading", estimated_time=remaining), 503
+            time.sleep(remaining) # wait_for_model: the real API holds the request until the model is up
+
+        outcome, latency = behaviour.draw()
+        text = recipe_text(str(payload.get('inputs', '')))
+        if not payload.get('stream'):
+            error = failure(outcome, latency, {'error': 'Internal server error (stand-in)'})
+            return error or jsonify([{'generated_text': text}])
+
+        behaviour.count('streams')
+        error = failure(outcome, latency, {'error': 'Internal server error (stand-in)'}) # Latency = time to first token
+        if error:
+            return error
+        tokens = split_tokens(text)
+        def events():
+            for i, token in enumerate(tokens):
+                yield f"data: {json.dumps({'token': {'id': i, 'text': token, 'special': False}})}\n\n"
+                time.sleep(behaviour.token_delay)
+            yield f"data: {json.dumps({'token': {'id': len(tokens), 'text': '</s>', 'special': True}, 'generated_text': text})}\n\n"
+        return Response(events(), mimetype='text/event-stream')
+
+    @standin.route('/v1beta/models/<model_action>', methods=['POST'])
+    def gemini(model_action):
+        model, _, action = model_action.partition(':')
+        if action not in ('generateContent', 'streamGenerateContent'):
+            return jsonify(error={'code': 404, 'message': f"Unknown action {action!r}", 'status': 'NOT_FOUND'}), 404
+        payload = request.get_json(silent=True) or {}
+        prompt = "".join(part.get('text', '') for content in payload.get('contents', []) for part in content.get('parts', []))
+        outcome, latency = behaviour.draw()
+        error_body = {'error': {'code': behaviour.error_status, 'message': 'Backend error (stand-in)', 'status': 'UNAVAILABLE'}}
+        chunk = lambda text: {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'},
+                                              'finishReason': 'STOP', 'index': 0}]}
+        text = recipe_text(prompt, gemini_style=True)
+
+        if action == 'generateContent':
+            return failure(outcome, latency, error_body) or jsonify(chunk(text))
+
+        # The REST transport reads a streamed JSON array, one GenerateContentResponse per element
+        behaviour.count('streams')
+        error = failure(outcome, latency, error_body)
+        if error:
+            return error
+        lines = [line + "\n" for line in text.split("\n")]
+        def elements():
+            for i, line in enumerate(lines):
+                yield ("[" if i == 0 else ",") + json.dumps(chunk(line))
+                time.sleep(behaviour.token_delay * max(1, len(line.split())))
+            yield "]"
+        return Response(elements(), mimetype='application/json')
+
+    @standin.route('/stats')
+    def stats():
+        return jsonify(dict(behaviour.stats, latency=behaviour.latency, error_rate=behaviour.error_rate,
+                            hang_rate=behaviour.hang_rate, loading_remaining=behaviour.loading_remaining()))
+
+    return standin
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_standin_server(behaviour, host='127.0.0.1', port=0):
+    """Serve the stand-in from a background thread; returns (server, base_url). Call server.shutdown() to stop."""
+    server = make_server(host, port, create_standin_app(behaviour), threaded=True, request_handler=_QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+@click.command('llm-standin')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8765, show_default=True)
+@click.option('--latency', default='lognormal:1.5,0.5', show_default=True,
+              help="Response time: fixed:S, uniform:LO,HI, normal:MEAN,SD or lognormal:MEDIAN,SIGMA (seconds).")
+@click.option('--token-delay', default=0.02, show_default=True, help="Seconds between streamed tokens.")
+@click.option('--error-rate', default=0.0, show_default=True, help="Fraction of requests that fail.")
+@click.option('--error-status', default=500, show_default=True, help="HTTP status of injected failures.")
+@click.option('--hang-rate', default=0.0, show_default=True, help="Fraction of requests that stall for --hang-seconds.")
+@click.option('--hang-seconds', default=120.0, show_default=True)
+@click.option('--loading-seconds', default=0.0, show_default=True,
+              help="Answer Hugging Face calls with 503 'model is currently loading' for this long after start.")
+@click.option('--seed', type=int, default=None, help="Seed for reproducible latency/failure sequences.")
+def llm_standin_command(host, port, latency, token_delay, error_rate, error_status, hang_rate, hang_seconds,
+                        loading_seconds, seed):
+    """Run a local stand-in for the Hugging Face and Gemini APIs."""
+    try:
+        behaviour = StandInBehaviour(latency=latency, token_delay=token_delay, error_rate=error_rate,
+                                     error_status=error_status, hang_rate=hang_rate, hang_seconds=hang_seconds,
+                                     loading_seconds=loading_seconds, seed=seed)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--latency')
+    base_url = f"http://{host}:{port}"
+    click.echo(f"LLM stand-in on {base_url} (latency {latency}, errors {error_rate:.0%}, hangs {hang_rate:.0%})")
+    click.echo(f"Point the app at it with HF_API_BASE_URL={base_url}/models GEMINI_API_ENDPOINT={base_url}")
+    make_server(host, port, create_standin_app(behaviour), threaded=True).serve_forever()
@@ -0,0 +1,258 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Minimal Prometheus-style metrics: counters, gauges and histograms with labels, rendered in the
+# text exposition format. Each process records into its own in-memory registry. With several
+# workers (gunicorn etc.), every worker periodically writes a JSON snapshot into a shared directory
+# and /metrics merges all of them: counters and histograms are summed, including those of exited
+# workers, while gauges only count live workers. Clear the directory when the service is restarted.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {} # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(v) for v in labels)
+
+    def describe(self):
+        return {'type': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames)}
+
+    def samples(self):
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), aggregate='max'):
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = aggregate # How live workers' values are combined: 'max' or 'sum'
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def describe(self):
+        return dict(super().describe(), aggregate=self.aggregate)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value) # Per-bucket counts; made cumulative when rendered
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def describe(self):
+        return dict(super().describe(), buckets=list(self.buckets))
+
+    def samples(self):
+        with self._lock:
+            return [[list(k), list(v)] for k, v in self._values.items()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._collectors = [] # Callables run before each snapshot, e.g. to set gauges from live state
+        self._lock = threading.Lock()
+        self.exporter = MetricsExporter(self) # This process only, until configure_multiprocess
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing # Re-imports and app re-creation share the metric
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), aggregate='max'):
+        return self._register(Gauge(name, documentation, labelnames, aggregate))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e: # A broken collector must not take /metrics down
+                print(f"Metrics collector failed: {e}")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {'pid': os.getpid(), 'metrics': {m.name: dict(m.describe(), samples=m.samples()) for m in metrics}}
+
+    def configure_multiprocess(self, directory, flush_interval=1.0):
+        self.exporter = MetricsExporter(self, directory, flush_interval)
+
+    def render(self):
+        return self.exporter.render()
+
+
+class MetricsExporter:
+    """Renders a registry for /metrics, merged with the other workers' snapshots when `directory` is set.
+
+    Each app builds its own (app.extensions['metrics'], see app/instrumentation.py), so creating
+    another app never changes where an existing one writes or reads worker snapshots.
+    """
+
+    def __init__(self, registry, directory=None, flush_interval=1.0):
+        self.registry = registry
+        self.multiprocess_dir = directory or None
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+        if self.multiprocess_dir:
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+
+    def flush(self):
+        # Write this worker's snapshot atomically, so readers never see a partial file
+        if not self.multiprocess_dir:
+            return
+        self._last_flush = time.monotonic()
+        data = json.dumps(self.registry.snapshot())
+        fd, tmp_path = tempfile.mkstemp(dir=self.multiprocess_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.multiprocess_dir, f"worker-{os.getpid()}.json"))
+        except OSError as e:
+            print(f"Metrics flush failed ({self.multiprocess_dir}): {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def maybe_flush(self):
+        if self.multiprocess_dir and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def collect(self):
+        """Snapshots to render: this process only, or every worker's when multiprocess is configured."""
+        if not self.multiprocess_dir:
+            return [self.registry.snapshot()]
+        self.flush() # Our own numbers as of now
+        snapshots = []
+        for filename in sorted(os.listdir(self.multiprocess_dir)):
+            if not filename.startswith('worker-') or not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, filename)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable metrics snapshot {filename}: {e}")
+        return snapshots
+
+    def render(self):
+        return render_text(merge_snapshots(self.collect()))
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True # Exists but belongs to another user
+    return True
+
+
+def merge_snapshots(snapshots):
+    merged = OrderedDict()
+    for snapshot in snapshots:
+        alive = _pid_alive(snapshot.get('pid', -1))
+        for name, metric in snapshot['metrics'].items():
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif metric['type'] == 'histogram':
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                elif metric['type'] == 'gauge' and metric.get('aggregate') == 'max':
+                    target['samples'][key] = max(current, value)
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_text(merged):
+    lines = []
+    for name, metric in merged.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric['labelnames']
+        for labels, value in sorted(metric['samples'].items()):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_format_labels(names, labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + [float('inf')], value[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                lines.append(f"{name}_bucket{_format_labels(names, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(names, labels)} {_format_value(float(value[-1]))}")
+            lines.append(f"{name}_count{_format_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry() # Process-wide; app and LLM metrics register here at import time, each app exports it
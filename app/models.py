@@ -1,17 +1,74 @@
+import json
+import uuid
+from datetime import datetime
+
 from app import db
 from flask_login import UserMixin
+from app.ingredients import parse_ingredient_line, split_ingredient_lines
 
 class Recipe(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, index=True)
     description = db.Column(db.Text, nullable=True)
-    ingredients = db.Column(db.Text, nullable=False) # Could be JSON or a separate table
+    ingredients = db.Column(db.Text, nullable=False) # Raw text as entered; parsed rows live in RecipeIngredient
     instructions = db.Column(db.Text, nullable=False)
     # user_id = db.Column(db.Integer, db.ForeignKey('user.id')) # Assuming a User model
+    # Validators for conditional GETs (app/http_cache.py). The ORM bumps version on every UPDATE and checks
+    # it in the WHERE clause, so two edits racing from the same starting version can't both win.
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1) # Default for Core inserts (bulk import)
+
+    ingredient_items = db.relationship('RecipeIngredient', backref='recipe', cascade='all, delete-orphan',
+                                       order_by='RecipeIngredient.position')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<Recipe {self.name}>'
 
+class RecipeIngredient(db.Model):
+    # One row per ingredient line of a Recipe, kept in sync with Recipe.ingredients (see below)
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    raw_text = db.Column(db.Text, nullable=False)
+    normalized_name = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Float, nullable=True)
+    unit = db.Column(db.String(20), nullable=True)
+
+    __table_args__ = (
+        # Covers the grocery list GROUP BY (filter on recipe_id, group on name/unit, sum quantity)
+        db.Index('ix_recipe_ingredient_aggregate', 'recipe_id', 'normalized_name', 'unit', 'quantity'),
+    )
+
+    def __repr__(self):
+        return f'<RecipeIngredient {self.recipe_id}:{self.position} {self.normalized_name}>'
+
+def ingredient_item_values(ingredients_text):
+    # Column values of the RecipeIngredient rows for a recipe's ingredient text (bulk inserts use these directly)
+    values = []
+    for position, line in enumerate(split_ingredient_lines(ingredients_text)):
+        name, quantity, unit = parse_ingredient_line(line)
+        values.append({'position': position, 'raw_text': line, 'normalized_name': name[:200],
+                       'quantity': quantity, 'unit': unit})
+    return values
+
+def build_ingredient_items(ingredients_text):
+    return [RecipeIngredient(**values) for values in ingredient_item_values(ingredients_text)]
+
+@db.event.listens_for(Recipe.ingredients, 'set')
+def _sync_ingredient_items(target, value, oldvalue, initiator):
+    # Any assignment to Recipe.ingredients (add_recipe, edit_recipe, direct model use) rebuilds the rows;
+    # delete-orphan removes the old ones and delete_recipe cascades through the relationship.
+    if value == oldvalue:
+        return
+    session = db.inspect(target).session
+    if session is None:
+        target.ingredient_items = build_ingredient_items(value)
+        return
+    with session.no_autoflush: # Loading the old rows must not flush the edit half-done (one UPDATE per edit, one version bump)
+        target.ingredient_items = build_ingredient_items(value)
+
 class UserSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True) # Still useful as a PK for the table itself
     hugging_face_api_key = db.Column(db.String(200), nullable=True)
@@ -38,6 +95,79 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.email}>'
 
+class GroceryList(db.Model):
+    # A user's saved grocery list. Items hold the running (name, unit) totals of the recipes in
+    # recipe_links and are updated by deltas as recipes come and go (app/grocery.py).
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    recipe_links = db.relationship('GroceryListRecipe', backref='grocery_list', cascade='all, delete-orphan')
+    items = db.relationship('GroceryListItem', backref='grocery_list', cascade='all, delete-orphan',
+                            order_by='(GroceryListItem.normalized_name, GroceryListItem.unit)')
+
+    def __repr__(self):
+        return f'<GroceryList {self.id} for User {self.user_id}>'
+
+class GroceryListRecipe(db.Model):
+    grocery_list_id = db.Column(db.Integer, db.ForeignKey('grocery_list.id', ondelete='CASCADE'), primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id', ondelete='CASCADE'), primary_key=True, index=True)
+    added_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<GroceryListRecipe {self.grocery_list_id}:{self.recipe_id}>'
+
+class GroceryListItem(db.Model):
+    # Same columns as one row of the grocery list GROUP BY over RecipeIngredient
+    id = db.Column(db.Integer, primary_key=True)
+    grocery_list_id = db.Column(db.Integer, db.ForeignKey('grocery_list.id', ondelete='CASCADE'), nullable=False)
+    normalized_name = db.Column(db.String(200), nullable=False)
+    unit = db.Column(db.String(20), nullable=True)
+    quantity = db.Column(db.Float, nullable=True) # Sum of the quantified lines; None when there are none
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    quantified_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def key_columns(table):
+        # One row per (list, name, unit); NULL units compare equal through coalesce. Also the ON CONFLICT
+        # target of the upserts in app/grocery.py, which must match the index expression exactly.
+        return [table.c.grocery_list_id, table.c.normalized_name, db.func.coalesce(table.c.unit, db.literal_column("''"))]
+
+    def __repr__(self):
+        return f'<GroceryListItem {self.grocery_list_id} {self.normalized_name} {self.unit}>'
+
+db.Index('uq_grocery_list_item_key', *GroceryListItem.key_columns(GroceryListItem.__table__), unique=True)
+
+class GenerationJob(db.Model):
+    # One LLM generate/modify request run by the background pool in app/jobs.py.
+    # API keys are handed to the worker in memory and never stored here.
+    QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex) # Unguessable, used in URLs
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(10), nullable=False) # 'generate', 'modify' or 'batch'
+    provider = db.Column(db.String(20), nullable=False)
+    prompt = db.Column(db.Text, nullable=False) # One prompt per line for a batch
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id', ondelete='SET NULL'), nullable=True) # Recipe being modified
+    status = db.Column(db.String(10), nullable=False, default=QUEUED)
+    result_json = db.Column(db.Text, nullable=True) # Recipe dict returned by LLMServiceClient (also on parse failures)
+    error = db.Column(db.String(200), nullable=True)
+    error_details = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def result(self):
+        return json.loads(self.result_json) if self.result_json else None
+
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def __repr__(self):
+        return f'<GenerationJob {self.id} {self.kind} {self.status}>'
+
 # user_loader moved to __init__.py
 
 # The commented out User model example below can be removed or kept for reference.
@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor # Pass as ?after=... to get the following page
+        self.prev_cursor = prev_cursor # Pass as ?before=... to get the preceding page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    # Opaque, URL-safe token holding the sort key of a row, e.g. ("Apple Pie", 42)
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    # Returns a tuple of `size` values, or None if the token is malformed
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    # Only scalars can be bound; lists/objects (or true/false) in a crafted token would fail in the driver
+    if not all(value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool)) for value in values):
+        return None
+    return tuple(values)
+
+
+def keyset_paginate(query, sort_columns, per_page, after=None, before=None):
+    """Page through `query` ordered by `sort_columns` using a seek predicate
+    instead of OFFSET, so every page costs the same regardless of its depth.
+
+    The last column in `sort_columns` must be unique (normally the primary key)
+    so the ordering is total. `after`/`before` are decoded cursor tuples.
+    """
+    key = tuple_(*sort_columns)
+
+    def row_key(row):
+        return [getattr(row, col.key) for col in sort_columns]
+
+    if before is not None:
+        rows = (query.filter(key < before)
+                .order_by(*[col.desc() for col in sort_columns])
+                .limit(per_page + 1).all())
+        has_prev = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        if rows and has_prev:
+            return KeysetPage(rows, per_page,
+                              next_cursor=encode_cursor(row_key(rows[-1])),
+                              prev_cursor=encode_cursor(row_key(rows[0])))
+        # Walked back to the start of the list: serve a full first page instead of a partial one
+        after = None
+
+    seek = query.filter(key > after) if after is not None else query
+    rows = seek.order_by(*sort_columns).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(row_key(rows[-1])) if rows and has_next else None
+    prev_cursor = encode_cursor(row_key(rows[0])) if rows and after is not None else None
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
@@ -0,0 +1,122 @@
+import functools
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import event
+
+# Query counting for catching N+1 regressions. QueryRecorder collects the SQL statements executed by
+# the current thread while it is active; repeated statement shapes (same SQL once literals and bound
+# parameters are masked) are the signature of a lazy load inside a loop. @query_budget(n) guards a
+# view and assert_max_queries(n) wraps a block in tests.
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|(?<!:):\w+|\?")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_active = threading.local() # Per-thread stack of recorders, so worker threads don't leak into a request's count
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def statement_shape(statement):
+    """SQL with literals and parameters replaced by ? and IN lists collapsed, for grouping repeats."""
+    shape = _LITERALS.sub('?', statement)
+    shape = _IN_LISTS.sub('(?...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for recorder in getattr(_active, 'recorders', ()):
+        recorder.statements.append(statement)
+
+
+def _install(engine):
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+class QueryRecorder:
+    """Context manager recording statements run on `engine` by this thread. Recorders can nest."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        _install(self.engine)
+        if not hasattr(_active, 'recorders'):
+            _active.recorders = []
+        _active.recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.recorders.remove(self)
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, min_count=2):
+        """[(shape, times)] for shapes executed at least `min_count` times, most frequent first."""
+        shapes = Counter(statement_shape(s) for s in self.statements)
+        return [(shape, times) for shape, times in shapes.most_common() if times >= min_count]
+
+    def report(self, limit=5):
+        lines = [f"{self.count} queries"]
+        for shape, times in self.repeated()[:limit]:
+            lines.append(f"  {times}x {shape[:200]}")
+        return "\n".join(lines)
+
+
+def _budget_message(label, max_queries, recorder):
+    return f"{label} ran {recorder.count} queries, budget is {max_queries}.\n{recorder.report()}"
+
+
+@contextmanager
+def assert_max_queries(max_queries, engine=None, label="Block"):
+    if engine is None:
+        from app import db
+        engine = db.engine
+    with QueryRecorder(engine) as recorder:
+        yield recorder
+    if recorder.count > max_queries:
+        raise QueryBudgetExceeded(_budget_message(label, max_queries, recorder))
+
+
+def _budget_mode():
+    mode = current_app.config.get('QUERY_BUDGET_MODE')
+    if mode:
+        return mode
+    return 'raise' if current_app.testing else 'off'
+
+
+def query_budget(max_queries):
+    """View decorator: at most `max_queries` statements from the view body, including template rendering.
+
+    QUERY_BUDGET_MODE picks what happens when a view goes over: 'raise', 'warn' (print the report)
+    or 'off'. Unset, it raises under TESTING and is off otherwise.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = _budget_mode()
+            if mode == 'off':
+                return view(*args, **kwargs)
+            from app import db
+            with QueryRecorder(db.engine) as recorder:
+                response = view(*args, **kwargs)
+            if recorder.count > max_queries:
+                message = _budget_message(f"View {view.__name__}", max_queries, recorder)
+                if mode == 'raise':
+                    raise QueryBudgetExceeded(message)
+                print(f"Query budget exceeded: {message}")
+            return response
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
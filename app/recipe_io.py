@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+
+from app import db
+from app.models import Recipe, RecipeIngredient, ingredient_item_values
+
+# Bulk recipe import/export as JSONL (one JSON object per line) or CSV with a header row, for moving
+# whole catalogs. Both directions stream: import reads one row at a time and inserts in batches of
+# RECIPE_IMPORT_BATCH_SIZE with bulk INSERTs (one commit per batch, no ORM objects kept), export
+# walks the table with yield_per. Memory stays flat whatever the file size.
+# Used by /recipes/import, /recipes/export and `flask recipes import|export`.
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('name', 'description', 'ingredients', 'instructions')
+MIMETYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+NAME_MAX_LENGTH = Recipe.__table__.c.name.type.length
+MAX_REPORTED_ERRORS = 20
+CHUNK_SIZE = 64 * 1024 # Characters per chunk yielded by export
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = [] # (line number, message) for the first MAX_REPORTED_ERRORS skipped rows
+
+    def skip(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self):
+        return f"Imported {self.imported} recipes, skipped {self.skipped} invalid rows."
+
+
+def guess_format(filename, default='jsonl'):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension, default)
+
+
+def read_records(stream, fmt):
+    """Yield (line number, record dict or None, error or None) from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, record, None
+
+
+def clean_record(record):
+    # Same rules as the add_recipe form: name, ingredients and instructions are required
+    values = {}
+    for field in FIELDS:
+        value = record.get(field)
+        values[field] = str(value).strip() if value is not None else ''
+    missing = [field for field in ('name', 'ingredients', 'instructions') if not values[field]]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    if len(values['name']) > NAME_MAX_LENGTH:
+        raise ValueError(f"Name longer than {NAME_MAX_LENGTH} characters")
+    values['description'] = values['description'] or None
+    return values
+
+
+def _insert_recipes(rows):
+    # Ids of the new recipe rows, in row order
+    recipes = Recipe.__table__
+    if db.session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return db.session.execute(insert(recipes).returning(recipes.c.id, sort_by_parameter_order=True), rows).scalars().all()
+    # No ordered bulk RETURNING (e.g. MySQL): one INSERT per recipe for its id, still one commit per batch
+    return [db.session.execute(insert(recipes), row).inserted_primary_key[0] for row in rows]
+
+
+def _insert_batch(rows):
+    # Bulk INSERT ... RETURNING id (in row order), then the parsed ingredient rows the ORM listener
+    # would have built for each recipe. Core table inserts, not ORM bulk inserts: those split a batch
+    # wherever adjacent rows differ in which columns are None, down to one statement per row.
+    items_table = RecipeIngredient.__table__
+    recipe_ids = _insert_recipes(rows)
+    items = [dict(values, recipe_id=recipe_id)
+             for recipe_id, row in zip(recipe_ids, rows) for values in ingredient_item_values(row['ingredients'])]
+    if items:
+        db.session.execute(insert(items_table), items)
+    db.session.commit()
+
+
+def import_recipes(stream, fmt='jsonl', batch_size=None):
+    """Validate and insert every row of `stream`; invalid rows are skipped and reported.
+
+    Batches are committed as they fill, so a database error part-way leaves the earlier batches in place.
+    """
+    batch_size = batch_size or current_app.config.get('RECIPE_IMPORT_BATCH_SIZE', 1000)
+    result = ImportResult()
+    batch = []
+    for line, record, error in read_records(stream, fmt):
+        if error is None:
+            try:
+                values = clean_record(record)
+            except ValueError as e:
+                error = str(e)
+        if error:
+            result.skip(line, error)
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            _insert_batch(batch)
+            result.imported += len(batch)
+            batch = []
+    if batch:
+        _insert_batch(batch)
+        result.imported += len(batch)
+    return result
+
+
+def export_rows(yield_per=None):
+    yield_per = yield_per or current_app.config.get('RECIPE_EXPORT_YIELD_PER', 1000)
+    query = (select(Recipe.id, *[getattr(Recipe, field) for field in FIELDS])
+             .order_by(Recipe.id).execution_options(yield_per=yield_per)) # Streams in partitions, not one big fetchall
+    for row in db.session.execute(query):
+        yield row._asdict()
+
+
+def _format_rows(rows, fmt):
+    if fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=('id',) + FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_recipes(fmt='jsonl', yield_per=None):
+    """Yield the whole recipe table as JSONL/CSV text in chunks of about CHUNK_SIZE characters."""
+    chunk, size = [], 0
+    for text in _format_rows(export_rows(yield_per), fmt):
+        chunk.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+recipes_cli = AppGroup('recipes', help="Bulk recipe import and export.")
+
+
+@recipes_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help="Default: from the file extension.")
+@click.option('--batch-size', type=int, help="Rows per INSERT/commit. Default: RECIPE_IMPORT_BATCH_SIZE.")
+def import_command(path, fmt, batch_size):
+    """Import recipes from a JSONL or CSV file."""
+    with open(path, encoding='utf-8-sig', newline='') as f: # utf-8-sig: spreadsheet CSVs often start with a BOM
+        try:
+            result = import_recipes(f, fmt or guess_format(path), batch_size)
+        except UnicodeDecodeError as e:
+            db.session.rollback()
+            raise click.ClickException(f"{path} is not UTF-8 text ({e}). Batches imported before the problem were kept.")
+    click.echo(result.summary())
+    for line, message in result.errors:
+        click.echo(f"  line {line}: {message}")
+    if result.skipped > len(result.errors):
+        click.echo(f"  ... and {result.skipped - len(result.errors)} more")
+
+
+@recipes_cli.command('export')
+@click.argument('path', default='-')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help="Default: from the file extension, else jsonl.")
+def export_command(path, fmt):
+    """Export all recipes to PATH (default: stdout) as JSONL or CSV."""
+    with click.open_file(path, 'w', encoding='utf-8') as f:
+        for chunk in export_recipes(fmt or guess_format(path)):
+            f.write(chunk)
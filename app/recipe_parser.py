@@ -0,0 +1,139 @@
+import re
+
+# Parser for the "Recipe Name: / Description: / Ingredients: / Instructions:" text the LLM
+# providers are prompted to produce. It accepts the text in arbitrary chunks, so the same code
+# parses complete responses and streamed ones, reporting each field as soon as its line is complete.
+#
+# Headers are recognised in one regex match per line, including the markdown variants Gemini
+# likes to emit ("## Ingredients", "**Instructions:**", "- **Recipe Name:** Soup") and a few
+# synonyms (Directions, Method, Steps). Header lines lose their markdown; item lines keep their
+# text, with "*", "+" and "•" bullets written as "- " like the plain format.
+
+NAME, DESCRIPTION, INGREDIENT, INSTRUCTION = 'name', 'description', 'ingredient', 'instruction'
+
+# A header line: optional heading/list marker and bold, a keyword, then either a colon and an inline
+# value ("**Ingredients:** flour") or nothing else on the line ("## Ingredients")
+_HEADER_RE = re.compile(r"""
+    (?:\#{1,6}\s*)?(?:[-*+\u2022]\s+|\d+[.)]\s+)?(?:\*\*|__)?\s*
+    (?P<key>recipe\s+name|recipe\s+title|recipe|description|ingredients|instructions|directions|method|steps)(?![a-z])
+    (?:\s*(?:\*\*|__)?\s*:\s*(?:\*\*|__)?(?P<rest>.*)
+     |\s*(?:\*\*|__)?\s*\#*$)""", re.IGNORECASE | re.VERBOSE)
+# Cheap pre-checks so most item lines skip the regex: a header starts with one of these characters
+# and either has a colon or is a lone (marked-up) keyword like "1. **Instructions**": short, and
+# ending in markup or a keyword's last letter
+_HEADER_STARTS = frozenset('#-*+\u2022_0123456789rRdDiImMsS')
+_BARE_HEADER_ENDS = frozenset('sSdDnN*_#')
+_BARE_HEADER_MAX = 24
+# Untagged markdown title before any section: "## Lemon Chicken" or "**Lemon Chicken**"
+_TITLE_RE = re.compile(r"(?:\#{1,6}\s+(?P<heading>.+?)\s*\#*|\*\*(?P<bold>[^*]+)\*\*)$")
+_BULLET_RE = re.compile(r"[*+\u2022]\s+")
+_SECTIONS = {'recipe name': NAME, 'recipe title': NAME, 'recipe': NAME, 'description': DESCRIPTION,
+             'ingredients': INGREDIENT, 'instructions': INSTRUCTION, 'directions': INSTRUCTION,
+             'method': INSTRUCTION, 'steps': INSTRUCTION}
+
+
+class IncrementalRecipeParser:
+    def __init__(self, default_name=""):
+        self.name = default_name
+        self.ingredients = []
+        self.instructions = []
+        self._description = []
+        self._items = {INGREDIENT: self.ingredients, INSTRUCTION: self.instructions}
+        self._named = False # An explicit name (header or leading title line) has been seen
+        self._section = None
+        self._buffer = ""
+        self._chunks = []
+
+    @property
+    def text(self):
+        # Everything fed so far, for final validation/parsing of the complete response
+        return "".join(self._chunks)
+
+    @property
+    def description(self):
+        return "\n".join(self._description)
+
+    def feed(self, chunk):
+        """Add a chunk of text; returns (field, value) events for the lines it completed.
+
+        Events are ('name', name), ('description', description so far), ('ingredient', line)
+        and ('instruction', line).
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        lines = (self._buffer + chunk).split('\n')
+        self._buffer = lines.pop() # Last piece may be an incomplete line
+        return self._parse_lines(lines)
+
+    def close(self):
+        # Flush the trailing line once the response has ended
+        line, self._buffer = self._buffer, ""
+        return self._parse_lines([line]) if line else []
+
+    def recipe_data(self):
+        return {"name": self.name, "description": self.description,
+                "ingredients": "\n".join(self.ingredients), "instructions": "\n".join(self.instructions)}
+
+    def _parse_lines(self, lines):
+        # One pass: at most one regex match per line, and only for lines that could be headers
+        events = []
+        append = events.append
+        section = self._section
+        items = self._items
+        for line in lines:
+            line = line.strip()
+            if not line: continue # Skip empty lines
+
+            header = None
+            if line[0] in _HEADER_STARTS and (':' in line or (len(line) <= _BARE_HEADER_MAX
+                                                              and line[-1] in _BARE_HEADER_ENDS)):
+                header = _HEADER_RE.match(line)
+            if header is not None:
+                value = header.group('rest')
+                key = header.group('key').lower()
+                if value is None and key == 'recipe':
+                    header = None # A bare "Recipe" line isn't a header
+            if header is not None:
+                section = _SECTIONS[' '.join(key.split())] # "Recipe  Name" -> 'recipe name'
+                value = (value or "").strip().strip('*_').strip()
+                if section == NAME:
+                    self.name, self._named, section = value, True, None
+                    append((NAME, value))
+                elif section == DESCRIPTION:
+                    self._description = [value] if value else []
+                    if value:
+                        append((DESCRIPTION, value))
+                elif value: # A bare "Ingredients:" line adds nothing
+                    value = self._unbullet(value)
+                    items[section].append(value)
+                    append((section, value))
+            elif section in items:
+                line = self._unbullet(line) if line[0] in '*+\u2022' else line
+                items[section].append(line)
+                append((section, line))
+            elif section == DESCRIPTION:
+                self._description.append(line)
+                append((DESCRIPTION, self.description))
+            elif not self._named:
+                title = _TITLE_RE.match(line)
+                if title:
+                    self.name, self._named = (title.group('heading') or title.group('bold')).strip(), True
+                    append((NAME, self.name))
+        self._section = section
+        return events
+
+    @staticmethod
+    def _unbullet(line):
+        bullet = _BULLET_RE.match(line)
+        return "- " + line[bullet.end():] if bullet else line
+
+
+def recipe_events(recipe):
+    # Events equivalent to streaming an already complete recipe dict (cache hits, placeholder recipes)
+    events = [(NAME, recipe.get("name") or "")]
+    if recipe.get("description"):
+        events.append((DESCRIPTION, recipe["description"]))
+    events.extend((INGREDIENT, line) for line in (recipe.get("ingredients") or "").split("\n") if line.strip())
+    events.extend((INSTRUCTION, line) for line in (recipe.get("instructions") or "").split("\n") if line.strip())
+    return events
@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+
+# Failure isolation for outbound LLM provider calls. Each (provider, model) pair gets a circuit
+# breaker, so an upstream that keeps failing is skipped instead of tying up request workers, and a
+# timeout that follows the upstream's recent latency instead of a fixed constant.
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list, None when empty
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit for {name} is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over the outcomes of the last `window` calls.
+
+    Opens once at least `min_calls` outcomes are recorded and the share of failures reaches
+    `failure_rate`. After `reset_timeout` seconds `half_open_calls` probe calls are let through:
+    a healthy probe closes the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, name, window=20, failure_rate=0.5, min_calls=5, reset_timeout=30.0, half_open_calls=1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.times_opened = 0
+        self._outcomes = deque(maxlen=window) # True for healthy calls, oldest first
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes = 0 # Probe calls in flight while half-open
+        self._lock = threading.Lock()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def retry_after(self):
+        # Seconds until calls are allowed again; 0 when the circuit is not open
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def acquire(self):
+        """Permission for one call; returns True if it is a half-open probe.
+
+        Raises CircuitOpenError when the circuit is open or all probe slots are taken.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            retry_after = self.reset_timeout - (time.monotonic() - self._opened_at) if state == OPEN else 1.0
+        raise CircuitOpenError(self.name, max(0.0, retry_after))
+
+    def record(self, healthy, probe=False):
+        # healthy=None means the call was abandoned without an answer either way (client went away)
+        with self._lock:
+            state = self._current_state()
+            if probe:
+                if state != HALF_OPEN:
+                    return # Another probe already decided
+                if healthy is None:
+                    self._probes -= 1
+                elif healthy:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    print(f"Circuit {self.name} closed")
+                else:
+                    self._open()
+                return
+            if healthy is None or state != CLOSED:
+                return # Late result from a call started before the circuit opened
+            self._outcomes.append(healthy)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.times_opened += 1
+        print(f"Circuit {self.name} opened for {self.reset_timeout:g}s")
+
+    def snapshot(self):
+        with self._lock:
+            state = self._current_state()
+            outcomes = list(self._outcomes)
+        return {'state': state, 'window_calls': len(outcomes), 'window_failures': outcomes.count(False),
+                'times_opened': self.times_opened}
+
+
+class AdaptiveTimeout:
+    """Timeout derived from recent healthy-call latencies: the `quantile` latency times `multiplier`,
+    clamped to [minimum, maximum]. Returns `maximum` until `min_samples` latencies are recorded.
+    """
+
+    def __init__(self, minimum=10.0, maximum=45.0, quantile=0.99, multiplier=1.5, samples=100, min_samples=10):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def current(self):
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.maximum
+            latencies = sorted(self._latencies)
+        return min(self.maximum, max(self.minimum, percentile(latencies, self.quantile) * self.multiplier))
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        return {'timeout': self.current(), 'samples': len(latencies),
+                'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99)}
+
+
+class ProviderGuard:
+    # Breaker and timeout for one (provider, model)
+    def __init__(self, name, breaker, timeout):
+        self.name = name
+        self.breaker = breaker
+        self.timeout = timeout
+
+    def acquire(self):
+        return self.breaker.acquire()
+
+    def record(self, healthy, probe=False, latency=None):
+        self.breaker.record(healthy, probe)
+        if healthy and latency is not None:
+            self.timeout.observe(latency)
+
+    def snapshot(self):
+        return dict(self.breaker.snapshot(), **self.timeout.snapshot())
+
+
+class ProviderGuards:
+    """Lazily created ProviderGuard per (provider, model), sharing one set of settings.
+
+    `breaker` and `timeout` are keyword arguments for CircuitBreaker and AdaptiveTimeout.
+    """
+
+    def __init__(self, breaker=None, timeout=None):
+        self.breaker_settings = breaker or {}
+        self.timeout_settings = timeout or {}
+        self._guards = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, model):
+        key = f"{provider}/{model}"
+        guard = self._guards.get(key)
+        if guard is None:
+            with self._lock:
+                guard = self._guards.get(key)
+                if guard is None:
+                    guard = ProviderGuard(key, CircuitBreaker(key, **self.breaker_settings),
+                                          AdaptiveTimeout(**self.timeout_settings))
+                    self._guards[key] = guard
+        return guard
+
+    def snapshot(self):
+        with self._lock:
+            guards = list(self._guards.values())
+        return {guard.name: guard.snapshot() for guard in guards}
@@ -1,21 +1,112 @@
-from flask import render_template, request, redirect, url_for, abort, flash # Added flash
+import io
+import json
+from flask import render_template, request, redirect, url_for, abort, flash, jsonify, Response, stream_with_context, current_app # Added flash
 from flask_login import login_required, current_user
-from app import app, db
-from app.models import Recipe, UserSettings
-from app.llm_service import llm_client
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.exc import StaleDataError
+from app import db
+from app.models import Recipe, User, UserSettings, GenerationJob
+from app.fragment_cache import invalidate_recipe, recipe_fragments
+from app.grocery import add_recipes, formatted_items, get_grocery_list, list_recipes, remove_recipes, set_recipes
+from app.http_cache import conditional_page, page_etag
+from app.jobs import JobQueueFull, active_job_count, expire_stale_job, submit_generation_job
+from app.llm_service import FASTEST, get_llm_client
+from app.pagination import keyset_paginate, decode_cursor
+from app.query_budget import query_budget
+from app.recipe_io import FORMATS as RECIPE_FORMATS, MIMETYPES as RECIPE_MIMETYPES, export_recipes, guess_format, import_recipes
+from app.search import search_recipes
+from app.user_cache import invalidate_user, store_render_preferences
 # Removed: from .utils import get_available_llm_providers
 
-@app.route('/')
+_views = [] # (rule, view, options) in definition order; create_app() adds them to each app via init_routes
+
+def route(rule, **options):
+    # Like app.route, but recorded until there is an app; endpoints keep their plain names ('index', ...)
+    def decorator(view):
+        _views.append((rule, view, options))
+        return view
+    return decorator
+
+def init_routes(app):
+    for rule, view, options in _views:
+        options = dict(options)
+        app.add_url_rule(rule, options.pop('endpoint', None), view, **options)
+
+@route('/')
+@query_budget(1)
 def index():
     return render_template('home.html', title='Home') # Publicly accessible
 
-@app.route('/recipes')
+@route('/recipes')
 @login_required
+@query_budget(3) # One page query, whatever per_page is; more means a lazy load per row
 def recipes():
-    all_recipes = Recipe.query.all()
-    return render_template('recipes.html', title='Recipes', recipes=all_recipes)
-
-@app.route('/recipe/add', methods=['GET', 'POST'])
+    per_page = request.args.get('per_page', current_app.config['RECIPES_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['RECIPES_MAX_PER_PAGE']))
+    sort_columns = (Recipe.name, Recipe.id) # Served by ix_recipe_name (SQLite indexes carry the rowid)
+
+    after_token = request.args.get('after')
+    before_token = request.args.get('before')
+    after = decode_cursor(after_token, len(sort_columns))
+    before = decode_cursor(before_token, len(sort_columns))
+    if (after_token and after is None) or (before_token and before is None):
+        abort(400)
+
+    # The list only shows name/description, so keep the large text columns out of the SELECT
+    list_query = Recipe.query.options(defer(Recipe.ingredients), defer(Recipe.instructions))
+    page = keyset_paginate(list_query, sort_columns, per_page, after=after, before=before)
+    # Weak ETag from what this page shows: edits bump a row's version, adds/deletes change the ids or cursors
+    # (updated_at as well, since SQLite may reuse a deleted recipe's id).
+    etag = page_etag('recipes', [(recipe.id, recipe.version, recipe.updated_at) for recipe in page.items],
+                     page.per_page, page.prev_cursor, page.next_cursor)
+    # Rows come from the fragment cache; only new or changed recipes are rendered
+    return conditional_page(lambda: render_template('recipes.html', title='Recipes', recipes=page.items, page=page,
+                                                    recipe_fragments=recipe_fragments(page.items)),
+                            etag, weak=True)
+
+@route('/recipes/search')
+@login_required
+@query_budget(5) # Worst case under the rank cap: user, exact count (no match), prefix count and ranking, result rows
+def search_recipes_view():
+    query_text = request.args.get('q', '').strip()
+    results = search_recipes(query_text, limit=current_app.config['RECIPE_SEARCH_LIMIT'],
+                             rank_cap=current_app.config['RECIPE_SEARCH_RANK_CAP']) if query_text else []
+    return render_template('search_results.html', title='Search Recipes', query=query_text, results=results)
+
+@route('/recipes/import', methods=['GET', 'POST'])
+@login_required
+def import_recipes_view():
+    # Bulk upload; werkzeug spools large uploads to a temporary file and import_recipes reads it row by row
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash("Choose a JSONL or CSV file to import.", "warning")
+            return redirect(url_for('import_recipes_view'))
+        fmt = request.form.get('format') or guess_format(upload.filename)
+        if fmt not in RECIPE_FORMATS:
+            abort(400)
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        try:
+            result = import_recipes(stream, fmt)
+        except UnicodeDecodeError:
+            db.session.rollback()
+            flash("The file is not UTF-8 text. Batches imported before the problem were kept.", "danger")
+            return redirect(url_for('import_recipes_view'))
+        flash(result.summary(), "success" if result.imported else "warning")
+    return render_template('import_recipes.html', title='Import Recipes', result=result, formats=RECIPE_FORMATS)
+
+@route('/recipes/export')
+@login_required
+def export_recipes_view():
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in RECIPE_FORMATS:
+        abort(400)
+    # Streamed: rows are read with yield_per while the response is being sent
+    return Response(stream_with_context(export_recipes(fmt)), mimetype=RECIPE_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=recipes.{fmt}'})
+
+@route('/recipe/add', methods=['GET', 'POST'])
 @login_required
 def add_recipe():
     if request.method == 'POST':
@@ -47,15 +138,17 @@ def add_recipe():
                            name=name, description=description,
                            ingredients=ingredients, instructions=instructions)
 
-@app.route('/recipe/<int:recipe_id>')
+@route('/recipe/<int:recipe_id>')
 @login_required
+@query_budget(2)
 def view_recipe(recipe_id):
     recipe = db.session.get(Recipe, recipe_id)
     if not recipe:
         abort(404)
-    return render_template('view_recipe.html', recipe=recipe)
+    return conditional_page(lambda: render_template('view_recipe.html', recipe=recipe),
+                            page_etag('recipe', recipe.id, recipe.version, recipe.updated_at))
 
-@app.route('/recipe/<int:recipe_id>/edit', methods=['GET', 'POST'])
+@route('/recipe/<int:recipe_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_recipe(recipe_id):
     recipe = db.session.get(Recipe, recipe_id)
@@ -66,12 +159,18 @@ def edit_recipe(recipe_id):
         recipe.description = request.form.get('description', recipe.description)
         recipe.ingredients = request.form.get('ingredients', recipe.ingredients)
         recipe.instructions = request.form.get('instructions', recipe.instructions)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError: # Someone else saved this recipe between our load and our UPDATE
+            db.session.rollback()
+            flash("This recipe was changed by someone else while you were editing it. Please review and save again.", "warning")
+            return redirect(url_for('edit_recipe', recipe_id=recipe_id))
+        invalidate_recipe(recipe_id)
         # Add flash message for success if implemented
         return redirect(url_for('recipes'))
     return render_template('edit_recipe.html', title='Edit Recipe', recipe=recipe)
 
-@app.route('/recipe/<int:recipe_id>/delete', methods=['POST'])
+@route('/recipe/<int:recipe_id>/delete', methods=['POST'])
 @login_required
 def delete_recipe(recipe_id):
     recipe = db.session.get(Recipe, recipe_id)
@@ -79,103 +178,132 @@ def delete_recipe(recipe_id):
         abort(404)
     db.session.delete(recipe)
     db.session.commit()
+    invalidate_recipe(recipe_id)
     # Add flash message for success if implemented
     return redirect(url_for('recipes'))
 
-@app.route('/grocery-list')
+def _grocery_list_context(grocery_list):
+    # Read before a commit, which would expire the list and cost a reload of all of it
+    ingredients = formatted_items(grocery_list) if grocery_list and grocery_list.recipe_links else None
+    return dict(ingredients=ingredients, list_recipes=list_recipes(grocery_list) if ingredients is not None else [])
+
+def _selected_recipe_ids():
+    return [int(rid) for rid in request.form.getlist('recipe_ids') if rid.isdigit()]
+
+@route('/grocery-list')
 @login_required # Assuming grocery list is user-specific or requires login
+@query_budget(4) # List, its items and recipe links, the recipe names
 def grocery_list():
-    # This page will now primarily be rendered by generate_grocery_list
-    # or could show a default empty state / previously generated list (if persisted)
-    return render_template('grocery_list.html', title='Grocery List', ingredients=None)
+    # The user's saved list (app/grocery.py), kept up to date as recipes are added, removed or edited
+    return render_template('grocery_list.html', title='Grocery List', **_grocery_list_context(get_grocery_list(current_user.id)))
 
 # This will be the target for the form in recipes.html
-@app.route('/generate-grocery-list', methods=['POST'])
+@route('/generate-grocery-list', methods=['POST'])
 @login_required
+@query_budget(14) # Whatever the number of recipes or items: each kind of change is one statement
 def generate_grocery_list():
-    aggregated_ingredients = []
-    recipe_ids = request.form.getlist('recipe_ids')
+    recipe_ids = _selected_recipe_ids()
     if not recipe_ids:
         # Handle case with no recipes selected, maybe flash a message
         return redirect(url_for('recipes')) # Or render grocery_list with a message
 
-    selected_recipes = Recipe.query.filter(Recipe.id.in_(recipe_ids)).all()
-    ingredient_counts = {} # Using a dict to count ingredient occurrences
+    # The saved list becomes exactly the selection; only recipes that join or leave it are aggregated
+    grocery_list = get_grocery_list(current_user.id, create=True)
+    set_recipes(grocery_list, recipe_ids)
+    context = _grocery_list_context(grocery_list)
+    db.session.commit()
+    return render_template('grocery_list.html', title='Generated Grocery List', **context)
 
-    for recipe in selected_recipes:
-        ingredients_list = [ing.strip().lower() for ing in recipe.ingredients.split('\n') if ing.strip()]
-        for ingredient in ingredients_list:
-            ingredient_counts[ingredient] = ingredient_counts.get(ingredient, 0) + 1
+@route('/grocery-list/add', methods=['POST'])
+@login_required
+def add_to_grocery_list():
+    recipe_ids = _selected_recipe_ids()
+    if recipe_ids:
+        grocery_list = get_grocery_list(current_user.id, create=True)
+        added = add_recipes(grocery_list, recipe_ids)
+        db.session.commit()
+        flash(f"Added {len(added)} recipe{'s' if len(added) != 1 else ''} to your grocery list.", "success")
+    return redirect(url_for('grocery_list'))
 
-    # Format for display: "Ingredient (Count)" if count > 1
-    formatted_ingredients = []
-    for ingredient, count in sorted(ingredient_counts.items()):
-        if count > 1:
-            formatted_ingredients.append(f"{ingredient.capitalize()} (x{count})")
-        else:
-            formatted_ingredients.append(ingredient.capitalize())
+@route('/grocery-list/remove/<int:recipe_id>', methods=['POST'])
+@login_required
+def remove_from_grocery_list(recipe_id):
+    grocery_list = get_grocery_list(current_user.id)
+    if grocery_list:
+        remove_recipes(grocery_list, [recipe_id])
+        db.session.commit()
+    return redirect(url_for('grocery_list'))
 
-    return render_template('grocery_list.html', title='Generated Grocery List', ingredients=formatted_ingredients)
+@route('/grocery-list/clear', methods=['POST'])
+@login_required
+def clear_grocery_list():
+    grocery_list = get_grocery_list(current_user.id)
+    if grocery_list:
+        db.session.delete(grocery_list) # Items and recipe links cascade
+        db.session.commit()
+    return redirect(url_for('grocery_list'))
 
-@app.route('/order-instacart', methods=['POST'])
+@route('/order-instacart', methods=['POST'])
 @login_required
 def order_with_instacart():
-    ingredients = request.form.getlist('ingredients')
-    # The ingredients are already formatted (e.g., "Cheese (x2)") from the generate_grocery_list step
-    # If raw ingredients were needed, logic to re-process or fetch them would be here.
-    if not ingredients:
-        # Handle case where no ingredients are submitted, perhaps redirect or show error
-        # For now, just pass empty list to template, it will show a message.
-        pass
+    # Ordered from the saved list, so the items can't be tampered with or go stale in the form
+    grocery_list = get_grocery_list(current_user.id)
+    ingredients = formatted_items(grocery_list) if grocery_list else []
     return render_template('order_instacart.html', title='Order with InstaCart', ingredients=ingredients)
 
-@app.route('/generate-recipe-llm', methods=['GET', 'POST'])
-@login_required
-def generate_recipe_llm():
-    user_settings = current_user.settings
+def _llm_providers(user_settings, include_fastest=False):
+    # Provider choices for the AI forms plus the API keys the current user has configured
     available_providers = [{'value': 'placeholder', 'name': 'Placeholder (No API Key Needed)', 'configured': True}]
     api_keys = {}
-
-    if user_settings:
-        if user_settings.gemini_api_key:
-            available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': True})
-            api_keys['gemini'] = user_settings.gemini_api_key
-        else:
-            available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': False})
-        if user_settings.hugging_face_api_key:
-            available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': True})
-            api_keys['hugging_face'] = user_settings.hugging_face_api_key
-        else:
-            available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': False})
-    else: # No user_settings record yet
-        available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': False})
-        available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': False})
+    gemini_key = user_settings.gemini_api_key if user_settings else None
+    hf_key = user_settings.hugging_face_api_key if user_settings else None
+    available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': bool(gemini_key)})
+    available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': bool(hf_key)})
+    if include_fastest: # Generation only: races both providers and keeps the first good recipe
+        available_providers.append({'value': FASTEST, 'name': 'Fastest (Gemini + Hugging Face)', 'configured': bool(gemini_key and hf_key)})
+    if gemini_key:
+        api_keys['gemini'] = gemini_key
+    if hf_key:
+        api_keys['hugging_face'] = hf_key
+    return available_providers, api_keys
+
+def _provider_key_error(selected_provider, api_keys):
+    # Message for a provider the user can't use with their configured keys, else None
+    if selected_provider == 'placeholder':
+        return None
+    if selected_provider == FASTEST:
+        return None if len(api_keys) > 1 else "Fastest mode needs both Gemini and Hugging Face API keys in your settings."
+    if not api_keys.get(selected_provider):
+        return f"API key for {selected_provider.replace('_', ' ').title()} not found in your settings."
+    return None
+
+@route('/generate-recipe-llm', methods=['GET', 'POST'])
+@login_required
+def generate_recipe_llm():
+    # A plain POST queues a background job and redirects to ?job=<id>, which refreshes until the job is
+    # done; llm_jobs.js submits to /llm/jobs and polls instead. No request waits on the provider.
+    available_providers, api_keys = _llm_providers(current_user.settings, include_fastest=True)
 
     prompt_text = request.form.get('prompt') if request.method == 'POST' else request.args.get('prompt')
     selected_provider = request.form.get('provider') if request.method == 'POST' else "placeholder"
-    generated_recipe_data = None
-    error_message = None
-    error_details = None
+    job = generated_recipe_data = error_message = error_details = None
 
     if request.method == 'POST':
         if prompt_text:
             # Ensure the selected provider's key is actually available if not placeholder
-            if selected_provider != 'placeholder' and not api_keys.get(selected_provider):
-                error_message = f"API key for {selected_provider.replace('_', ' ').title()} not found in your settings."
-            else:
+            error_message = _provider_key_error(selected_provider, api_keys)
+            if not error_message:
                 print(f"Route 'generate_recipe_llm': User selected provider '{selected_provider}' with prompt: '{prompt_text}'")
-                llm_response = llm_client.generate_recipe(prompt_text, provider=selected_provider, api_keys=api_keys)
-                if isinstance(llm_response, dict) and 'error' in llm_response:
-                    error_message = llm_response['error']
-                    error_details = llm_response.get('details')
-                    generated_recipe_data = {k: v for k, v in llm_response.items() if k not in ['error', 'details']}
-                    if not any(generated_recipe_data.values()):
-                        generated_recipe_data = None
-                else: # No error from LLM or not a dict (should be recipe data)
-                    generated_recipe_data = llm_response
-                    # error_message and error_details remain None if successful
+                job, error_message = _submit_form_job('generate', selected_provider, prompt_text, api_keys)
+                if job:
+                    return redirect(url_for('generate_recipe_llm', job=job.id))
         else:
             error_message = "Prompt cannot be empty."
+    elif request.args.get('job'):
+        job = _form_job(request.args['job'], 'generate')
+        prompt_text, selected_provider = job.prompt, job.provider
+        if job.is_finished:
+            generated_recipe_data, error_message, error_details = job.result, job.error, job.error_details
 
     return render_template('generate_recipe_llm.html',
                            title='Generate Recipe with AI',
@@ -183,111 +311,319 @@ def generate_recipe_llm():
                            generated_recipe=generated_recipe_data,
                            available_providers=available_providers,
                            selected_provider=selected_provider,
+                           job=job,
                            error_message=error_message,
                            error_details=error_details)
 
-@app.route('/recipe/<int:recipe_id>/modify-llm-form', methods=['GET'])
+@route('/generate-recipe-llm/stream')
+@login_required
+def stream_recipe_llm():
+    # Server-sent events: recipe fields as the provider produces them, then the rendered result.
+    # GET because EventSource can't POST; validation errors are sent as an 'error' event too.
+    prompt_text = request.args.get('prompt')
+    selected_provider = request.args.get('provider', 'placeholder')
+    use_cache = not request.args.get('bypass_cache')
+    _, api_keys = _llm_providers(current_user.settings)
+
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def error_event(llm_response):
+        recipe_data = {k: v for k, v in llm_response.items() if k not in ['error', 'details']}
+        html = render_template('_llm_result.html', recipe=recipe_data if any(recipe_data.values()) else None,
+                               error_message=llm_response['error'], error_details=llm_response.get('details'),
+                               heading='AI Generated Recipe', save_label='Save This AI Recipe', user_prompt=None)
+        return sse('error', {'error': llm_response['error'], 'html': html})
+
+    def events():
+        if not prompt_text:
+            yield error_event({'error': "Prompt cannot be empty."})
+            return
+        if _provider_key_error(selected_provider, api_keys):
+            yield error_event({'error': _provider_key_error(selected_provider, api_keys)})
+            return
+        print(f"Route 'stream_recipe_llm': User selected provider '{selected_provider}' with prompt: '{prompt_text}'")
+        for event, data in get_llm_client().stream_recipe(prompt_text, provider=selected_provider, api_keys=api_keys, use_cache=use_cache):
+            if event == 'done':
+                html = render_template('_llm_result.html', recipe=data, error_message=None, error_details=None,
+                                       heading='AI Generated Recipe', save_label='Save This AI Recipe', user_prompt=None)
+                yield sse('done', {'recipe': data, 'html': html})
+            elif event == 'error':
+                yield error_event(data)
+            else:
+                yield sse(event, {'value': data})
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'} # Stop proxies from buffering the stream
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=headers)
+
+@route('/recipe/<int:recipe_id>/modify-llm-form', methods=['GET'])
 @login_required
 def modify_recipe_llm_form(recipe_id):
     recipe = db.session.get(Recipe, recipe_id)
     if not recipe:
         abort(404)
 
-    user_settings = current_user.settings
-    available_providers = [{'value': 'placeholder', 'name': 'Placeholder (No API Key Needed)', 'configured': True}]
-    if user_settings:
-        if user_settings.gemini_api_key:
-            available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': True})
-        else:
-            available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': False})
-        if user_settings.hugging_face_api_key:
-            available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': True})
-        else:
-            available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': False})
-    else:
-        available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': False})
-        available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': False})
+    available_providers, _ = _llm_providers(current_user.settings)
+    job = modified_recipe = error_message = error_details = None
+    selected_provider = "placeholder"
+    if request.args.get('job'): # Queued by submit_llm_modification; refreshes until it is done
+        job = _form_job(request.args['job'], 'modify')
+        if job.recipe_id != recipe.id:
+            abort(404)
+        selected_provider = job.provider
+        if job.is_finished:
+            modified_recipe, error_message, error_details = job.result, job.error, job.error_details
 
     return render_template('modify_recipe_llm.html',
                            title='Modify Recipe with AI',
                            original_recipe=recipe,
-                           user_prompt=None,
-                           modified_recipe=None,
+                           user_prompt=job.prompt if job else None,
+                           modified_recipe=modified_recipe,
                            available_providers=available_providers,
-                           selected_provider="placeholder")
+                           selected_provider=selected_provider,
+                           job=job,
+                           error_message=error_message,
+                           error_details=error_details)
 
-@app.route('/recipe/<int:recipe_id>/submit-llm-modification', methods=['POST'])
+@route('/recipe/<int:recipe_id>/submit-llm-modification', methods=['POST'])
 @login_required
 def submit_llm_modification(recipe_id):
+    # Queues a background job and redirects to the form page, which shows it (see generate_recipe_llm)
     original_recipe = db.session.get(Recipe, recipe_id)
     if not original_recipe:
         abort(404) # Should not happen if coming from the form correctly
 
     user_prompt = request.form.get('prompt')
+    available_providers, api_keys = _llm_providers(current_user.settings)
+    selected_provider = request.form.get('provider', 'placeholder')
+    error_message = None
 
-    # For the dummy service, we can pass the original recipe data as a dict
-    original_recipe_data = {
-        "name": original_recipe.name, # Using actual DB data
-        "description": original_recipe.description,
-        "ingredients": original_recipe.ingredients,
-        "instructions": original_recipe.instructions
-    }
-
-    modified_recipe_suggestion = None
-    if user_prompt:
-        user_settings = current_user.settings
-        available_providers = [{'value': 'placeholder', 'name': 'Placeholder (No API Key Needed)', 'configured': True}]
-        api_keys = {}
-        if user_settings:
-            if user_settings.gemini_api_key:
-                available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': True})
-                api_keys['gemini'] = user_settings.gemini_api_key
-            else:
-                available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': False})
-            if user_settings.hugging_face_api_key:
-                available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': True})
-                api_keys['hugging_face'] = user_settings.hugging_face_api_key
-            else:
-                available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': False})
-        else:
-            available_providers.append({'value': 'gemini', 'name': 'Google Gemini', 'configured': False})
-            available_providers.append({'value': 'hugging_face', 'name': 'Hugging Face (Mistral)', 'configured': False})
-
-        selected_provider = request.form.get('provider', 'placeholder')
-
-        if selected_provider != 'placeholder' and not api_keys.get(selected_provider):
-            error_message = f"API key for {selected_provider.replace('_', ' ').title()} not found in your settings."
-            modified_recipe_suggestion = None # Ensure no recipe is shown if key is missing for selected provider
-        else:
-            print(f"Route 'submit_llm_modification': User selected provider '{selected_provider}' for recipe ID {recipe_id} with prompt: '{user_prompt}'")
-            llm_response = llm_client.modify_recipe(original_recipe_data, user_prompt, provider=selected_provider, api_keys=api_keys)
-            if isinstance(llm_response, dict) and 'error' in llm_response:
-                error_message = llm_response['error']
-                error_details = llm_response.get('details')
-                modified_recipe_suggestion = {k: v for k, v in llm_response.items() if k not in ['error', 'details']}
-                if not any(modified_recipe_suggestion.values()):
-                    modified_recipe_suggestion = None
-            else: # No error from LLM
-                modified_recipe_suggestion = llm_response
-                error_message = None
-                error_details = None
-    else: # No user_prompt submitted
-        # error_message and error_details remain as initialized (None)
-        # modified_recipe_suggestion remains as initialized (None)
-        # This case should ideally be caught by form validation if prompt is required
-        pass
+    if not user_prompt:
+        error_message = "Prompt cannot be empty."
+    elif selected_provider != 'placeholder' and not api_keys.get(selected_provider):
+        error_message = f"API key for {selected_provider.replace('_', ' ').title()} not found in your settings."
+    else:
+        print(f"Route 'submit_llm_modification': User selected provider '{selected_provider}' for recipe ID {recipe_id} with prompt: '{user_prompt}'")
+        # For the dummy service, we can pass the original recipe data as a dict
+        original_recipe_data = {
+            "name": original_recipe.name, # Using actual DB data
+            "description": original_recipe.description,
+            "ingredients": original_recipe.ingredients,
+            "instructions": original_recipe.instructions
+        }
+        job, error_message = _submit_form_job('modify', selected_provider, user_prompt, api_keys,
+                                              original_recipe_data=original_recipe_data, recipe_id=recipe_id)
+        if job:
+            return redirect(url_for('modify_recipe_llm_form', recipe_id=recipe_id, job=job.id))
 
     return render_template('modify_recipe_llm.html',
                            title='Modify Recipe with AI',
                            original_recipe=original_recipe,
                            user_prompt=user_prompt, # The prompt user typed
-                           modified_recipe=modified_recipe_suggestion, # The AI's output or None/partial on error
+                           modified_recipe=None,
                            available_providers=available_providers,
                            selected_provider=selected_provider,
+                           job=None,
                            error_message=error_message,
-                           error_details=error_details)
+                           error_details=None)
+
+# --- Batch generation: a meal plan's worth of prompts at once, saved together ---
+
+BATCH_RECIPE_FIELDS = ('name', 'description', 'ingredients', 'instructions')
+
+def _batch_prompts(prompts_text):
+    # (prompts, error message) for the batch form's one-idea-per-line text
+    prompts = [line.strip() for line in prompts_text.splitlines() if line.strip()]
+    max_prompts = current_app.config['LLM_BATCH_MAX_PROMPTS']
+    if not prompts:
+        return prompts, "Enter at least one recipe idea, one per line."
+    if len(prompts) > max_prompts:
+        return prompts, f"At most {max_prompts} recipes can be generated at once."
+    return prompts, None
+
+def _batch_results(job):
+    # Rows for _llm_batch_results.html from a finished batch job, in prompt order
+    return [{'prompt': prompt, 'recipe': response, 'error': response.get('error'),
+             'details': response.get('details'),
+             'savable': 'error' not in response and all(response.get(f) for f in ('name', 'ingredients', 'instructions'))}
+            for prompt, response in zip(job.prompt.splitlines(), job.result or [])]
+
+@route('/generate-recipe-llm/batch', methods=['GET', 'POST'])
+@login_required
+def generate_recipe_batch():
+    # The batch runs as one background job, submitted and shown like generate_recipe_llm's
+    available_providers, api_keys = _llm_providers(current_user.settings, include_fastest=True)
+    prompts_text = request.form.get('prompts', '')
+    selected_provider = request.form.get('provider', 'placeholder')
+    job = results = error_message = error_details = None
+
+    if request.method == 'POST':
+        prompts, error_message = _batch_prompts(prompts_text)
+        error_message = error_message or _provider_key_error(selected_provider, api_keys)
+        if not error_message:
+            print(f"Route 'generate_recipe_batch': {len(prompts)} prompts with provider '{selected_provider}'")
+            job, error_message = _submit_form_job('batch', selected_provider, '\n'.join(prompts), api_keys)
+            if job:
+                return redirect(url_for('generate_recipe_batch', job=job.id))
+    elif request.args.get('job'):
+        job = _form_job(request.args['job'], 'batch')
+        prompts_text, selected_provider = job.prompt, job.provider
+        if job.is_finished:
+            results = _batch_results(job)
+            error_message, error_details = job.error, job.error_details
+
+    return render_template('generate_recipe_batch.html', title='Plan Meals with AI', prompts=prompts_text,
+                           available_providers=available_providers, selected_provider=selected_provider,
+                           max_prompts=current_app.config['LLM_BATCH_MAX_PROMPTS'], job=job, results=results,
+                           error_message=error_message, error_details=error_details)
+
+@route('/recipes/save-batch', methods=['POST'])
+@login_required
+def save_recipe_batch():
+    # All selected recipes are saved in one transaction, or none are
+    new_recipes = []
+    for index in request.form.getlist('save', type=int):
+        fields = {field: (request.form.get(f'{field}-{index}') or '').strip() for field in BATCH_RECIPE_FIELDS}
+        if not (fields['name'] and fields['ingredients'] and fields['instructions']):
+            flash("Some selected recipes are missing a name, ingredients or instructions. Nothing was saved.", "danger")
+            return redirect(url_for('generate_recipe_batch'))
+        new_recipes.append(Recipe(name=fields['name'][:100], description=fields['description'] or None,
+                                  ingredients=fields['ingredients'], instructions=fields['instructions']))
+    if not new_recipes:
+        flash("Select at least one recipe to save.", "warning")
+        return redirect(url_for('generate_recipe_batch'))
+    try:
+        db.session.add_all(new_recipes)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Saving {len(new_recipes)} batch recipes failed: {e}")
+        flash("The recipes could not be saved. Nothing was saved.", "danger")
+        return redirect(url_for('generate_recipe_batch'))
+    flash(f"Saved {len(new_recipes)} recipes.", "success")
+    return redirect(url_for('recipes'))
+
+# --- Background LLM jobs: the AI forms submit here and poll for the result instead of waiting ---
+
+LLM_JOB_RESULT_LABELS = {
+    'generate': ('AI Generated Recipe', 'Save This AI Recipe'),
+    'modify': ('AI Modified Recipe Suggestion', 'Save This Modified Recipe'),
+}
+
+LLM_JOB_KINDS = ('generate', 'modify', 'batch')
+LLM_BUSY_MESSAGE = "The AI service is busy right now. Please try again in a moment."
+
+def _job_payload(job):
+    payload = {'job_id': job.id, 'status': job.status, 'status_url': url_for('llm_job_status', job_id=job.id)}
+    if job.is_finished:
+        payload.update(result=job.result, error=job.error, error_details=job.error_details)
+        if job.kind == 'batch':
+            payload['html'] = render_template('_llm_batch_results.html', results=_batch_results(job),
+                                              error_message=job.error, error_details=job.error_details)
+            return payload
+        heading, save_label = LLM_JOB_RESULT_LABELS[job.kind]
+        payload['html'] = render_template('_llm_result.html', recipe=job.result, error_message=job.error,
+                                          error_details=job.error_details, heading=heading, save_label=save_label,
+                                          user_prompt=job.prompt if job.kind == 'modify' else None)
+    return payload
+
+def _llm_job_refusal(selected_provider):
+    # (message, HTTP status, Retry-After) when no new job should be queued for the current user, else None
+    retry_after = get_llm_client().circuit_retry_after(selected_provider)
+    if retry_after: # Provider is failing; say so now instead of queueing a job that fails instantly
+        title = selected_provider.replace('_', ' ').title()
+        return (f"{title} is temporarily unavailable. Please try again shortly or choose another provider.",
+                503, str(max(1, round(retry_after))))
+    if active_job_count(current_user.id) >= current_app.config['LLM_JOB_MAX_PER_USER']:
+        return "You already have AI requests in progress. Please wait for them to finish.", 429, None
+    return None
+
+def _owned_job(job_id):
+    job = db.session.get(GenerationJob, job_id)
+    if not job or job.user_id != current_user.id:
+        abort(404)
+    timeout = current_app.config['LLM_JOB_TIMEOUT']
+    if job.kind == 'batch': # Its calls run in waves of LLM_BATCH_CONCURRENCY
+        timeout *= -(-len(job.prompt.splitlines()) // max(1, current_app.config['LLM_BATCH_CONCURRENCY']))
+    return expire_stale_job(job, timeout)
+
+def _submit_form_job(kind, selected_provider, prompt, api_keys, **options):
+    # (job, None) once a no-JS form's job is queued, else (None, message) for the form to show
+    refusal = _llm_job_refusal(selected_provider)
+    if refusal:
+        return None, refusal[0]
+    try:
+        return submit_generation_job(current_user.id, kind, selected_provider, prompt, api_keys,
+                                     use_cache=not request.form.get('bypass_cache'), **options), None
+    except JobQueueFull:
+        return None, LLM_BUSY_MESSAGE
+
+def _form_job(job_id, kind):
+    # The ?job=<id> a form page refreshes on
+    job = _owned_job(job_id)
+    if job.kind != kind:
+        abort(404)
+    return job
+
+@route('/llm/jobs', methods=['POST'])
+@login_required
+def submit_llm_job():
+    kind = request.form.get('kind', 'generate')
+    prompt = request.form.get('prompt')
+    selected_provider = request.form.get('provider', 'placeholder')
+    if kind not in LLM_JOB_KINDS:
+        return jsonify(error="Unknown AI request type."), 400
+    if kind == 'batch':
+        prompts, error_message = _batch_prompts(request.form.get('prompts', ''))
+        if error_message:
+            return jsonify(error=error_message), 400
+        prompt = '\n'.join(prompts)
+    if not prompt:
+        return jsonify(error="Prompt cannot be empty."), 400
+    _, api_keys = _llm_providers(current_user.settings)
+    if kind == 'modify' and selected_provider == FASTEST:
+        return jsonify(error="Fastest mode is only available for new recipes."), 400
+    provider_error = _provider_key_error(selected_provider, api_keys)
+    if provider_error:
+        return jsonify(error=provider_error), 400
+    refusal = _llm_job_refusal(selected_provider)
+    if refusal:
+        message, status, retry_after = refusal
+        response = jsonify(error=message)
+        if retry_after:
+            response.headers['Retry-After'] = retry_after
+        return response, status
+
+    original_recipe_data = None
+    recipe_id = request.form.get('recipe_id', type=int)
+    if kind == 'modify':
+        original_recipe = db.session.get(Recipe, recipe_id) if recipe_id else None
+        if not original_recipe:
+            abort(404)
+        original_recipe_data = {
+            "name": original_recipe.name,
+            "description": original_recipe.description,
+            "ingredients": original_recipe.ingredients,
+            "instructions": original_recipe.instructions
+        }
+
+    try:
+        job = submit_generation_job(current_user.id, kind, selected_provider, prompt, api_keys,
+                                    original_recipe_data=original_recipe_data,
+                                    recipe_id=recipe_id if kind == 'modify' else None,
+                                    use_cache=not request.form.get('bypass_cache'))
+    except JobQueueFull:
+        response = jsonify(error=LLM_BUSY_MESSAGE)
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return jsonify(_job_payload(job)), 202
+
+@route('/llm/jobs/<job_id>')
+@login_required
+def llm_job_status(job_id):
+    return jsonify(_job_payload(_owned_job(job_id)))
 
-@app.route('/save-ai-recipe-form') # GET request
+@route('/save-ai-recipe-form') # GET request
 @login_required # This form leads to adding a recipe, should be protected
 def save_ai_recipe_form():
     name = request.args.get('name')
@@ -298,8 +634,9 @@ def save_ai_recipe_form():
     # This keeps the pre-filling logic consolidated in add_recipe's GET handler
     return redirect(url_for('add_recipe', name=name, description=description, ingredients=ingredients, instructions=instructions))
 
-@app.route('/profile', methods=['GET', 'POST'])
+@route('/profile', methods=['GET', 'POST'])
 @login_required
+@query_budget(6) # POST: settings insert/update plus commit
 def profile():
     # Placeholder user preferences data
     # Fetch settings related to the currently logged-in user
@@ -325,34 +662,38 @@ def profile():
         user_preferences['dietary_preferences'] = request.form.get('dietary_preferences', user_preferences['dietary_preferences'])
         user_preferences['family_size'] = int(request.form.get('family_size', user_preferences['family_size']))
 
+        # current_user may be a cached read-only snapshot (app/user_cache.py); update the row itself
+        user = db.session.get(User, current_user.id)
         # Fetch or create UserSettings for the current user
-        if not current_user.settings:
-            current_user.settings = UserSettings(user_id=current_user.id)
-            db.session.add(current_user.settings)
+        if not user.settings:
+            user.settings = UserSettings(user_id=user.id)
+            db.session.add(user.settings)
 
         hf_key = request.form.get('hugging_face_api_key')
         gemini_key = request.form.get('gemini_api_key')
 
         if hf_key:
-            current_user.settings.hugging_face_api_key = hf_key
+            user.settings.hugging_face_api_key = hf_key
         elif 'hugging_face_api_key' in request.form: # Field was present but empty
-            current_user.settings.hugging_face_api_key = None
+            user.settings.hugging_face_api_key = None
 
         if gemini_key:
-            current_user.settings.gemini_api_key = gemini_key
+            user.settings.gemini_api_key = gemini_key
         elif 'gemini_api_key' in request.form: # Field was present but empty
-            current_user.settings.gemini_api_key = None
+            user.settings.gemini_api_key = None
 
         # Save Theme preference
         selected_theme = request.form.get('theme')
         if selected_theme and selected_theme in ['light', 'dark', 'system']:
-            current_user.settings.theme = selected_theme
+            user.settings.theme = selected_theme
 
         # Save Dietary Restrictions
         restrictions_text = request.form.get('dietary_restrictions')
-        current_user.settings.dietary_restrictions = restrictions_text.strip() if restrictions_text else None
+        user.settings.dietary_restrictions = restrictions_text.strip() if restrictions_text else None
 
         db.session.commit()
+        invalidate_user(user.id)
+        store_render_preferences(user.id, user.settings)
         flash("Profile settings saved successfully!", "success")
         return redirect(url_for('profile'))
 
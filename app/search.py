@@ -0,0 +1,172 @@
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event, or_, select, text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Recipe
+
+# Full-text recipe search.
+#
+# On SQLite, recipe_fts is an external-content FTS5 index over the recipe table (no duplicated
+# text, just the inverted index) kept current by triggers. Other databases fall back to LIKE.
+
+FTS_TABLE = 'recipe_fts'
+# bm25() column weights, in FTS column order: name, description, ingredients, instructions
+BM25_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+SNIPPET_TOKENS = 12 # Words shown around the first match
+
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, ingredients, instructions, "
+    "content='recipe', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS recipe_fts_ai AFTER INSERT ON recipe BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description, ingredients, instructions) "
+    "VALUES (new.id, new.name, new.description, new.ingredients, new.instructions); END",
+    f"CREATE TRIGGER IF NOT EXISTS recipe_fts_ad AFTER DELETE ON recipe BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, ingredients, instructions) "
+    "VALUES ('delete', old.id, old.name, old.description, old.ingredients, old.instructions); END",
+    f"CREATE TRIGGER IF NOT EXISTS recipe_fts_au AFTER UPDATE OF name, description, ingredients, instructions ON recipe BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, ingredients, instructions) "
+    "VALUES ('delete', old.id, old.name, old.description, old.ingredients, old.instructions); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description, ingredients, instructions) "
+    "VALUES (new.id, new.name, new.description, new.ingredients, new.instructions); END",
+)
+
+# Keep db.create_all()/drop_all() (tests, fresh dev databases) in step with the migration
+for _statement in FTS_DDL:
+    event.listen(Recipe.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(Recipe.__table__, 'before_drop', DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect='sqlite'))
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchResult:
+    def __init__(self, recipe_id, name, description, snippet):
+        self.id = recipe_id
+        self.name = name
+        self.description = description
+        self.snippet = snippet # Markup, safe to render unescaped
+
+
+class SearchResults(list):
+    # SearchResult objects in rank order. When a rank cap cut scoring short, is_partial is set and
+    # match_count/ranked_count say how many recipes matched and how many of the newest were ranked.
+    def __init__(self, results=(), match_count=None, ranked_count=None):
+        super().__init__(results)
+        self.match_count = match_count
+        self.ranked_count = ranked_count
+
+    @property
+    def is_partial(self):
+        return self.ranked_count is not None and self.ranked_count < self.match_count
+
+
+def search_terms(query_text):
+    return _TERM_RE.findall((query_text or '').lower())[:16]
+
+
+def build_fts_query(terms, prefix_last=False):
+    # Every term must match; optionally the last one as a prefix ("risot" -> risotto)
+    quoted = [f'"{term}"' for term in terms]
+    if quoted and prefix_last:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def make_snippet(texts, terms, prefix_last=False, size=SNIPPET_TOKENS):
+    # Window of `size` words around the first hit in the first text that has one, hits wrapped in <mark>
+    alternatives = [re.escape(term) + (r'\w*' if prefix_last and i == len(terms) - 1 else '')
+                    for i, term in enumerate(terms)]
+    hit_re = re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b', re.IGNORECASE)
+    for value in texts:
+        hit = hit_re.search(value or '')
+        if not hit:
+            continue
+        words = value.split()
+        start = max(0, len(value[:hit.start()].split()) - size // 3)
+        window = words[start:start + size]
+        parts = [Markup('<mark>%s</mark>') % w if hit_re.search(w) else escape(w) for w in window]
+        prefix = '… ' if start > 0 else ''
+        suffix = ' …' if start + size < len(words) else ''
+        return Markup(prefix) + Markup(' ').join(parts) + Markup(suffix)
+    first = next((value for value in texts if value), '')
+    return escape(' '.join(first.split()[:size]))
+
+
+def _match_count(connection, fts_query):
+    return connection.execute(text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query"),
+                              {'query': fts_query}).scalar()
+
+
+def _ranked_ids(connection, fts_query, limit, newest=None):
+    # Every match is scored by bm25 and the best `limit` kept; `newest` restricts scoring to that
+    # many of the most recent matches (only used above RECIPE_SEARCH_RANK_CAP, see fts_search)
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    if newest is None:
+        sql = (f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query "
+               f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT :limit")
+    else:
+        sql = (f"SELECT id FROM (SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS score "
+               f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query ORDER BY rowid DESC LIMIT :newest) "
+               f"ORDER BY score LIMIT :limit")
+    return [row[0] for row in connection.execute(text(sql), {'query': fts_query, 'limit': limit, 'newest': newest})]
+
+
+def _ranked_pass(connection, fts_query, limit, rank_cap):
+    # (ids, match count, ranked count); the counts are only measured when a cap is configured
+    if not rank_cap:
+        return _ranked_ids(connection, fts_query, limit), None, None
+    total = _match_count(connection, fts_query)
+    if not total:
+        return [], 0, 0
+    newest = rank_cap if total > rank_cap else None
+    return _ranked_ids(connection, fts_query, limit, newest), total, min(total, rank_cap)
+
+
+def fts_search(connection, terms, limit, rank_cap=None):
+    fts_query = build_fts_query(terms)
+    ids, total, ranked = _ranked_pass(connection, fts_query, limit, rank_cap)
+    if not ids:
+        # Nothing for the exact words: retry treating the last word as a prefix
+        fts_query = build_fts_query(terms, prefix_last=True)
+        ids, total, ranked = _ranked_pass(connection, fts_query, limit, rank_cap)
+    if not ids:
+        return SearchResults()
+    # Display columns and snippets only for the page of winners, fetched by primary key
+    rows = connection.execute(
+        select(Recipe.id, Recipe.name, Recipe.description, Recipe.ingredients, Recipe.instructions)
+        .where(Recipe.id.in_(ids))
+    ).fetchall()
+    prefix_last = fts_query.endswith('*')
+    by_id = {row.id: SearchResult(row.id, row.name, row.description,
+                                  make_snippet((row.description, row.ingredients, row.instructions), terms, prefix_last))
+             for row in rows}
+    return SearchResults((by_id[rid] for rid in ids if rid in by_id), total, ranked)
+
+
+def like_search(session, terms, limit):
+    query = session.query(Recipe.id, Recipe.name, Recipe.description)
+    for term in terms:
+        # Terms are literal text: \w+ terms can hold '_', which LIKE would read as "any character"
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        query = query.filter(or_(*[column.ilike(pattern, escape='\\') for column in
+                                   (Recipe.name, Recipe.description, Recipe.ingredients, Recipe.instructions)]))
+    rows = query.order_by(Recipe.name, Recipe.id).limit(limit).all()
+    return SearchResults(SearchResult(rid, name, description, make_snippet((description,), terms))
+                         for rid, name, description in rows)
+
+
+def search_recipes(query_text, limit=20, rank_cap=None):
+    terms = search_terms(query_text)
+    if not terms:
+        return SearchResults()
+    if db.session.get_bind().dialect.name == 'sqlite':
+        try:
+            return fts_search(db.session.connection(), terms, limit, rank_cap)
+        except OperationalError as e:
+            # e.g. a database that predates the FTS migration, or SQLite built without FTS5
+            print(f"Full-text search unavailable, falling back to LIKE: {e}")
+            db.session.rollback()
+    return like_search(db.session, terms, limit)
@@ -0,0 +1,135 @@
+// Submits the AI generate/modify forms as background jobs and polls for the result, so the
+// request worker is freed immediately. Without fetch (or if submitting the job fails outright)
+// the form falls back to its regular synchronous POST.
+// Forms with data-llm-stream-url (generate) first try a server-sent event stream that fills in
+// the recipe line by line as the provider writes it, and fall back to a job if the stream fails.
+(function() {
+    const MIN_POLL_MS = 1000;
+    const MAX_POLL_MS = 3000;
+
+    function showStatus(resultArea, message) {
+        const status = document.createElement('p');
+        status.className = 'llm-job-status';
+        status.textContent = message;
+        resultArea.replaceChildren(status);
+    }
+
+    function showError(resultArea, message) {
+        const alert = document.createElement('div');
+        alert.className = 'alert alert-danger';
+        alert.style.marginTop = '20px';
+        const label = document.createElement('strong');
+        label.textContent = 'Error:';
+        alert.append(label, ' ' + (message || 'Something went wrong. Please try again.'));
+        resultArea.replaceChildren(alert);
+    }
+
+    function poll(statusUrl, resultArea, done, delay) {
+        window.setTimeout(function() {
+            fetch(statusUrl, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' })
+                .then(function(response) {
+                    if (!response.ok) { throw new Error('Status check failed (' + response.status + ')'); }
+                    return response.json();
+                })
+                .then(function(job) {
+                    if (job.html !== undefined) { // Finished: server-rendered result, same markup as the plain POST
+                        resultArea.innerHTML = job.html;
+                        done();
+                    } else {
+                        poll(statusUrl, resultArea, done, Math.min(delay * 1.5, MAX_POLL_MS));
+                    }
+                })
+                .catch(function(error) {
+                    showError(resultArea, error.message);
+                    done();
+                });
+        }, delay);
+    }
+
+    function submitJob(form, resultArea, done) {
+        const data = new FormData(form);
+        data.append('kind', form.dataset.llmJobKind);
+        showStatus(resultArea, 'Asking the AI chef... this can take up to a minute.');
+
+        fetch(form.dataset.llmJobUrl, {
+            method: 'POST', body: data, credentials: 'same-origin', headers: { 'Accept': 'application/json' }
+        })
+            .then(function(response) {
+                return response.json().then(function(body) { return { ok: response.ok, body: body }; });
+            })
+            .then(function(submitted) {
+                if (!submitted.ok) {
+                    showError(resultArea, submitted.body.error);
+                    done();
+                    return;
+                }
+                poll(submitted.body.status_url, resultArea, done, MIN_POLL_MS);
+            })
+            .catch(function() {
+                form.submit(); // Job endpoint unreachable: wait on the synchronous path instead
+            });
+    }
+
+    function streamingView(resultArea) {
+        // Skeleton filled in as events arrive; replaced by the server-rendered result at the end
+        const area = document.createElement('div');
+        area.className = 'generated-recipe-area llm-streaming';
+        area.style.marginTop = '30px';
+        area.innerHTML = '<h2>AI Generated Recipe: <span data-field="name">...</span></h2>' +
+            '<p data-field="description"></p>' +
+            '<h3>Ingredients:</h3><pre data-field="ingredient"></pre>' +
+            '<h3>Instructions:</h3><pre data-field="instruction"></pre>' +
+            '<p class="llm-job-status">The AI chef is still writing...</p>';
+        resultArea.replaceChildren(area);
+        return area;
+    }
+
+    function streamRecipe(form, resultArea, done) {
+        const params = new URLSearchParams(new FormData(form));
+        const source = new EventSource(form.dataset.llmStreamUrl + '?' + params.toString());
+        let view = null;
+        let finished = false;
+        const field = function(name) {
+            if (!view) { view = streamingView(resultArea); }
+            return view.querySelector('[data-field="' + name + '"]');
+        };
+        const finish = function(event) {
+            finished = true;
+            source.close();
+            resultArea.innerHTML = JSON.parse(event.data).html;
+            done();
+        };
+
+        showStatus(resultArea, 'Asking the AI chef...');
+        source.addEventListener('name', function(event) { field('name').textContent = JSON.parse(event.data).value; });
+        source.addEventListener('description', function(event) { field('description').textContent = JSON.parse(event.data).value; });
+        ['ingredient', 'instruction'].forEach(function(name) {
+            source.addEventListener(name, function(event) { field(name).textContent += JSON.parse(event.data).value + '\n'; });
+        });
+        source.addEventListener('done', finish);
+        source.addEventListener('error', function(event) {
+            if (event.data) { finish(event); return; } // Error reported by the server
+            if (!finished) { // Connection failed or dropped: EventSource would retry the whole generation
+                source.close();
+                submitJob(form, resultArea, done);
+            }
+        });
+    }
+
+    document.querySelectorAll('form[data-llm-job-url]').forEach(function(form) {
+        form.addEventListener('submit', function(event) {
+            const resultArea = document.getElementById('llm-result');
+            if (!window.fetch || !window.FormData || !resultArea) { return; }
+            event.preventDefault();
+
+            const button = form.querySelector('button[type="submit"]');
+            button.disabled = true;
+            const done = function() { button.disabled = false; };
+            if (form.dataset.llmStreamUrl && window.EventSource) {
+                streamRecipe(form, resultArea, done);
+            } else {
+                submitJob(form, resultArea, done);
+            }
+        });
+    });
+})();
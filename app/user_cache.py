@@ -0,0 +1,104 @@
+import uuid
+
+from flask import current_app, has_request_context, session
+from flask_login import UserMixin
+
+from app.caching import LRUCache
+
+# Per-process cache behind the Flask-Login user_loader. Every authenticated request used to load the
+# User row (with its settings joined in) before the view ran; the cache keeps a plain snapshot of both
+# for USER_CACHE_TTL seconds instead. Snapshots hold column values only, never ORM instances, so they
+# are safe to share between requests and threads.
+#
+# Staleness across worker processes: invalidate_user() also stores a fresh version stamp in the
+# user's session cookie, and a cached entry is only used when its stamp matches the request's. The
+# browser that made a change therefore never sees an old snapshot on any worker; other sessions of
+# the same user pick the change up when the TTL runs out.
+#
+# Render-only preferences (the theme) go one step further and live in the session itself, so the
+# context processor never needs the settings at all once they are stored.
+
+VERSION_KEY = '_user_cache_version'
+RENDER_PREFS_KEY = 'render_prefs' # Theme etc. kept in the signed session cookie for page rendering
+
+
+def get_user_cache():
+    return current_app.extensions['user_cache'] # Built per app by init_user_cache
+
+
+class SettingsSnapshot:
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+    def __repr__(self):
+        return f'<SettingsSnapshot for User {self.user_id} - Theme: {self.theme}>'
+
+
+class UserSnapshot(UserMixin):
+    """Read-only stand-in for User as current_user. Views that modify the user load the row itself."""
+
+    def __init__(self, values, settings):
+        self.__dict__.update(values)
+        self.settings = settings
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.email}>'
+
+
+def _column_values(instance):
+    return {column.key: getattr(instance, column.key) for column in instance.__mapper__.column_attrs}
+
+
+def snapshot_user(user):
+    settings = SettingsSnapshot(_column_values(user.settings)) if user.settings else None
+    return UserSnapshot(_column_values(user), settings)
+
+
+def _request_version():
+    return session.get(VERSION_KEY) if has_request_context() else None
+
+
+def load_cached_user(user_id):
+    from app import db
+    from app.models import User
+    user_cache = get_user_cache()
+    if not user_cache.ttl:
+        return db.session.get(User, user_id) # USER_CACHE_TTL=0: no caching
+    version = _request_version()
+    entry = user_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    user = db.session.get(User, user_id)
+    if user is None:
+        user_cache.delete(user_id)
+        return None
+    snapshot = snapshot_user(user)
+    user_cache.set(user_id, (version, snapshot))
+    return snapshot
+
+
+def invalidate_user(user_id):
+    # Call after committing changes to a User or its UserSettings
+    get_user_cache().delete(user_id)
+    if has_request_context():
+        session[VERSION_KEY] = uuid.uuid4().hex[:12]
+
+
+def store_render_preferences(user_id, settings):
+    # Call at login and after saving settings; templates then read these without touching the database
+    prefs = {'user_id': str(user_id), 'theme': settings.theme if settings and settings.theme else 'system'}
+    session[RENDER_PREFS_KEY] = prefs
+    return prefs
+
+
+def render_preferences(user):
+    """The session's render preferences for `user`, stored from its settings on first use."""
+    prefs = session.get(RENDER_PREFS_KEY)
+    if prefs and prefs.get('user_id') == str(user.id): # Not another account's leftovers in this browser
+        return prefs
+    return store_render_preferences(user.id, user.settings)
+
+
+def init_user_cache(app):
+    app.extensions['user_cache'] = LRUCache(maxsize=app.config.get('USER_CACHE_SIZE', 1024),
+                                            ttl=app.config.get('USER_CACHE_TTL', 30))
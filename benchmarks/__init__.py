@@ -0,0 +1,2 @@
+# Standalone micro/macro benchmarks. Run from the repository root, e.g.:
+#   python -m benchmarks.bench_ingredients
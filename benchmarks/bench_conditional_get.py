@@ -0,0 +1,74 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# Revisits of unchanged recipe pages: a full render (no validators sent, as before ETags) versus a
+# revalidation with the ETag from the first visit, which app/http_cache.py answers with an empty 304.
+# Logged in through the session cookie so the real user loader and context processor run.
+#   python -m benchmarks.bench_conditional_get --recipes 2000 --repeat 500
+
+
+def run(client, paths, etags=None):
+    latencies, sizes = [], []
+    for path in paths:
+        headers = {'If-None-Match': etags[path]} if etags else {}
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == (304 if etags else 200), (path, response.status_code)
+        sizes.append(len(response.data))
+    return statistics.median(latencies), sum(sizes) / len(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark 304 revalidation of recipe pages.")
+    parser.add_argument('--recipes', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=500, help="Requests per mode and page kind")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from app import create_app, db
+        from app.models import Recipe
+        from benchmarks.datagen import load_recipes, load_users
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}", 'LLM_CACHE_PATH': ''})
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            with db.engine.begin() as conn:
+                load_recipes(conn, args.recipes, seed=args.seed)
+                user_id, = load_users(conn, 1, seed=args.seed)
+            recipe_ids = [recipe_id for recipe_id, in db.session.query(Recipe.id)]
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        rng = random.Random(args.seed)
+        kinds = {
+            'recipe page': [f'/recipe/{rng.choice(recipe_ids)}' for _ in range(args.repeat)],
+            'list page': [f'/recipes?per_page={rng.choice([20, 50, 100])}' for _ in range(args.repeat)],
+        }
+        print(f"{args.recipes} recipes, {args.repeat} requests per row")
+        print(f"{'page':<12} {'mode':<14} {'p50 ms':>8} {'bytes':>8}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = []
+            for kind, paths in kinds.items():
+                etags = {path: client.get(path).headers['ETag'] for path in set(paths)} # First visits
+                results.append((kind, 'full render', run(client, paths)))
+                results.append((kind, '304', run(client, paths, etags)))
+        for kind, mode, (p50, size) in results:
+            print(f"{kind:<12} {mode:<14} {p50:8.2f} {size:8.0f}")
+
+        with app.app_context():
+            db.engine.dispose() # Release the file before the temporary directory is removed
+
+
+if __name__ == '__main__':
+    main()
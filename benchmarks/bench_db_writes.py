@@ -0,0 +1,128 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# Concurrent writes against a SQLite file, with DB_ENGINE_PROFILE 'default' (driver defaults: rollback
+# journal, full fsync) versus 'tuned' (app/db_tuning.py: WAL, synchronous=NORMAL, busy timeout, ...).
+# Each worker process is a separate app, like gunicorn workers, mixing add_recipe-style inserts
+# (recipe plus ingredient rows), profile-style settings updates, recipe list reads and grocery-list
+# style aggregates, whose longer reads block commits unless the database is in WAL mode.
+#   python -m benchmarks.bench_db_writes --workers 8 --ops 300
+
+OPS = (('add_recipe', 0.35), ('profile', 0.2), ('read', 0.35), ('grocery', 0.1))
+
+
+def worker(profile, url, user_id, ops, seed, ready, go, results):
+    from sqlalchemy import func
+    from sqlalchemy.exc import OperationalError
+    from app import create_app, db
+    from app.models import Recipe, RecipeIngredient, UserSettings
+    from benchmarks.bench_search import synthetic_recipe
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'DB_ENGINE_PROFILE': profile})
+    rng = random.Random(seed)
+    latencies = {name: [] for name, _ in OPS}
+    errors = 0
+    with app.app_context():
+        ready.release()
+        go.wait() # Everyone starts writing at once
+        for _ in range(ops):
+            name = rng.choices([name for name, _ in OPS], [weight for _, weight in OPS])[0]
+            start = time.perf_counter()
+            try:
+                if name == 'add_recipe':
+                    db.session.add(Recipe(**synthetic_recipe(rng))) # Listener builds the ingredient rows
+                    db.session.commit()
+                elif name == 'profile':
+                    settings = UserSettings.query.filter_by(user_id=user_id).one()
+                    settings.theme = rng.choice(['light', 'dark', 'system'])
+                    settings.dietary_restrictions = f"no nuts {rng.random():.6f}"
+                    db.session.commit()
+                elif name == 'read':
+                    Recipe.query.order_by(Recipe.name, Recipe.id).limit(20).all()
+                    db.session.commit()
+                else:
+                    db.session.query(RecipeIngredient.normalized_name, RecipeIngredient.unit,
+                                     func.sum(RecipeIngredient.quantity)).group_by(
+                        RecipeIngredient.normalized_name, RecipeIngredient.unit).all()
+                    db.session.commit()
+            except OperationalError: # "database is locked"
+                db.session.rollback()
+                errors += 1
+                continue
+            latencies[name].append((time.perf_counter() - start) * 1000)
+        db.engine.dispose()
+    results.put((latencies, errors))
+
+
+def run_profile(profile, args, tmp):
+    from app import create_app, db
+    from benchmarks.datagen import load_recipes, load_users
+
+    url = f"sqlite:///{os.path.join(tmp, f'{profile}.db')}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'DB_ENGINE_PROFILE': profile})
+    with app.app_context():
+        db.create_all() # Through the profile's engine, so WAL is set on the file (or not) from the start
+        with db.engine.begin() as conn:
+            load_recipes(conn, args.recipes, seed=args.seed)
+            user_ids = load_users(conn, args.workers, seed=args.seed)
+        db.engine.dispose() # No inherited connections in the forked workers
+
+    results, ready, go = multiprocessing.Queue(), multiprocessing.Semaphore(0), multiprocessing.Event()
+    processes = [multiprocessing.Process(target=worker, args=(profile, url, user_id, args.ops, args.seed + i,
+                                                              ready, go, results))
+                 for i, user_id in enumerate(user_ids)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire() # App built, not yet timed
+    start = time.perf_counter()
+    go.set()
+    collected = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    merged = {name: [] for name, _ in OPS}
+    for latencies, _ in collected:
+        for name, values in latencies.items():
+            merged[name].extend(values)
+    errors = sum(errors for _, errors in collected)
+    completed = sum(len(values) for values in merged.values())
+    print(f"\n{profile}: {completed} ops in {elapsed:.2f}s ({completed / elapsed:.0f} ops/s), "
+          f"{errors} 'database is locked' errors")
+    for name, values in merged.items():
+        if values:
+            values.sort()
+            print(f"  {name:<11} p50 {statistics.median(values):8.2f} ms  p95 {values[int(len(values) * 0.95) - 1]:8.2f} ms  "
+                  f"max {values[-1]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SQLite writes per engine profile.")
+    parser.add_argument('--workers', type=int, default=8, help="Worker processes writing at once")
+    parser.add_argument('--ops', type=int, default=300, help="Operations per worker")
+    parser.add_argument('--recipes', type=int, default=2000, help="Recipes loaded before the run")
+    parser.add_argument('--profiles', nargs='+', default=['default', 'tuned'])
+    parser.add_argument('--dir', help="Directory for the database files (default: a temporary one); use the "
+                                       "production disk, fsync cost depends on it")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        os.environ['LLM_CACHE_PATH'] = '' # Read by the worker processes' Config too
+        print(f"{args.workers} processes x {args.ops} ops ({', '.join(f'{name} {weight:.0%}' for name, weight in OPS)})")
+        for profile in args.profiles:
+            run_profile(profile, args, tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# /recipes render time with every row rendered (RECIPE_FRAGMENT_CACHE_SIZE=0, as before) versus rows
+# assembled from app/fragment_cache.py, per page size. No validators are sent, so every request
+# renders the page; bench_conditional_get.py covers the 304 path.
+#   python -m benchmarks.bench_fragment_cache --recipes 2000 --repeat 300
+
+
+def run(client, paths):
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        response = client.get(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (path, response.status_code)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recipe list fragment cache.")
+    parser.add_argument('--recipes', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=300, help="Requests per mode and page size")
+    parser.add_argument('--per-page', type=int, nargs='+', default=[20, 50, 100])
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from app import create_app, db
+        from app.models import Recipe
+        from app.pagination import encode_cursor
+        from benchmarks.datagen import load_recipes, load_users
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}", 'LLM_CACHE_PATH': ''})
+        fragment_cache = app.extensions['fragment_cache']
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            with db.engine.begin() as conn:
+                load_recipes(conn, args.recipes, seed=args.seed)
+                user_id, = load_users(conn, 1, seed=args.seed)
+            keys = db.session.query(Recipe.name, Recipe.id).order_by(Recipe.name, Recipe.id).all()
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        rng = random.Random(args.seed)
+        size = fragment_cache.maxsize
+        print(f"{args.recipes} recipes, {args.repeat} list pages per row (random positions)")
+        print(f"{'per_page':>8} {'no cache p50 ms':>16} {'cached p50 ms':>14}")
+        for per_page in args.per_page:
+            # Pages starting at random rows, so the cache sees the whole catalog (up to its size)
+            paths = [f'/recipes?per_page={per_page}&after={encode_cursor(rng.choice(keys))}' for _ in range(args.repeat)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                fragment_cache.maxsize = 0
+                fragment_cache.clear()
+                uncached = run(client, paths)
+                fragment_cache.maxsize = size
+                run(client, paths) # Warm up
+                cached = run(client, paths)
+            print(f"{per_page:>8} {uncached:16.2f} {cached:14.2f}")
+
+        with app.app_context():
+            db.engine.dispose() # Release the file before the temporary directory is removed
+
+
+if __name__ == '__main__':
+    main()
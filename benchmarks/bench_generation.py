@@ -0,0 +1,86 @@
+import argparse
+import contextlib
+import io
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.llm_service import FASTEST, LLMServiceClient
+from app.llm_standin import StandInBehaviour, start_standin_server
+
+# End-to-end generation benchmark against the local LLM stand-in (app/llm_standin.py): real HTTP
+# to both provider shapes, parsing, circuit breakers, adaptive timeouts and hedging, no keys needed.
+#   python -m benchmarks.bench_generation --latency lognormal:0.3,0.6 --error-rate 0.05 --hang-rate 0.01
+
+
+def run(client, provider, mode, total, concurrency):
+    latencies, outcomes = [], Counter()
+    api_keys = {'gemini': 'bench-gemini-key', 'hugging_face': 'bench-hf-key'}
+
+    def one(n):
+        prompt = f"bench dish {n}"
+        start = time.perf_counter()
+        if mode == 'stream':
+            event, result = list(client.stream_recipe(prompt, provider=provider, api_keys=api_keys, use_cache=False))[-1]
+        else:
+            result = client.generate_recipe(prompt, provider=provider, api_keys=api_keys, use_cache=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        outcomes[result.get('error', 'ok')] += 1
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # The client logs every call
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{provider:<13} {mode:<8} {total / elapsed:7.1f} req/s  p50 {statistics.median(latencies):8.1f} ms  "
+          f"p95 {p95:8.1f} ms  {dict(outcomes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recipe generation end to end against the local LLM stand-in.")
+    parser.add_argument('--requests', type=int, default=200, help="Generations per provider and mode")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--providers', nargs='+', default=['hugging_face', 'gemini', FASTEST])
+    parser.add_argument('--modes', nargs='+', default=['generate', 'stream'], choices=['generate', 'stream'])
+    parser.add_argument('--latency', default='lognormal:0.3,0.5', help="Stand-in latency distribution (see flask llm-standin --help)")
+    parser.add_argument('--token-delay', type=float, default=0.002)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--hang-rate', type=float, default=0.0)
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--timeout-max', type=float, default=10.0, help="Client timeout ceiling (LLM_TIMEOUT_MAX)")
+    parser.add_argument('--hedge-delay', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    behaviour = StandInBehaviour(latency=args.latency, token_delay=args.token_delay, error_rate=args.error_rate,
+                                 hang_rate=args.hang_rate, hang_seconds=args.hang_seconds, seed=args.seed)
+    server, base_url = start_standin_server(behaviour)
+    client = LLMServiceClient(hf_api_base_url=f"{base_url}/models", gemini_api_endpoint=base_url,
+                              pool_maxsize=args.concurrency, max_retries=0, hedge_delay=args.hedge_delay,
+                              hedge_workers=2 * args.concurrency, # Up to two legs per caller; fewer queues them
+                              timeout={'minimum': 0.5, 'maximum': args.timeout_max})
+    print(f"Stand-in at {base_url}: latency {args.latency}, errors {args.error_rate:.0%}, hangs {args.hang_rate:.0%}; "
+          f"{args.requests} generations x {args.concurrency} callers")
+    try:
+        for mode in args.modes:
+            for provider in args.providers:
+                if mode == 'stream' and provider == FASTEST:
+                    continue # Streaming always uses a single provider
+                run(client, provider, mode, args.requests, args.concurrency)
+        print("\nCircuits:")
+        for name, state in client.guards.snapshot().items():
+            print(f"  {name:<50} {state['state']:<9} opened {state['times_opened']}x  timeout {state['timeout']:.2f}s")
+        print(f"Hedging: {client.hedge_stats.snapshot()}")
+        print(f"Stand-in: {requests.get(f'{base_url}/stats', timeout=5).json()}")
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from app.llm_service import LLMServiceClient
+
+# Compares one-off requests.post() calls against the client's pooled keep-alive session,
+# using a local stand-in for the Hugging Face Inference API. --connect-delay adds a pause to
+# every new TCP connection to approximate the DNS/TCP/TLS setup a remote endpoint costs.
+
+RESPONSE_BODY = json.dumps([{'generated_text': "Recipe Name: Bench Soup\nIngredients:\nWater\nInstructions:\n1. Boil."}]).encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep connections open between requests
+    disable_nagle_algorithm = True # Headers and body are separate writes; avoid delayed-ACK stalls
+    connect_delay = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+        time.sleep(self.connect_delay)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def one_off_call(url):
+    response = requests.post(url, headers={"Authorization": "Bearer bench"},
+                             json={"inputs": "soup"}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def run(label, call, requests_total, concurrency):
+    StandInHandler.connections = 0
+    latencies = []
+
+    def timed_call(_):
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # The client logs every call
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed_call, range(requests_total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<22} {requests_total / elapsed:8.0f} req/s  p50 {statistics.median(latencies):6.2f} ms  "
+          f"p95 {p95:6.2f} ms  connections opened: {StandInHandler.connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs per-call HTTP connections for the HF client.")
+    parser.add_argument('--requests', type=int, default=500, help="Calls per scenario")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent callers")
+    parser.add_argument('--connect-delay', type=float, default=5.0, help="Simulated connection setup cost (ms)")
+    args = parser.parse_args()
+
+    StandInHandler.connect_delay = args.connect_delay / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/models"
+    print(f"Stand-in server at {base_url}, {args.connect_delay:g} ms per new connection, "
+          f"{args.requests} calls x {args.concurrency} callers")
+
+    client = LLMServiceClient(hf_api_base_url=base_url, pool_maxsize=args.concurrency)
+    try:
+        for concurrency in sorted({1, args.concurrency}):
+            run(f"requests.post (c={concurrency})", lambda: one_off_call(f"{base_url}/bench-model"),
+                args.requests, concurrency)
+            run(f"pooled session (c={concurrency})",
+                lambda: client._call_huggingface_inference_api('bench-model', 'soup', 'bench'),
+                args.requests, concurrency)
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import random
+import time
+
+from app import ingredients
+
+NAMES = ['flour', 'sugar', 'brown sugar', 'butter', 'olive oil', 'milk', 'eggs', 'garlic', 'onion',
+         'chicken breast', 'ground beef', 'rice', 'pasta', 'tomato sauce', 'diced tomatoes', 'salt',
+         'black pepper', 'cumin', 'paprika', 'vanilla extract', 'baking soda', 'parmesan cheese',
+         'heavy cream', 'lemon juice', 'soy sauce', 'honey', 'carrots', 'celery', 'potatoes', 'basil']
+AMOUNTS = ['1', '2', '3', '1/2', '1/4', '3/4', '1 1/2', '2 1/4', '½', '1½', '0.5', '2-3', '1 to 2']
+UNITS = ['cup', 'cups', 'tbsp', 'tablespoons', 'tsp', 'teaspoon', 'oz', 'lb', 'g', 'kg', 'ml', 'l',
+         'cloves', 'can', 'pinch', '']
+NOTES = ['', ', chopped', ', diced', ' (optional)', ' to taste', ', softened', ' (about 2 cups)']
+
+
+def synthetic_line(rng):
+    amount = rng.choice(AMOUNTS)
+    unit = rng.choice(UNITS)
+    if rng.random() < 0.15:
+        return f"{rng.choice(NAMES).title()}{rng.choice(NOTES)}" # Unquantified line
+    bullet = '- ' if rng.random() < 0.3 else ''
+    return f"{bullet}{amount} {unit + ' ' if unit else ''}{rng.choice(NAMES)}{rng.choice(NOTES)}"
+
+
+def build_corpus(recipes, lines_per_recipe, seed):
+    rng = random.Random(seed)
+    return [[synthetic_line(rng) for _ in range(lines_per_recipe)] for _ in range(recipes)]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingredient parsing and grocery list consolidation.")
+    parser.add_argument('--recipes', type=int, default=20000, help="Synthetic recipes in the corpus")
+    parser.add_argument('--lines', type=int, default=12, help="Ingredient lines per recipe")
+    parser.add_argument('--selection', type=int, default=500, help="Recipes combined into one grocery list")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.recipes, args.lines, args.seed)
+    all_lines = [line for recipe in corpus for line in recipe]
+    distinct = len(set(all_lines))
+    print(f"Corpus: {len(all_lines)} lines ({distinct} distinct) across {args.recipes} recipes")
+
+    ingredients._parse_line.cache_clear()
+    _, cold_ms = timed(lambda: [ingredients.parse_ingredient_line(l) for l in all_lines])
+    _, warm_ms = timed(lambda: [ingredients.parse_ingredient_line(l) for l in all_lines])
+    print(f"Parse, cold cache: {cold_ms:8.1f} ms  ({len(all_lines) / cold_ms * 1000:,.0f} lines/s)")
+    print(f"Parse, warm cache: {warm_ms:8.1f} ms  ({len(all_lines) / warm_ms * 1000:,.0f} lines/s)")
+
+    selection = [line for recipe in corpus[:args.selection] for line in recipe]
+    ingredients._parse_line.cache_clear()
+    items, cold_consolidate_ms = timed(ingredients.consolidate, selection)
+    _, warm_consolidate_ms = timed(ingredients.consolidate, selection)
+    _, format_ms = timed(lambda: [ingredients.format_grocery_item(*item) for item in items])
+    print(f"Consolidate {args.selection} recipes ({len(selection)} lines -> {len(items)} items): "
+          f"{cold_consolidate_ms:.2f} ms cold, {warm_consolidate_ms:.2f} ms warm, {format_ms:.2f} ms formatting")
+    info = ingredients._parse_line.cache_info()
+    print(f"Parse cache: {info.hits} hits, {info.misses} misses, {info.currsize}/{info.maxsize} entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Bulk import/export (app/recipe_io.py) over growing JSONL catalogs: rows/s and peak Python memory,
+# which should stay flat as the file grows, plus the old one-recipe-per-commit ORM path (what
+# add_recipe does) on a small slice for comparison. Rates come from untraced runs; peaks from a
+# separate run under tracemalloc, which slows everything down. The import peak includes
+# parse_ingredient_line's memo (app/ingredients.py), which grows until PARSE_CACHE_SIZE distinct
+# lines and then stays put.
+#   python -m benchmarks.bench_recipe_io --recipes 10000 50000
+
+
+def write_catalog(path, count, seed):
+    from benchmarks.bench_search import synthetic_recipe
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            f.write(json.dumps(synthetic_recipe(rng)) + '\n')
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def peak_kib(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def one_commit_per_recipe(path, limit):
+    from app import db
+    from app.models import Recipe
+    with open(path, encoding='utf-8') as f:
+        for _, line in zip(range(limit), f):
+            db.session.add(Recipe(**json.loads(line)))
+            db.session.commit()
+    return limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming recipe import/export.")
+    parser.add_argument('--recipes', type=int, nargs='+', default=[10000, 50000], help="Catalog sizes")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--orm-recipes', type=int, default=1000, help="Recipes for the one-commit-per-recipe baseline")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from app import create_app, db
+        from app.recipe_io import export_recipes, import_recipes
+
+        print(f"{'recipes':>8} {'MB':>7} {'import rows/s':>14} {'import peak KiB':>16} {'export rows/s':>14} {'export peak KiB':>16}")
+        for count in args.recipes:
+            path = os.path.join(tmp, f'catalog-{count}.jsonl')
+            write_catalog(path, count, args.seed)
+            with contextlib.redirect_stdout(io.StringIO()):
+                app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, f'bench-{count}.db')}",
+                                  'LLM_CACHE_PATH': ''})
+            with app.app_context():
+                def run_import():
+                    db.create_all()
+                    with open(path, encoding='utf-8') as f:
+                        result = import_recipes(f, 'jsonl', args.batch_size)
+                    assert result.imported == count, result.summary()
+                    db.session.remove()
+                run_export = lambda: sum(chunk.count('\n') for chunk in export_recipes('jsonl'))
+
+                _, import_seconds = timed(run_import)
+                exported, export_seconds = timed(run_export)
+                assert exported == count, exported
+                export_peak = peak_kib(run_export)
+                db.drop_all()
+                import_peak = peak_kib(run_import)
+                print(f"{count:>8} {os.path.getsize(path) / 1e6:7.1f} {count / import_seconds:14.0f} {import_peak:16.0f} "
+                      f"{count / export_seconds:14.0f} {export_peak:16.0f}")
+
+                db.session.remove()
+                db.drop_all()
+                db.create_all()
+                if count == args.recipes[0] and args.orm_recipes:
+                    done, seconds = timed(lambda: one_commit_per_recipe(path, args.orm_recipes))
+                    print(f"  one ORM commit per recipe ({done}): {done / seconds:.0f} rows/s")
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import random
+import time
+
+from app.recipe_parser import IncrementalRecipeParser
+from benchmarks.bench_ingredients import NAMES, synthetic_line
+
+# Recipe text parsing over the shapes the providers return: the plain prompted format (Hugging Face),
+# Gemini's markdown, chatty preambles/epilogues, and very long responses. Also times the previous
+# lower()/split(':') parser (LegacyRecipeParser below) and checks the two agree on the plain format.
+#   python -m benchmarks.bench_recipe_parser --responses 2000 --long-lines 5000
+
+STEPS = ['Chop', 'Stir', 'Simmer', 'Bake', 'Whisk', 'Fold', 'Season', 'Rest']
+
+
+class LegacyRecipeParser:
+    # app/recipe_parser.py before the compiled-regex version, verbatim, as the baseline
+    def __init__(self, default_name=""):
+        self.name = default_name
+        self.description = ""
+        self.ingredients = []
+        self.instructions = []
+        self._section = None
+        self._buffer = ""
+        self._chunks = []
+
+    @property
+    def text(self):
+        # Everything fed so far, for final validation/parsing of the complete response
+        return "".join(self._chunks)
+
+    def feed(self, chunk):
+        """Add a chunk of text; returns (field, value) events for the lines it completed.
+
+        Events are ('name', name), ('description', description so far), ('ingredient', line)
+        and ('instruction', line).
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        lines = (self._buffer + chunk).split('\n')
+        self._buffer = lines.pop() # Last piece may be an incomplete line
+        events = []
+        for line in lines:
+            events.extend(self._parse_line(line))
+        return events
+
+    def close(self):
+        # Flush the trailing line once the response has ended
+        line, self._buffer = self._buffer, ""
+        return self._parse_line(line)
+
+    def recipe_data(self):
+        return {"name": self.name, "description": self.description,
+                "ingredients": "\n".join(self.ingredients), "instructions": "\n".join(self.instructions)}
+
+    def _parse_line(self, line):
+        line_s = line.strip()
+        if not line_s: return [] # Skip empty lines
+
+        line_l = line_s.lower()
+        if line_l.startswith("recipe name:"):
+            self.name = line_s.split(":", 1)[1].strip()
+            self._section = None
+            return [('name', self.name)]
+        if line_l.startswith("description:"):
+            self.description = line_s.split(":", 1)[1].strip()
+            self._section = "description"
+            return [('description', self.description)] if self.description else []
+        if line_l.startswith("ingredients:"):
+            self._section = "ingredients"
+            # If the line itself is "Ingredients:", don't add it as an ingredient
+            return self._append(self.ingredients, 'ingredient', line_s.split(":", 1)[1].strip())
+        if line_l.startswith("instructions:"):
+            self._section = "instructions"
+            return self._append(self.instructions, 'instruction', line_s.split(":", 1)[1].strip())
+        if self._section == "description":
+            self.description = self.description + "\n" + line_s if self.description else line_s
+            return [('description', self.description)]
+        if self._section == "ingredients":
+            return self._append(self.ingredients, 'ingredient', line_s)
+        if self._section == "instructions":
+            return self._append(self.instructions, 'instruction', line_s)
+        return []
+
+    @staticmethod
+    def _append(target, field, value):
+        if not value:
+            return []
+        target.append(value)
+        return [(field, value)]
+
+
+def plain_response(rng, ingredients, steps):
+    return (f"Recipe Name: {rng.choice(NAMES).title()} Bake\nDescription: A simple bake.\nServes four.\nIngredients:\n"
+            + "\n".join(synthetic_line(rng) for _ in range(ingredients))
+            + "\nInstructions:\n" + "\n".join(f"{i}. {rng.choice(STEPS)} for {rng.randint(2, 30)} minutes."
+                                              for i in range(1, steps + 1)))
+
+
+def markdown_response(rng, ingredients, steps):
+    bullet = rng.choice(['* ', '- ', '• '])
+    return (f"Here's a recipe you might enjoy!\n\n## {rng.choice(NAMES).title()} Skillet\n\n"
+            "**Description:** A one-pan dinner.\n\n### Ingredients\n"
+            + "\n".join(bullet + synthetic_line(rng).lstrip('- ') for _ in range(ingredients))
+            + "\n\n**Instructions:**\n" + "\n".join(f"{i}. **{rng.choice(STEPS)}** the mix." for i in range(1, steps + 1))
+            + "\n\nEnjoy your meal!")
+
+
+def build_corpus(responses, long_lines, seed):
+    rng = random.Random(seed)
+    corpus = {'plain': [], 'markdown': []}
+    for _ in range(responses):
+        corpus['plain'].append(plain_response(rng, rng.randint(5, 15), rng.randint(3, 10)))
+        corpus['markdown'].append(markdown_response(rng, rng.randint(5, 15), rng.randint(3, 10)))
+    corpus['long'] = [plain_response(rng, long_lines, long_lines) for _ in range(3)]
+    return corpus
+
+
+def parse(text, parser_class=IncrementalRecipeParser):
+    parser = parser_class(default_name="AI Generated Recipe")
+    parser.feed(text)
+    parser.close()
+    return parser.recipe_data()
+
+
+def streamed(text, parser_class=IncrementalRecipeParser, chunk_size=16):
+    parser = parser_class(default_name="AI Generated Recipe")
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start:start + chunk_size])
+    parser.close()
+    return parser.recipe_data()
+
+
+def timed(fn, parser_class, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text, parser_class)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing of LLM recipe responses.")
+    parser.add_argument('--responses', type=int, default=2000, help="Responses per format")
+    parser.add_argument('--long-lines', type=int, default=5000, help="Ingredient and instruction lines in the long responses")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the best is reported")
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.responses, args.long_lines, args.seed)
+    mismatches = sum(parse(text) != parse(text, LegacyRecipeParser) for text in corpus['plain'] + corpus['long'])
+    print(f"Plain-format outputs where the parsers disagree: {mismatches}")
+    unparsed = lambda parser_class: sum(not parse(text, parser_class)['ingredients'] for text in corpus['markdown'])
+    print(f"Markdown outputs without ingredients: legacy {unparsed(LegacyRecipeParser)}/{len(corpus['markdown'])}, "
+          f"current {unparsed(IncrementalRecipeParser)}/{len(corpus['markdown'])}")
+
+    print(f"{'corpus':<10} {'MB':>6} {'legacy ms':>10} {'current ms':>11} {'legacy streamed':>16} {'current streamed':>17}")
+    for label, texts in corpus.items():
+        size = sum(len(text) for text in texts) / 1e6
+        print(f"{label:<10} {size:6.2f} {timed(parse, LegacyRecipeParser, texts, args.repeat):10.1f} "
+              f"{timed(parse, IncrementalRecipeParser, texts, args.repeat):11.1f} "
+              f"{timed(streamed, LegacyRecipeParser, texts, args.repeat):16.1f} "
+              f"{timed(streamed, IncrementalRecipeParser, texts, args.repeat):17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from unittest.mock import patch
+
+# Route-level benchmark: bulk-loads a synthetic catalog into a throwaway SQLite database, then
+# drives the Flask test client (login mocked like tests/test_app.py) and reports p50/p95 latency,
+# SQL statements and peak Python memory per route. --output saves the run as JSON and --baseline
+# compares against an earlier one, e.g.:
+#   python -m benchmarks.bench_routes --recipes 10000 100000 --output baseline.json
+#   python -m benchmarks.bench_routes --recipes 10000 100000 --baseline baseline.json
+
+
+def percentile(sorted_values, q):
+    return sorted_values[max(0, int(len(sorted_values) * q) - 1)]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def scenarios(recipe_ids, deep_cursor, selection, rng):
+    # name -> callable returning (method, url, form data) for one request
+    return {
+        'recipes': lambda: ('GET', '/recipes', None),
+        'recipes_deep_page': lambda: ('GET', f'/recipes?after={deep_cursor}', None),
+        'recipe_detail': lambda: ('GET', f'/recipe/{rng.choice(recipe_ids)}', None),
+        'grocery_list_10': lambda: ('POST', '/generate-grocery-list', {'recipe_ids': rng.sample(recipe_ids, 10)}),
+        f'grocery_list_{selection}': lambda: ('POST', '/generate-grocery-list',
+                                              {'recipe_ids': rng.sample(recipe_ids, min(selection, len(recipe_ids)))}),
+        'profile': lambda: ('GET', '/profile', None),
+    }
+
+
+def measure(client, make_request, counter, repeat, warmup):
+    for _ in range(warmup):
+        method, url, data = make_request()
+        client.open(url, method=method, data=data)
+
+    latencies, queries, status = [], [], None
+    for _ in range(repeat):
+        method, url, data = make_request()
+        counter.count = 0
+        start = time.perf_counter()
+        response = client.open(url, method=method, data=data)
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        status = response.status_code
+
+    method, url, data = make_request() # Separate traced request: tracemalloc slows everything down
+    tracemalloc.start()
+    client.open(url, method=method, data=data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {'status': status, 'requests': repeat, 'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3), 'max_ms': round(latencies[-1], 3),
+            'queries': max(queries), 'peak_memory_kb': round(peak / 1024, 1)}
+
+
+def run_dataset(app, recipe_count, args):
+    from sqlalchemy import event, select
+
+    from app import db
+    from app.models import Recipe, User
+    from app.pagination import encode_cursor
+    from benchmarks.datagen import load_recipes, load_users
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        start = time.perf_counter()
+        with db.engine.begin() as conn:
+            recipe_ids = load_recipes(conn, recipe_count, seed=args.seed)
+            user_ids = load_users(conn, args.users, seed=args.seed)
+        load_seconds = time.perf_counter() - start
+        deep = db.session.execute(select(Recipe.name, Recipe.id).order_by(Recipe.name, Recipe.id)
+                                  .offset(int(recipe_count * 0.9)).limit(1)).one()
+        engine = db.engine
+    print(f"\n{recipe_count} recipes, {args.users} users loaded in {load_seconds:.1f}s")
+
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    rng = random.Random(args.seed)
+    user_id = rng.choice(user_ids)
+    client = app.test_client()
+    results = {}
+    try:
+        # Every request loads the user afresh, as Flask-Login's user_loader would
+        with patch('flask_login.utils._get_user', side_effect=lambda: db.session.get(User, user_id)), \
+             contextlib.redirect_stdout(io.StringIO()):
+            for name, make_request in scenarios(recipe_ids, encode_cursor(deep), args.selection, rng).items():
+                results[name] = measure(client, make_request, counter, args.repeat, args.warmup)
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+    for name, result in results.items():
+        print(f"  {name:<20} {result['status']}  p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+              f"{result['queries']:3d} queries  peak {result['peak_memory_kb']:8.1f} KiB")
+    return {'recipes': recipe_count, 'users': args.users, 'load_seconds': round(load_seconds, 2), 'routes': results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(run, baseline, tolerance):
+    """Print p95/query changes against a baseline run; returns the regressions beyond `tolerance`."""
+    regressions = []
+    print(f"\nAgainst baseline from {baseline.get('created_at')} (commit {baseline.get('git_commit')}):")
+    for size, dataset in run['datasets'].items():
+        base_routes = baseline.get('datasets', {}).get(size, {}).get('routes', {})
+        for name, result in dataset['routes'].items():
+            base = base_routes.get(name)
+            if not base:
+                continue
+            change = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0.0
+            flags = []
+            if change > tolerance:
+                flags.append('SLOWER')
+            if result['queries'] > base['queries']:
+                flags.append('MORE QUERIES')
+            if flags:
+                regressions.append((size, name, flags))
+            print(f"  {size:>7} {name:<20} p95 {base['p95_ms']:8.2f} -> {result['p95_ms']:8.2f} ms ({change:+.0%})  "
+                  f"queries {base['queries']} -> {result['queries']}  {' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main routes against large synthetic datasets.")
+    parser.add_argument('--recipes', type=int, nargs='+', default=[10000], help="Dataset sizes to run, e.g. 10000 100000")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--selection', type=int, default=500, help="Recipes selected for the large grocery list")
+    parser.add_argument('--repeat', type=int, default=50, help="Timed requests per route")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against a JSON file written by --output")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 slowdown vs the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from app import create_app, db
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}", 'LLM_CACHE_PATH': ''})
+        run = {'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z', 'git_commit': git_commit(),
+               'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+               'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')}, 'datasets': {}}
+        for recipe_count in args.recipes:
+            run['datasets'][str(recipe_count)] = run_dataset(app, recipe_count, args)
+        with app.app_context():
+            db.engine.dispose() # Release the file before the temporary directory is removed
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(run, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond the baseline")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+
+from app import db
+from app.config import Config
+from app.models import Recipe
+from app.search import FTS_TABLE, build_fts_query, fts_search, search_terms
+from benchmarks.bench_ingredients import NAMES, synthetic_line
+
+DISHES = ['soup', 'stew', 'salad', 'pasta', 'curry', 'bake', 'pie', 'tacos', 'stir-fry', 'risotto', 'casserole']
+STYLES = ['Spicy', 'Creamy', 'Lemon', 'Garlic', 'Smoky', 'Herbed', 'Rustic', 'Quick', 'Roasted', 'Thai']
+QUERIES = ['chicken', 'lemon garlic', 'creamy pasta', 'paprika', 'risot', 'smoky beef stew', 'vanilla honey', 'zzz']
+
+
+def synthetic_recipe(rng):
+    main = rng.choice(NAMES)
+    name = f"{rng.choice(STYLES)} {main.title()} {rng.choice(DISHES).title()}"
+    return {
+        'name': name[:100],
+        'description': f"A {rng.choice(STYLES).lower()} {rng.choice(DISHES)} built around {main}.",
+        'ingredients': '\n'.join(synthetic_line(rng) for _ in range(rng.randint(5, 14))),
+        'instructions': '\n'.join(f"{i + 1}. {rng.choice(['Chop', 'Stir', 'Simmer', 'Bake', 'Whisk'])} the "
+                                  f"{rng.choice(NAMES)} for {rng.randint(2, 30)} minutes." for i in range(rng.randint(3, 8))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FTS5 recipe search on a synthetic catalog.")
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50, help="Timed runs per query")
+    parser.add_argument('--limit', type=int, default=25)
+    parser.add_argument('--rank-cap', type=int, default=Config.RECIPE_SEARCH_RANK_CAP,
+                        help="Rank only the newest N matches above N (RECIPE_SEARCH_RANK_CAP; 0 ranks all)")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'search.db')}")
+        db.metadata.create_all(engine, tables=[Recipe.__table__]) # Also creates recipe_fts and its triggers
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for offset in range(0, args.recipes, 5000):
+                conn.execute(insert(Recipe.__table__), [synthetic_recipe(rng) for _ in range(min(5000, args.recipes - offset))])
+        print(f"Loaded {args.recipes} recipes (FTS maintained by triggers) in {time.perf_counter() - start:.1f}s")
+
+        with engine.connect() as conn:
+            for query in QUERIES:
+                terms = search_terms(query)
+                timings = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    results = fts_search(conn, terms, args.limit, args.rank_cap)
+                    timings.append((time.perf_counter() - t0) * 1000)
+                timings.sort()
+                p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+                count = lambda q: conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q"),
+                                               {'q': q}).scalar()
+                matches = count(build_fts_query(terms)) or count(build_fts_query(terms, prefix_last=True))
+                capped = ' (capped)' if results.is_partial else ''
+                print(f"{query!r:22} {matches:7d} matches {len(results):3d} hits  "
+                      f"p50 {statistics.median(timings):6.2f} ms  p95 {p95:6.2f} ms{capped}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
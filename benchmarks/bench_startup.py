@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Cold-start cost: `python -X importtime -c "import app"` (what every worker boot, test process and
+# flask CLI command pays; builds no app) plus wall-clock time of a worker boot (importing run.py, which
+# builds the served app) and of a migration command. Each sample is a fresh interpreter. Results can be saved and compared like bench_routes:
+#   python -m benchmarks.bench_startup --output startup.json
+#   python -m benchmarks.bench_startup --baseline startup.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['google.generativeai', 'google.ai.generativelanguage', 'google.api_core', 'grpc', 'IPython']
+COMMANDS = {
+    'worker_import': [sys.executable, '-c', 'from run import app'],
+    'flask_db_heads': [sys.executable, '-m', 'flask', '--app', 'app:create_app', 'db', 'heads'], # Reads migrations only, no database
+}
+
+
+def import_profile():
+    """{module: (self_us, cumulative_us, depth)} from one `-X importtime` run of `import app`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        profile[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return profile
+
+
+def wall_ms(command):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app import time and CLI cold start.")
+    parser.add_argument('--repeat', type=int, default=7, help="Fresh interpreters per measurement; the median is reported")
+    parser.add_argument('--top', type=int, default=12, help="Heaviest top-level imports to list")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against a JSON file written by --output")
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.repeat)]
+    import_ms = statistics.median(profile['app'][1] for profile in profiles) / 1000
+    last = profiles[-1]
+    loaded = [name for name in HEAVY_MODULES if name in last]
+    print(f"import app: {import_ms:.1f} ms (median of {args.repeat}); heavy SDKs imported: {', '.join(loaded) or 'none'}")
+    children = sorted(((cumulative, name) for name, (_, cumulative, depth) in last.items() if depth == 1), reverse=True)
+    for cumulative, name in children[:args.top]:
+        print(f"  {name:<40} {cumulative / 1000:8.1f} ms")
+
+    run = {'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z', 'git_commit': git_commit(),
+           'python': platform.python_version(), 'import_app_ms': round(import_ms, 1), 'heavy_modules': loaded,
+           'commands_ms': {}}
+    for name, command in COMMANDS.items():
+        run['commands_ms'][name] = round(statistics.median(wall_ms(command) for _ in range(args.repeat)), 1)
+        print(f"{name:<20} {run['commands_ms'][name]:8.1f} ms wall")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nAgainst baseline from {baseline.get('created_at')} (commit {baseline.get('git_commit')}):")
+        print(f"  import app      {baseline['import_app_ms']:8.1f} -> {run['import_app_ms']:8.1f} ms")
+        for name, value in run['commands_ms'].items():
+            if name in baseline.get('commands_ms', {}):
+                print(f"  {name:<15} {baseline['commands_ms'][name]:8.1f} -> {value:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# SQL statements and latency per request with the Flask-Login user_loader going to the database on
+# every request (USER_CACHE_TTL=0) versus the cached snapshot from app/user_cache.py. Users log in
+# through the session cookie so the real loader runs, unlike bench_routes.py which mocks it.
+#   python -m benchmarks.bench_user_loader --recipes 2000 --users 200 --repeat 200
+
+PATHS = ['/recipes', '/profile', '/generate-recipe-llm', '/grocery-list']
+
+
+def run(client, visits, recorder_class, engine):
+    # visits: [(user_id, path)]
+    latencies, queries = [], []
+    for user_id, path in visits:
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        with recorder_class(engine) as recorder:
+            start = time.perf_counter()
+            response = client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (path, response.status_code)
+        queries.append(recorder.count)
+    return statistics.median(latencies), sum(queries) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cached Flask-Login user loader.")
+    parser.add_argument('--recipes', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200, help="Distinct users making requests")
+    parser.add_argument('--repeat', type=int, default=200, help="Requests per mode")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from app import create_app, db
+        from app.query_budget import QueryRecorder
+        from benchmarks.datagen import load_recipes, load_users
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}", 'LLM_CACHE_PATH': ''})
+        user_cache = app.extensions['user_cache']
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            with db.engine.begin() as conn:
+                load_recipes(conn, args.recipes, seed=args.seed)
+                user_ids = load_users(conn, args.users, seed=args.seed)
+            engine = db.engine
+
+        client = app.test_client()
+        rng = random.Random(args.seed)
+        warmup = [(user_id, '/profile') for user_id in user_ids] # Each user once
+        visits = [(rng.choice(user_ids), rng.choice(PATHS)) for _ in range(args.repeat)]
+        ttl = user_cache.ttl
+        print(f"{args.recipes} recipes, {args.users} users, {args.repeat} requests over {', '.join(PATHS)}")
+        print(f"{'user loader':<22} {'p50 ms':>8} {'queries/request':>16}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = {}
+            for label, mode_ttl in (('query every request', 0), (f'cached ({ttl}s TTL)', ttl)):
+                user_cache.ttl = mode_ttl
+                user_cache.clear()
+                run(client, warmup, QueryRecorder, engine)
+                results[label] = run(client, visits, QueryRecorder, engine)
+        for label, (p50, queries) in results.items():
+            print(f"{label:<22} {p50:8.2f} {queries:16.2f}")
+        (_, before), (_, after) = results.values()
+        print(f"Saved queries per request: {before - after:.2f}")
+
+        user_cache.ttl = ttl
+        with app.app_context():
+            db.engine.dispose() # Release the file before the temporary directory is removed
+
+
+if __name__ == '__main__':
+    main()
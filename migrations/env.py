@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+from app.search import FTS_TABLE
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -51,6 +53,14 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # recipe_fts (app/search.py) and its FTS5 shadow tables are created by raw DDL, not the models;
+    # without this, autogenerate and `flask db check` would want to drop them
+    if type_ == 'table' and reflected and compare_to is None:
+        return not (name == FTS_TABLE or name.startswith(f'{FTS_TABLE}_'))
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +75,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,10 +104,17 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # app/db_tuning.py turns foreign keys on; batch migrations recreate tables, and dropping the
+            # old copy of a parent table would otherwise cascade-delete its child rows
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit() # End the autobegun transaction: the PRAGMA is a no-op inside one, and alembic
+                                # would treat it as the caller's and never commit the migration
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
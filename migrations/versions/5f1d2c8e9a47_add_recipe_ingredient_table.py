@@ -0,0 +1,100 @@
+"""Add RecipeIngredient table and backfill it from Recipe.ingredients
+
+Revision ID: 5f1d2c8e9a47
+Revises: c2923486a414
+Create Date: 2026-10-18 09:12:03.418220
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1d2c8e9a47'
+down_revision = 'c2923486a414'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 500 # Recipes per SELECT/INSERT round trip
+
+# The ingredient parser as it was when this revision was written, frozen here so the backfill never
+# changes with app/ingredients.py. Revision 8c4e7b1f0d92 re-parses these rows into the unit families.
+_LINE_RE = re.compile(r'^\s*(?P<qty>\d+(?:\.\d+)?(?:/\d+)?)?\s*(?P<rest>.*?)\s*$')
+_UNITS = {
+    'cup', 'cups', 'tbsp', 'tsp', 'tablespoon', 'tablespoons', 'teaspoon', 'teaspoons',
+    'g', 'kg', 'ml', 'l', 'oz', 'lb', 'lbs', 'pinch', 'clove', 'cloves', 'can', 'cans',
+}
+
+
+def _to_number(text):
+    if '/' in text:
+        num, den = text.split('/', 1)
+        return float(num) / float(den) if float(den) else None
+    return float(text)
+
+
+def parse_ingredient_line(line):
+    # Returns (normalized_name, quantity, unit); quantity/unit are None when the line has none
+    text = ' '.join(line.strip().lower().split())
+    match = _LINE_RE.match(text)
+    if not match or not match.group('qty') or not match.group('rest'):
+        return text, None, None
+    quantity = _to_number(match.group('qty'))
+    rest = match.group('rest')
+    unit = None
+    head, _, tail = rest.partition(' ')
+    if head in _UNITS and tail:
+        unit, rest = head, tail
+    return rest, quantity, unit
+
+
+def split_ingredient_lines(text):
+    return [line.strip() for line in (text or '').split('\n') if line.strip()]
+
+
+def upgrade():
+    recipe_ingredient = op.create_table('recipe_ingredient',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('raw_text', sa.Text(), nullable=False),
+    sa.Column('normalized_name', sa.String(length=200), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=True),
+    sa.Column('unit', sa.String(length=20), nullable=True),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'], name='fk_recipe_ingredient_recipe_id_recipe', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('recipe_ingredient', schema=None) as batch_op:
+        batch_op.create_index('ix_recipe_ingredient_aggregate', ['recipe_id', 'normalized_name', 'unit', 'quantity'], unique=False)
+
+    # Backfill in id-ordered batches so large catalogs never sit in memory at once
+    bind = op.get_bind()
+    recipe = sa.table('recipe', sa.column('id', sa.Integer), sa.column('ingredients', sa.Text))
+    last_id = 0
+    while True:
+        batch = bind.execute(
+            sa.select(recipe.c.id, recipe.c.ingredients)
+            .where(recipe.c.id > last_id)
+            .order_by(recipe.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not batch:
+            break
+        rows = []
+        for recipe_id, ingredients in batch:
+            for position, line in enumerate(split_ingredient_lines(ingredients)):
+                name, quantity, unit = parse_ingredient_line(line)
+                rows.append({'recipe_id': recipe_id, 'position': position, 'raw_text': line,
+                             'normalized_name': name[:200], 'quantity': quantity, 'unit': unit})
+        if rows:
+            op.bulk_insert(recipe_ingredient, rows)
+        last_id = batch[-1][0]
+
+
+def downgrade():
+    with op.batch_alter_table('recipe_ingredient', schema=None) as batch_op:
+        batch_op.drop_index('ix_recipe_ingredient_aggregate')
+
+    op.drop_table('recipe_ingredient')
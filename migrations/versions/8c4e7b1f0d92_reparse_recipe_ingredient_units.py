@@ -0,0 +1,178 @@
+"""Re-parse RecipeIngredient rows into canonical unit families
+
+Revision ID: 8c4e7b1f0d92
+Revises: 5f1d2c8e9a47
+Create Date: 2026-10-18 11:40:27.905113
+
+"""
+import re
+from collections import namedtuple
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e7b1f0d92'
+down_revision = '5f1d2c8e9a47'
+branch_labels = None
+depends_on = None
+
+REPARSE_BATCH_SIZE = 2000 # RecipeIngredient rows per round trip
+
+# The unit-aware parser as it was when this revision was written (app/ingredients.py), frozen here so
+# the re-parse never changes with the live module. Returns (name, quantity, unit) like the app's.
+
+VOLUME, MASS, COUNT = 'volume', 'mass', 'count'
+BASE_UNITS = {VOLUME: 'ml', MASS: 'g'}
+
+# canonical unit -> (family, factor to base unit, aliases)
+_UNIT_TABLE = {
+    'tsp': (VOLUME, 4.92892, ('tsp', 'tsps', 'teaspoon', 'teaspoons')),
+    'tbsp': (VOLUME, 14.7868, ('tbsp', 'tbsps', 'tbs', 'tbl', 'tablespoon', 'tablespoons')),
+    'fl oz': (VOLUME, 29.5735, ('fl oz', 'fl. oz', 'fluid ounce', 'fluid ounces')),
+    'cup': (VOLUME, 236.588, ('cup', 'cups', 'c')),
+    'pint': (VOLUME, 473.176, ('pint', 'pints', 'pt')),
+    'quart': (VOLUME, 946.353, ('quart', 'quarts', 'qt')),
+    'gallon': (VOLUME, 3785.41, ('gallon', 'gallons', 'gal')),
+    'ml': (VOLUME, 1.0, ('ml', 'milliliter', 'milliliters', 'millilitre', 'millilitres')),
+    'l': (VOLUME, 1000.0, ('l', 'liter', 'liters', 'litre', 'litres')),
+    'mg': (MASS, 0.001, ('mg', 'milligram', 'milligrams')),
+    'g': (MASS, 1.0, ('g', 'gr', 'gram', 'grams')),
+    'kg': (MASS, 1000.0, ('kg', 'kilogram', 'kilograms')),
+    'oz': (MASS, 28.3495, ('oz', 'ounce', 'ounces')),
+    'lb': (MASS, 453.592, ('lb', 'lbs', 'pound', 'pounds')),
+    'clove': (COUNT, 1.0, ('clove', 'cloves')),
+    'can': (COUNT, 1.0, ('can', 'cans')),
+    'jar': (COUNT, 1.0, ('jar', 'jars')),
+    'package': (COUNT, 1.0, ('package', 'packages', 'pkg', 'pkgs')),
+    'pinch': (COUNT, 1.0, ('pinch', 'pinches')),
+    'dash': (COUNT, 1.0, ('dash', 'dashes')),
+    'slice': (COUNT, 1.0, ('slice', 'slices')),
+    'piece': (COUNT, 1.0, ('piece', 'pieces')),
+    'stick': (COUNT, 1.0, ('stick', 'sticks')),
+    'bunch': (COUNT, 1.0, ('bunch', 'bunches')),
+    'head': (COUNT, 1.0, ('head', 'heads')),
+    'sprig': (COUNT, 1.0, ('sprig', 'sprigs')),
+    'handful': (COUNT, 1.0, ('handful', 'handfuls')),
+}
+UNIT_ALIASES = {alias: unit for unit, (_, _, aliases) in _UNIT_TABLE.items() for alias in aliases}
+
+_UNICODE_FRACTIONS = {
+    '½': 0.5, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 0.25, '¾': 0.75, '⅕': 0.2,
+    '⅛': 0.125, '⅜': 0.375, '⅝': 0.625, '⅞': 0.875,
+}
+_UNI = '[' + ''.join(_UNICODE_FRACTIONS) + ']'
+_AMOUNT = (r'(?:\d+\s+\d+/\d+'           # mixed number: 1 1/2
+           r'|\d+\s*' + _UNI +            # mixed unicode: 1½
+           r'|\d+/\d+'                     # fraction: 3/4
+           r'|\d+(?:\.\d+)?'               # integer/decimal: 2, 1.5
+           r'|' + _UNI + r')')             # bare unicode: ½
+_UNIT_ALT = '|'.join(re.escape(a) for a in sorted(UNIT_ALIASES, key=len, reverse=True))
+
+_LINE_RE = re.compile(
+    r'^(?:[-*•]\s*)?'
+    r'(?P<qty>' + _AMOUNT + r')'
+    r'(?:\s*(?:-|–|to)\s*(?P<qty_hi>' + _AMOUNT + r'))?'
+    r'\s*(?:(?P<unit>' + _UNIT_ALT + r')\.?(?=\s|$))?'
+    r'\s*(?:of\s+)?(?P<name>.*)$'
+)
+_BULLET_RE = re.compile(r'^(?:[-*•]|\d+[.)])\s+')
+_PAREN_RE = re.compile(r'\([^)]*\)')
+_TRAILING_NOTES = (' to taste', ' as needed', ' optional')
+_SPACE_RE = re.compile(r'\s+')
+_MIXED_RE = re.compile(r'^(\d+)\s+(\d+)/(\d+)$')
+_MIXED_UNI_RE = re.compile(r'^(\d+)\s*(' + _UNI + r')$')
+
+ParsedIngredient = namedtuple('ParsedIngredient', 'name quantity unit')
+
+
+def _amount_to_number(text):
+    text = text.strip()
+    if text.isdigit():
+        return float(text)
+    if text in _UNICODE_FRACTIONS:
+        return _UNICODE_FRACTIONS[text]
+    mixed = _MIXED_RE.match(text)
+    if mixed:
+        whole, num, den = (int(g) for g in mixed.groups())
+        return whole + num / den if den else None
+    mixed = _MIXED_UNI_RE.match(text)
+    if mixed:
+        return int(mixed.group(1)) + _UNICODE_FRACTIONS[mixed.group(2)]
+    if '/' in text:
+        num, den = text.split('/', 1)
+        return int(num) / int(den) if int(den) else None
+    return float(text)
+
+
+def _clean_name(text):
+    # Expects text that already went through the lowercase/parenthesis/whitespace pass in parse_ingredient_line
+    text = text.partition(',')[0].rstrip() # Drop preparation notes: "onion, diced"
+    for note in _TRAILING_NOTES:
+        if text.endswith(note):
+            text = text[:-len(note)]
+    return text.strip()
+
+
+def parse_ingredient_line(line):
+    text = line.strip().lower()
+    if '(' in text:
+        text = _PAREN_RE.sub(' ', text)
+    text = _SPACE_RE.sub(' ', text).strip()
+    match = _LINE_RE.match(text)
+    name = _clean_name(match.group('name')) if match else ''
+    if not match or not name:
+        # No leading quantity (or nothing after it): the whole line is the ingredient
+        return ParsedIngredient(_clean_name(_BULLET_RE.sub('', text)) or text, None, None)
+
+    quantity = _amount_to_number(match.group('qty'))
+    if match.group('qty_hi'):
+        # Ranges ("2-3 cloves") are bought at the upper bound
+        quantity = _amount_to_number(match.group('qty_hi'))
+    if quantity is None:
+        return ParsedIngredient(name, None, None)
+
+    unit = UNIT_ALIASES.get(match.group('unit')) if match.group('unit') else None
+    if unit is None:
+        return ParsedIngredient(name, quantity, None)
+    family, factor, _ = _UNIT_TABLE[unit]
+    if family == COUNT:
+        return ParsedIngredient(name, quantity, unit)
+    return ParsedIngredient(name, quantity * factor, BASE_UNITS[family])
+
+
+def upgrade():
+    # Quantities are now stored in base units (ml/g) with unit aliases canonicalised,
+    # so rows written by the previous parser have to be recomputed from raw_text.
+    bind = op.get_bind()
+    recipe_ingredient = sa.table('recipe_ingredient',
+                                 sa.column('id', sa.Integer),
+                                 sa.column('raw_text', sa.Text),
+                                 sa.column('normalized_name', sa.String),
+                                 sa.column('quantity', sa.Float),
+                                 sa.column('unit', sa.String))
+    update = (recipe_ingredient.update()
+              .where(recipe_ingredient.c.id == sa.bindparam('row_id'))
+              .values(normalized_name=sa.bindparam('name'), quantity=sa.bindparam('qty'), unit=sa.bindparam('unit_name')))
+    last_id = 0
+    while True:
+        batch = bind.execute(
+            sa.select(recipe_ingredient.c.id, recipe_ingredient.c.raw_text)
+            .where(recipe_ingredient.c.id > last_id)
+            .order_by(recipe_ingredient.c.id)
+            .limit(REPARSE_BATCH_SIZE)
+        ).fetchall()
+        if not batch:
+            break
+        params = []
+        for row_id, raw_text in batch:
+            name, quantity, unit = parse_ingredient_line(raw_text)
+            params.append({'row_id': row_id, 'name': name[:200], 'qty': quantity, 'unit_name': unit})
+        bind.execute(update, params)
+        last_id = batch[-1][0]
+
+
+def downgrade():
+    # The previous representation is a lossy subset of this one; rows stay as they are.
+    pass
@@ -0,0 +1,51 @@
+"""Make (grocery_list_id, normalized_name, unit) unique on grocery_list_item
+
+Revision ID: a7c2e4f19b36
+Revises: f3b8d2a6c914
+Create Date: 2026-10-18 20:03:17.284519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e4f19b36'
+down_revision = 'f3b8d2a6c914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows written concurrently before the key was unique: fold duplicates into the lowest id first.
+    # coalesce(unit, '') so that items without a unit are one key too (NULLs never conflict).
+    op.execute("""
+        UPDATE grocery_list_item SET
+            line_count = (SELECT sum(d.line_count) FROM grocery_list_item d
+                          WHERE d.grocery_list_id = grocery_list_item.grocery_list_id
+                            AND d.normalized_name = grocery_list_item.normalized_name
+                            AND coalesce(d.unit, '') = coalesce(grocery_list_item.unit, '')),
+            quantified_count = (SELECT sum(d.quantified_count) FROM grocery_list_item d
+                                WHERE d.grocery_list_id = grocery_list_item.grocery_list_id
+                                  AND d.normalized_name = grocery_list_item.normalized_name
+                                  AND coalesce(d.unit, '') = coalesce(grocery_list_item.unit, '')),
+            quantity = (SELECT sum(d.quantity) FROM grocery_list_item d
+                        WHERE d.grocery_list_id = grocery_list_item.grocery_list_id
+                          AND d.normalized_name = grocery_list_item.normalized_name
+                          AND coalesce(d.unit, '') = coalesce(grocery_list_item.unit, ''))
+        WHERE id IN (SELECT min(id) FROM grocery_list_item
+                     GROUP BY grocery_list_id, normalized_name, coalesce(unit, '') HAVING count(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM grocery_list_item WHERE id NOT IN (
+            SELECT min(id) FROM grocery_list_item GROUP BY grocery_list_id, normalized_name, coalesce(unit, ''))
+    """)
+    op.drop_index('ix_grocery_list_item_list_name', table_name='grocery_list_item')
+    op.create_index('uq_grocery_list_item_key', 'grocery_list_item',
+                    ['grocery_list_id', 'normalized_name', sa.text("coalesce(unit, '')")], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_grocery_list_item_key', table_name='grocery_list_item')
+    op.create_index('ix_grocery_list_item_list_name', 'grocery_list_item',
+                    ['grocery_list_id', 'normalized_name', 'unit'], unique=False)
@@ -0,0 +1,56 @@
+"""Add FTS5 full-text index over recipes with sync triggers
+
+Revision ID: a7d3e5f2c610
+Revises: 8c4e7b1f0d92
+Create Date: 2026-10-18 13:05:51.662094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f2c610'
+down_revision = '8c4e7b1f0d92'
+branch_labels = None
+depends_on = None
+
+COLUMNS = "name, description, ingredients, instructions"
+
+
+def upgrade():
+    # SQLite only; other databases use the LIKE fallback in app/search.py
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5({COLUMNS}, "
+        "content='recipe', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_ai AFTER INSERT ON recipe BEGIN "
+        f"INSERT INTO recipe_fts(rowid, {COLUMNS}) "
+        "VALUES (new.id, new.name, new.description, new.ingredients, new.instructions); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_ad AFTER DELETE ON recipe BEGIN "
+        f"INSERT INTO recipe_fts(recipe_fts, rowid, {COLUMNS}) "
+        "VALUES ('delete', old.id, old.name, old.description, old.ingredients, old.instructions); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER IF NOT EXISTS recipe_fts_au AFTER UPDATE OF {COLUMNS} ON recipe BEGIN "
+        f"INSERT INTO recipe_fts(recipe_fts, rowid, {COLUMNS}) "
+        "VALUES ('delete', old.id, old.name, old.description, old.ingredients, old.instructions); "
+        f"INSERT INTO recipe_fts(rowid, {COLUMNS}) "
+        "VALUES (new.id, new.name, new.description, new.ingredients, new.instructions); END"
+    )
+    # Index the rows that already exist
+    op.execute("INSERT INTO recipe_fts(recipe_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS recipe_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS recipe_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS recipe_fts_ai")
+    op.execute("DROP TABLE IF EXISTS recipe_fts")
@@ -0,0 +1,48 @@
+"""Add generation_job table for background LLM requests
+
+Revision ID: d41b7c9e2f58
+Revises: a7d3e5f2c610
+Create Date: 2026-10-18 14:02:17.318245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7c9e2f58'
+down_revision = 'a7d3e5f2c610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('provider', sa.String(length=20), nullable=False),
+    sa.Column('prompt', sa.Text(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('result_json', sa.Text(), nullable=True),
+    sa.Column('error', sa.String(length=200), nullable=True),
+    sa.Column('error_details', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_generation_job_created_at'), ['created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_generation_job_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_generation_job_user_id'))
+        batch_op.drop_index(batch_op.f('ix_generation_job_created_at'))
+
+    op.drop_table('generation_job')
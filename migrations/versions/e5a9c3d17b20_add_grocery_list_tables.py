@@ -0,0 +1,68 @@
+"""Add grocery_list, grocery_list_recipe and grocery_list_item tables
+
+Revision ID: e5a9c3d17b20
+Revises: d41b7c9e2f58
+Create Date: 2026-10-18 16:41:09.507113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c3d17b20'
+down_revision = 'd41b7c9e2f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('grocery_list',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('grocery_list', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_grocery_list_user_id'), ['user_id'], unique=True)
+
+    op.create_table('grocery_list_recipe',
+    sa.Column('grocery_list_id', sa.Integer(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('added_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['grocery_list_id'], ['grocery_list.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('grocery_list_id', 'recipe_id')
+    )
+    with op.batch_alter_table('grocery_list_recipe', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_grocery_list_recipe_recipe_id'), ['recipe_id'], unique=False)
+
+    op.create_table('grocery_list_item',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('grocery_list_id', sa.Integer(), nullable=False),
+    sa.Column('normalized_name', sa.String(length=200), nullable=False),
+    sa.Column('unit', sa.String(length=20), nullable=True),
+    sa.Column('quantity', sa.Float(), nullable=True),
+    sa.Column('line_count', sa.Integer(), nullable=False),
+    sa.Column('quantified_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['grocery_list_id'], ['grocery_list.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('grocery_list_item', schema=None) as batch_op:
+        batch_op.create_index('ix_grocery_list_item_list_name', ['grocery_list_id', 'normalized_name', 'unit'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('grocery_list_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_grocery_list_item_list_name')
+
+    op.drop_table('grocery_list_item')
+    with op.batch_alter_table('grocery_list_recipe', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_grocery_list_recipe_recipe_id'))
+
+    op.drop_table('grocery_list_recipe')
+    with op.batch_alter_table('grocery_list', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_grocery_list_user_id'))
+
+    op.drop_table('grocery_list')
@@ -0,0 +1,30 @@
+"""Add updated_at and version to recipe for conditional GETs
+
+Revision ID: f3b8d2a6c914
+Revises: e5a9c3d17b20
+Create Date: 2026-10-18 18:12:44.901362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d2a6c914'
+down_revision = 'e5a9c3d17b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ADD COLUMN rather than batch_alter_table: recreating recipe on SQLite would drop the
+    # recipe_fts triggers. ADD COLUMN needs a constant default, so existing rows get "now" afterwards.
+    op.add_column('recipe', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('recipe', sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                      server_default=sa.text("'1970-01-01 00:00:00'")))
+    op.execute("UPDATE recipe SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade():
+    op.drop_column('recipe', 'updated_at')
+    op.drop_column('recipe', 'version')
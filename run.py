@@ -1,4 +1,7 @@
-from app import app
+from app import create_app
+
+# The served app: `python run.py` for development, `gunicorn run:app` (or any WSGI server) otherwise
+app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,16 +1,47 @@
+import atexit
+import csv
+import html as html_lib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from datetime import datetime, timedelta
 from unittest.mock import patch, Mock, ANY
-from flask import url_for, session
+from flask import g, url_for, session
 from flask_login import login_user, current_user as flask_login_current_user # To check auth state
 from urllib.parse import urlparse, parse_qs
-from app import app, db
-from app.models import Recipe, UserSettings, User
+from app import create_app, db
+from app.models import Recipe, RecipeIngredient, UserSettings, User, GenerationJob, build_ingredient_items
 from app.auth_routes import google_bp # Import the blueprint to connect the signal handler
+from app.llm_service import GEMINI_MODEL_ID
+from app.resilience import ProviderGuards
+from app.search import search_recipes
+from app.user_cache import UserSnapshot
+from app.recipe_io import import_recipes
+from app.query_budget import QueryBudgetExceeded, QueryRecorder, assert_max_queries, query_budget
+from sqlalchemy.orm.exc import StaleDataError
+
+# One app for these tests, on a throwaway database file (setUp creates the tables, tearDown drops them).
+# A file rather than :memory: so that the background job threads see the same database.
+_db_dir = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, _db_dir, True)
+app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(_db_dir, 'test.db')}", 'TESTING': True})
+
+# Its per-app objects (app.extensions)
+llm_client = app.extensions['llm_client']
+user_cache = app.extensions['user_cache']
+fragment_cache = app.extensions['fragment_cache']
 
 class AppTestCase(unittest.TestCase):
 
     def setUp(self):
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         app.config['TESTING'] = True
         app.config['WTF_CSRF_ENABLED'] = False
         app.config['SERVER_NAME'] = 'localhost.test'
@@ -20,12 +51,21 @@ class AppTestCase(unittest.TestCase):
         self.app_context.push()
         db.create_all()
         self.client = app.test_client()
+        # Route tests must never see LLM responses cached by earlier tests or by a dev server
+        self._llm_response_cache, llm_client.response_cache = llm_client.response_cache, None
+        user_cache.clear() # Every test's in-memory database reuses the same user ids
+        fragment_cache.clear() # ... and recipe ids
 
     def tearDown(self):
+        llm_client.response_cache = self._llm_response_cache
         db.session.remove()
         db.drop_all()
         self.app_context.pop()
 
+    def assertMaxQueries(self, max_queries):
+        # Whole request, hooks included; the views' own @query_budget only covers the view body
+        return assert_max_queries(max_queries, db.engine, label="Request")
+
     def _create_test_user(self, email="test@example.com", name="Test User", google_id_suffix=""):
         gid = f"test_google_id_{email}{google_id_suffix}"
         user = User.query.filter_by(google_id=gid).first()
@@ -143,6 +183,140 @@ class AppTestCase(unittest.TestCase):
         deleted_recipe = db.session.get(Recipe, recipe_id)
         self.assertIsNone(deleted_recipe)
 
+    @patch('flask_login.utils._get_user')
+    def test_recipes_page_keyset_pagination(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        for i in range(5):
+            self._add_test_recipe(name=f"Paged Recipe {i}", description=f"Paged desc {i}")
+
+        with self.assertMaxQueries(2): # Same count for a full page as for two rows
+            self.client.get('/recipes?per_page=5')
+        first = self.client.get('/recipes?per_page=2')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b'Paged Recipe 0', first.data)
+        self.assertIn(b'Paged Recipe 1', first.data)
+        self.assertNotIn(b'Paged Recipe 2', first.data)
+        self.assertNotIn(b'rel="prev"', first.data)
+        next_url = re.search(rb'href="([^"]+)"[^>]*rel="next"', first.data).group(1).decode().replace('&amp;', '&')
+
+        second = self.client.get(next_url)
+        self.assertEqual(second.status_code, 200)
+        self.assertIn(b'Paged Recipe 2', second.data)
+        self.assertIn(b'Paged Recipe 3', second.data)
+        self.assertNotIn(b'Paged Recipe 1', second.data)
+        self.assertIn(b'rel="prev"', second.data)
+        prev_url = re.search(rb'href="([^"]+)"[^>]*rel="prev"', second.data).group(1).decode().replace('&amp;', '&')
+
+        back = self.client.get(prev_url)
+        self.assertIn(b'Paged Recipe 0', back.data)
+        self.assertIn(b'Paged Recipe 1', back.data)
+        self.assertNotIn(b'Paged Recipe 2', back.data)
+
+        last = self.client.get(re.search(rb'href="([^"]+)"[^>]*rel="next"', second.data).group(1).decode().replace('&amp;', '&'))
+        self.assertIn(b'Paged Recipe 4', last.data)
+        self.assertNotIn(b'rel="next"', last.data)
+
+    @patch('flask_login.utils._get_user')
+    def test_recipes_page_invalid_cursor(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        response = self.client.get('/recipes?after=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        from app.pagination import encode_cursor
+        for values in ([{'a': 1}, 1], [['Soup'], 1], [True, 1]): # Right length, values that can't be bound
+            self.assertEqual(self.client.get(f'/recipes?after={encode_cursor(values)}').status_code, 400)
+
+    @patch('flask_login.utils._get_user')
+    def test_search_recipes_full_text(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        self._add_test_recipe(name="Lemon Chicken", description="Zesty roast", ingredients="Chicken\nLemon", instructions="Roast")
+        self._add_test_recipe(name="Garden Salad", description="Fresh greens", ingredients="Lettuce\nLemon juice", instructions="Toss")
+        self._add_test_recipe(name="Beef Stew", description="Hearty", ingredients="Beef\nCarrots", instructions="Simmer")
+
+        response = self.client.get('/recipes/search?q=lemon')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Lemon Chicken', response.data)
+        self.assertIn(b'Garden Salad', response.data)
+        self.assertNotIn(b'Beef Stew', response.data)
+        # Name matches are weighted above ingredient matches
+        self.assertLess(response.data.index(b'Lemon Chicken'), response.data.index(b'Garden Salad'))
+        self.assertIn(b'<mark>', response.data)
+
+        # Prefix match on the last term, and the index follows edits/deletes through the triggers
+        recipe = Recipe.query.filter_by(name="Beef Stew").first()
+        self.client.post(f'/recipe/{recipe.id}/edit', data=dict(name='Beef Stew', description='Hearty',
+                                                                 ingredients='Beef\nParsnips', instructions='Simmer'))
+        self.assertIn(b'Beef Stew', self.client.get('/recipes/search?q=parsn').data)
+        self.client.post(f'/recipe/{recipe.id}/delete')
+        self.assertIn(b'No recipes match', self.client.get('/recipes/search?q=parsnips').data)
+
+    @patch('flask_login.utils._get_user')
+    def test_search_ranks_every_match(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        self._add_test_recipe(name="Saffron Rice", ingredients="Rice\nSaffron", instructions="Cook")
+        for i in range(5):
+            self._add_test_recipe(name=f"Pilaf {i}", ingredients="Rice\nA pinch of saffron", instructions="Cook")
+
+        # The oldest recipe is the best (name) match, so ranking must not stop at the newest matches
+        results = search_recipes('saffron', limit=2)
+        self.assertEqual(results[0].name, "Saffron Rice")
+        self.assertFalse(results.is_partial)
+
+        # Under a cap smaller than the match count only the newest are ranked, and the results say so
+        results = search_recipes('saffron', limit=2, rank_cap=3)
+        self.assertNotIn("Saffron Rice", [r.name for r in results])
+        self.assertTrue(results.is_partial)
+        self.assertEqual((results.match_count, results.ranked_count), (6, 3))
+        self.assertFalse(search_recipes('saffron', limit=2, rank_cap=10).is_partial)
+
+        rank_cap = app.config['RECIPE_SEARCH_RANK_CAP']
+        app.config['RECIPE_SEARCH_RANK_CAP'] = 3
+        try:
+            self.assertIn(b'6 recipes match; these are the best of the 3 newest', self.client.get('/recipes/search?q=saffron').data)
+        finally:
+            app.config['RECIPE_SEARCH_RANK_CAP'] = rank_cap
+
+    def test_query_budget_reports_n_plus_one(self):
+        for i in range(4):
+            self._add_test_recipe(name=f"Lazy {i}", ingredients=f"Item {i}\nSalt")
+        db.session.expire_all()
+
+        @query_budget(2)
+        def lazy_listing():
+            return [len(recipe.ingredient_items) for recipe in Recipe.query.all()] # One lazy load per recipe
+
+        with app.test_request_context():
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                lazy_listing()
+        self.assertIn("ran 5 queries, budget is 2", str(raised.exception))
+        self.assertIn("4x SELECT recipe_ingredient.id", str(raised.exception)) # Repeated shape, literals masked
+
+        app.config['QUERY_BUDGET_MODE'] = 'warn'
+        try:
+            with app.test_request_context(), patch('builtins.print') as mock_print:
+                self.assertEqual(lazy_listing(), [2, 2, 2, 2])
+            self.assertIn("Query budget exceeded", mock_print.call_args[0][0])
+        finally:
+            app.config['QUERY_BUDGET_MODE'] = None
+
+    @patch('flask_login.utils._get_user')
+    def test_search_recipes_like_fallback(self, mock_get_user):
+        from app.search import like_search
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        self._add_test_recipe(name="Tomato Soup", description="<b>Warm</b>", ingredients="Tomato", instructions="Blend")
+        results = like_search(db.session, ['tomato'], 10)
+        self.assertEqual([r.name for r in results], ['Tomato Soup'])
+        self.assertIn('&lt;b&gt;', str(results[0].snippet))
+        self._add_test_recipe(name="Pan_fried Tofu", ingredients="Tofu", instructions="Fry")
+        self._add_test_recipe(name="Panafried Tofu", ingredients="Tofu", instructions="Fry")
+        self._add_test_recipe(name="Half%Baked Tofu", ingredients="Tofu", instructions="Bake")
+        self.assertEqual([r.name for r in like_search(db.session, ['pan_fried'], 10)], ['Pan_fried Tofu'])
+        self.assertEqual([r.name for r in like_search(db.session, ['f%b'], 10)], ['Half%Baked Tofu'])
+
     @patch('flask_login.utils._get_user')
     def test_grocery_list_page(self, mock_get_user):
         user = self._create_test_user()
@@ -169,7 +343,8 @@ class AppTestCase(unittest.TestCase):
         recipe3 = self._add_test_recipe(name="Bread", ingredients="Flour\nWater\nSalt\nYeast")
 
         selected_ids = [str(recipe1.id), str(recipe2.id)]
-        response = self.client.post('/generate-grocery-list', data={'recipe_ids': selected_ids})
+        with self.assertMaxQueries(14):
+            response = self.client.post('/generate-grocery-list', data={'recipe_ids': selected_ids})
 
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Generated Grocery List', response.data)
@@ -196,19 +371,173 @@ class AppTestCase(unittest.TestCase):
         self.assertIn(b'Celery', response.data)
         self.assertNotIn(b'(x', response.data)
 
+    @patch('flask_login.utils._get_user')
+    def test_generate_grocery_list_sums_quantities(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        recipe1 = self._add_test_recipe(name="Pancakes", ingredients="2 cups Flour\n2 Eggs\nSalt")
+        recipe2 = self._add_test_recipe(name="Bread", ingredients="1 cups flour\nSalt")
+        response = self.client.post('/generate-grocery-list', data={'recipe_ids': [str(recipe1.id), str(recipe2.id)]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Flour (3 cups)', response.data)
+        self.assertIn(b'Eggs (2)', response.data)
+        self.assertIn(b'Salt (x2)', response.data)
+
+    @patch('flask_login.utils._get_user')
+    def test_recipe_ingredient_rows_follow_recipe_edits(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        self.client.post('/recipe/add', data=dict(name='Synced', description='', ingredients='1 cup Rice\nWater',
+                                                   instructions='Cook'))
+        recipe = Recipe.query.filter_by(name='Synced').first()
+        rows = RecipeIngredient.query.filter_by(recipe_id=recipe.id).order_by(RecipeIngredient.position).all()
+        self.assertEqual([(r.normalized_name, r.quantity, r.unit) for r in rows], [('rice', 236.588, 'ml'), ('water', None, None)])
+
+        self.client.post(f'/recipe/{recipe.id}/edit', data=dict(name='Synced', description='', ingredients='Beans',
+                                                                 instructions='Cook'))
+        rows = RecipeIngredient.query.filter_by(recipe_id=recipe.id).all()
+        self.assertEqual([r.raw_text for r in rows], ['Beans'])
+
+        self.client.post(f'/recipe/{recipe.id}/delete')
+        self.assertEqual(RecipeIngredient.query.filter_by(recipe_id=recipe.id).count(), 0)
+
     @patch('flask_login.utils._get_user')
     def test_order_with_instacart_flow(self, mock_get_user):
         user = self._create_test_user()
         mock_get_user.return_value = user
-        recipe = self._add_test_recipe(name="Test Dish", ingredients="Ingredient A (x2)\nIngredient B")
-        formatted_ingredients_from_list_page = ["Ingredient A (x2)", "Ingredient B"]
+        recipe = self._add_test_recipe(name="Test Dish", ingredients="Ingredient A\nIngredient A\nIngredient B")
+        self.client.post('/generate-grocery-list', data={'recipe_ids': [str(recipe.id)]})
 
-        response = self.client.post('/order-instacart', data={'ingredients': formatted_ingredients_from_list_page})
+        # Items come from the saved list, not from whatever the form posts
+        response = self.client.post('/order-instacart', data={'ingredients': ['Caviar (x99)']})
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Order with InstaCart (Simulated)', response.data)
-        self.assertIn(b'Ingredient A (x2)', response.data)
+        self.assertIn(b'Ingredient a (x2)', response.data)
         self.assertIn(b'Find on InstaCart', response.data)
-        self.assertIn(b'Ingredient B', response.data)
+        self.assertIn(b'Ingredient b', response.data)
+        self.assertNotIn(b'Caviar', response.data)
+
+    @patch('flask_login.utils._get_user')
+    def test_grocery_list_updates_incrementally(self, mock_get_user):
+        from app.grocery import get_grocery_list, recipe_totals
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        pancakes = self._add_test_recipe(name="Pancakes", ingredients="2 cups Flour\n2 Eggs\nSalt")
+        bread = self._add_test_recipe(name="Bread", ingredients="1 cup flour\nSalt\nYeast")
+        soup = self._add_test_recipe(name="Soup", ingredients="Broth\n1 can Beans")
+
+        def stored():
+            db.session.expire_all()
+            grocery_list = get_grocery_list(user.id)
+            items = {(i.normalized_name, i.unit): (round(i.quantity or 0.0, 6), i.line_count, i.quantified_count)
+                     for i in grocery_list.items}
+            recipe_ids = sorted(link.recipe_id for link in grocery_list.recipe_links)
+            expected = {key: (round(quantity, 6), lines, quantified)
+                        for key, (quantity, lines, quantified) in recipe_totals(recipe_ids).items()}
+            self.assertEqual(items, expected) # Same as aggregating the recipes from scratch
+            return recipe_ids, items
+
+        self.client.post('/generate-grocery-list', data={'recipe_ids': [str(pancakes.id), str(bread.id)]})
+        self.client.post('/grocery-list/add', data={'recipe_ids': [str(soup.id), str(bread.id)]})
+        recipe_ids, items = stored()
+        self.assertEqual(recipe_ids, sorted([pancakes.id, bread.id, soup.id]))
+        self.assertEqual(items[('salt', None)], (0.0, 2, 0))
+        response = self.client.get('/grocery-list')
+        self.assertIn(b'Flour (3 cups)', response.data)
+        self.assertIn(b'Beans (1 can)', response.data)
+
+        self.client.post(f'/grocery-list/remove/{bread.id}')
+        recipe_ids, items = stored()
+        self.assertEqual(items[('flour', 'ml')], (round(2 * 236.588, 6), 1, 1))
+        self.assertNotIn(('yeast', None), items)
+
+        # Edits and deletes of a recipe on the list move its totals by the difference
+        self.client.post(f'/recipe/{pancakes.id}/edit', data=dict(name='Pancakes', description='',
+                                                                  ingredients='3 cups Flour\nMilk', instructions='Mix'))
+        recipe_ids, items = stored()
+        self.assertEqual(items[('flour', 'ml')], (round(3 * 236.588, 6), 1, 1))
+        self.assertIn(('milk', None), items)
+        self.assertNotIn(('eggs', None), items)
+        self.client.post(f'/recipe/{soup.id}/delete')
+        recipe_ids, items = stored()
+        self.assertEqual(recipe_ids, [pancakes.id])
+        self.assertNotIn(('broth', None), items)
+
+        # Selecting again only adds and removes the differences
+        with QueryRecorder(db.engine) as recorder:
+            self.client.post('/generate-grocery-list', data={'recipe_ids': [str(pancakes.id)]})
+        self.assertFalse([s for s in recorder.statements if 'grocery_list_item' in s and not s.startswith('SELECT')])
+
+        self.client.post('/grocery-list/clear')
+        self.assertIsNone(get_grocery_list(user.id))
+        self.assertIn(b'Select recipes from the', self.client.get('/grocery-list').data)
+
+    def test_grocery_list_concurrent_changes_add_up(self):
+        from sqlalchemy.exc import IntegrityError
+        from app.grocery import add_recipes, apply_delta, get_grocery_list, recipe_totals, remove_recipes, subtract_totals
+        from app.models import GroceryListItem, GroceryListRecipe
+        user = self._create_test_user()
+        pancakes = self._add_test_recipe(name="Pancakes", ingredients="2 cups Flour\nSalt")
+        bread = self._add_test_recipe(name="Bread", ingredients="1 cup flour\nSalt")
+        grocery_list = get_grocery_list(user.id, create=True)
+        self.assertEqual(get_grocery_list(user.id, create=True).id, grocery_list.id) # No second list
+        add_recipes(grocery_list, [pancakes.id])
+        db.session.commit()
+
+        # Deltas are added in the database, not to the (possibly stale) items this request loaded
+        stale = get_grocery_list(user.id)
+        apply_delta(stale, recipe_totals([bread.id]))
+        apply_delta(stale, recipe_totals([bread.id]))
+        db.session.commit()
+        salt = GroceryListItem.query.filter_by(grocery_list_id=grocery_list.id, normalized_name='salt').one()
+        self.assertEqual((salt.line_count, salt.quantified_count, salt.quantity), (3, 0, None))
+        apply_delta(stale, subtract_totals({}, recipe_totals([bread.id])))
+        apply_delta(stale, subtract_totals({}, recipe_totals([bread.id])))
+        db.session.commit()
+
+        # Another request added bread after this one loaded the list: its link wins and nothing is counted twice
+        stale = get_grocery_list(user.id)
+        db.session.execute(GroceryListRecipe.__table__.insert().values(grocery_list_id=grocery_list.id, recipe_id=bread.id,
+                                                                       added_at=datetime.utcnow()))
+        apply_delta(stale, recipe_totals([bread.id]))
+        self.assertEqual(add_recipes(stale, [bread.id]), [])
+        db.session.commit()
+        stale = get_grocery_list(user.id)
+        db.session.execute(GroceryListRecipe.__table__.delete().where(GroceryListRecipe.recipe_id == bread.id))
+        apply_delta(stale, subtract_totals({}, recipe_totals([bread.id])))
+        self.assertEqual(remove_recipes(stale, [bread.id]), [])
+        db.session.commit()
+        items = {(i.normalized_name, i.unit): (round(i.quantity or 0.0, 6), i.line_count) for i in get_grocery_list(user.id).items}
+        self.assertEqual(items, {('flour', 'ml'): (round(2 * 236.588, 6), 1), ('salt', None): (0.0, 1)})
+
+        # One row per (list, name, unit), NULL units included
+        db.session.add(GroceryListItem(grocery_list_id=grocery_list.id, normalized_name='salt', unit=None, line_count=1))
+        with self.assertRaises(IntegrityError):
+            db.session.flush()
+        db.session.rollback()
+
+    def test_grocery_list_without_on_conflict(self):
+        # Dialects without ON CONFLICT and DELETE ... RETURNING (MySQL) update-then-insert instead
+        from app.grocery import get_grocery_list
+        from app.models import GroceryList
+        with patch.dict('app.grocery._INSERTS', clear=True), patch.object(db.engine.dialect, 'delete_returning', False), \
+                QueryRecorder(db.engine) as recorder:
+            self.test_grocery_list_concurrent_changes_add_up()
+        self.assertFalse([s for s in recorder.statements if 'grocery_list' in s and ('ON CONFLICT' in s or 'RETURNING' in s)])
+        self.assertTrue([s for s in recorder.statements if s.startswith('UPDATE grocery_list_item')])
+
+        # Deleting a recipe takes it off the lists it is on; one on no list deletes no links
+        grocery_list = GroceryList.query.one()
+        pancakes = Recipe.query.filter_by(name='Pancakes').one()
+        unlisted = self._add_test_recipe(name="Toast", ingredients="Bread")
+        with QueryRecorder(db.engine) as recorder:
+            db.session.delete(unlisted)
+            db.session.commit()
+        self.assertFalse([s for s in recorder.statements if s.startswith('DELETE FROM grocery_list_recipe')])
+        db.session.delete(pancakes)
+        db.session.commit()
+        self.assertEqual(get_grocery_list(grocery_list.user_id).items, [])
 
     @patch('flask_login.utils._get_user')
     def test_order_with_instacart_no_ingredients(self, mock_get_user):
@@ -230,16 +559,133 @@ class AppTestCase(unittest.TestCase):
         self.assertIn(b'Choose AI Provider:', response.data)
         self.assertIn(b'Placeholder (No API Key Needed)', response.data)
 
+    @patch('flask_login.utils._get_user')
+    def test_generate_recipe_batch_and_save_together(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        self.assertIn(b'One recipe idea per line', self.client.get('/generate-recipe-llm/batch').data)
+        self.assertIn(b'Enter at least one recipe idea', self.client.post('/generate-recipe-llm/batch', data={'prompts': '  \n'}).data)
+        too_many = "\n".join(f"meal {n}" for n in range(app.config['LLM_BATCH_MAX_PROMPTS'] + 1))
+        self.assertIn(b'recipes can be generated at once', self.client.post('/generate-recipe-llm/batch', data={'prompts': too_many}).data)
+        response = self.client.post('/generate-recipe-llm/batch', data={'prompts': 'soup', 'provider': 'gemini'})
+        self.assertIn(b'API key for Gemini not found', response.data)
+
+        # The POST only queues a background job; its page shows the results once the job is done
+        app.config['LLM_JOB_WORKERS'] = 0 # Run the job during the submit request
+        try:
+            with patch('builtins.print'):
+                response = self.client.post('/generate-recipe-llm/batch', data={'prompts': 'Monday: soup\n\nTuesday: tacos',
+                                                                                 'provider': 'placeholder'})
+        finally:
+            app.config['LLM_JOB_WORKERS'] = 4
+        self.assertEqual(response.status_code, 302)
+        job = GenerationJob.query.one()
+        self.assertEqual((job.kind, job.prompt, job.status), ('batch', 'Monday: soup\nTuesday: tacos', 'succeeded'))
+        html = self.client.get(response.headers['Location']).get_data(as_text=True)
+        self.assertNotIn('http-equiv="refresh"', html)
+        self.assertIn('For: "Monday: soup"', html)
+        self.assertLess(html.index('Monday: soup'), html.index('Tuesday: tacos'))
+        self.assertEqual(len(re.findall(r'name="save" value="\d"', html)), 2)
+
+        fields = {name: html_lib.unescape(value) for name, value in
+                  re.findall(r'<input type="hidden" name="([a-z]+-\d)" value="([^"]*)"', html)}
+        self.assertEqual(len(fields), 8)
+        before = Recipe.query.count()
+        response = self.client.post('/recipes/save-batch', data=dict(fields, save=['0', '1']))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Recipe.query.count(), before + 2)
+
+        # One invalid selection saves nothing
+        response = self.client.post('/recipes/save-batch', data={'save': ['0', '1'], 'name-0': 'Stew', 'ingredients-0': 'Beef',
+                                                                 'instructions-0': 'Simmer', 'name-1': 'No steps'},
+                                    follow_redirects=True)
+        self.assertIn(b'Nothing was saved', response.data)
+        self.assertEqual(Recipe.query.count(), before + 2)
+
+    @patch('flask_login.utils._get_user')
+    def test_generate_recipe_batch_job(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        response = self.client.post('/llm/jobs', data={'kind': 'batch', 'prompts': 'soup\nstew', 'provider': 'placeholder'})
+        self.assertEqual(response.status_code, 202)
+        payload = self._wait_for_job(response.get_json()['status_url'])
+        self.assertEqual(payload['status'], 'succeeded')
+        self.assertEqual(len(payload['result']), 2)
+        self.assertIn('For: "stew"', payload['html'])
+        self.assertIn('Save Selected Recipes', payload['html'])
+        response = self.client.post('/llm/jobs', data={'kind': 'batch', 'prompts': ' \n', 'provider': 'placeholder'})
+        self.assertEqual(response.status_code, 400)
+
+        # Without JavaScript the page refreshes itself while the job is still running
+        pending = GenerationJob(user_id=user.id, kind='batch', provider='placeholder', prompt='pie\ntart')
+        db.session.add(pending)
+        db.session.commit()
+        html = self.client.get(url_for('generate_recipe_batch', job=pending.id)).get_data(as_text=True)
+        self.assertIn('<meta http-equiv="refresh" content="3">', html)
+        self.assertIn('Asking the AI chef for 2 recipes', html)
+        other = self._create_test_user(email="other@example.com")
+        mock_get_user.return_value = other
+        self.assertEqual(self.client.get(url_for('generate_recipe_batch', job=pending.id)).status_code, 404)
+
+    @patch('flask_login.utils._get_user')
+    def test_llm_forms_without_javascript_run_as_jobs(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        recipe = self._add_test_recipe(name="Chicken Soup", ingredients="Chicken\nBroth", instructions="Boil it.")
+        release, callers = threading.Event(), []
+
+        def slow_provider(*args, **kwargs):
+            callers.append(threading.current_thread())
+            release.wait(5)
+            return {'name': 'Quick Pasta', 'description': '', 'ingredients': 'Pasta', 'instructions': 'Boil'}
+
+        # The POSTs only queue jobs and redirect; the provider is called by the pool, never by the request
+        with patch.object(llm_client, 'generate_recipe', side_effect=slow_provider), \
+                patch.object(llm_client, 'modify_recipe', side_effect=slow_provider), patch('builtins.print'):
+            try:
+                response = self.client.post('/generate-recipe-llm', data={'prompt': 'pasta', 'provider': 'placeholder'})
+                self.assertEqual(response.status_code, 302)
+                pending = self.client.get(response.headers['Location']).get_data(as_text=True)
+                modify_response = self.client.post(url_for('submit_llm_modification', recipe_id=recipe.id),
+                                                   data={'prompt': 'make it vegetarian', 'provider': 'placeholder'})
+                self.assertEqual(modify_response.status_code, 302)
+                self.assertIn(f'/recipe/{recipe.id}/modify-llm-form?job=', modify_response.headers['Location'])
+                self.assertIn(b'Asking the AI chef to modify this recipe', self.client.get(modify_response.headers['Location']).data)
+            finally:
+                release.set()
+            jobs = {job.kind: job for job in GenerationJob.query.all()}
+            for job in jobs.values():
+                self._wait_for_job(url_for('llm_job_status', job_id=job.id))
+        self.assertNotIn(threading.current_thread(), callers)
+        self.assertIn('<meta http-equiv="refresh" content="3">', pending)
+        self.assertIn('Asking the AI chef for your recipe', pending)
+        self.assertIn('value="pasta"', pending)
+        self.assertEqual((jobs['generate'].prompt, jobs['modify'].prompt), ('pasta', 'make it vegetarian'))
+
+        # Once finished, the same page shows the result and stops refreshing
+        done = self.client.get(url_for('generate_recipe_llm', job=jobs['generate'].id)).get_data(as_text=True)
+        self.assertNotIn('http-equiv="refresh"', done)
+        self.assertIn('AI Generated Recipe: Quick Pasta', done)
+        self.assertIn('Save This AI Recipe', done)
+
+        # A job only shows on its own kind of page, for its own recipe
+        self.assertEqual(self.client.get(url_for('generate_recipe_batch', job=jobs['generate'].id)).status_code, 404)
+        other = self._add_test_recipe(name="Other Soup", ingredients="Broth", instructions="Heat")
+        self.assertEqual(self.client.get(url_for('modify_recipe_llm_form', recipe_id=other.id, job=jobs['modify'].id)).status_code, 404)
+        self.assertIn(b'AI Modified Recipe Suggestion: Quick Pasta',
+                      self.client.get(url_for('modify_recipe_llm_form', recipe_id=recipe.id, job=jobs['modify'].id)).data)
+
     @patch('flask_login.utils._get_user')
     def test_generate_recipe_llm_post_with_provider_selection(self, mock_get_user):
         user = self._create_test_user(email="llm_user@example.com", google_id_suffix="_llm_selection")
         mock_get_user.return_value = user
         test_prompt = "a quick pasta dish"
 
-        response_placeholder = self.client.post('/generate-recipe-llm', data={
-            'prompt': test_prompt,
-            'provider': 'placeholder'
-        })
+        with patch.dict(app.config, {'LLM_JOB_WORKERS': 0}): # Job runs during the POST; follow it to its page
+            response_placeholder = self.client.post('/generate-recipe-llm', data={
+                'prompt': test_prompt,
+                'provider': 'placeholder'
+            }, follow_redirects=True)
         self.assertEqual(response_placeholder.status_code, 200)
         if test_prompt:
             self.assertIn(b'AI Generated Pasta Dish (Placeholder)', response_placeholder.data)
@@ -251,10 +697,11 @@ class AppTestCase(unittest.TestCase):
         # user.settings = mock_user_settings # This line is tricky, relationship might not update immediately for current_user proxy
                                         # The route fetches fresh settings, so this direct assignment isn't needed for route test
 
-        response_hf = self.client.post('/generate-recipe-llm', data={
-            'prompt': test_prompt,
-            'provider': 'hugging_face'
-        })
+        with patch.dict(app.config, {'LLM_JOB_WORKERS': 0}):
+            response_hf = self.client.post('/generate-recipe-llm', data={
+                'prompt': test_prompt,
+                'provider': 'hugging_face'
+            }, follow_redirects=True)
         self.assertEqual(response_hf.status_code, 200)
         self.assertIn(b'<strong>Error:</strong> Hugging Face API Error', response_hf.data)
         self.assertIn(b'Details: Invalid API Key or unauthorized.</small>', response_hf.data)
@@ -278,6 +725,178 @@ class AppTestCase(unittest.TestCase):
     def test_llm_service_parsing_error_display_generate(self):
         pass
 
+    @patch('flask_login.utils._get_user')
+    def test_stream_recipe_llm_server_sent_events(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        response = self.client.get('/generate-recipe-llm/stream', query_string={'prompt': 'a quick pasta dish', 'provider': 'placeholder'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        body = response.get_data(as_text=True)
+        self.assertTrue(body.startswith('event: name\ndata: {"value": "AI Generated Pasta Dish (Placeholder)"}\n\n'))
+        self.assertIn('event: ingredient\ndata: {"value": "Tomato Sauce"}', body)
+        self.assertIn('event: done', body)
+        self.assertIn('Save This AI Recipe', body)
+
+        response = self.client.get('/generate-recipe-llm/stream', query_string={'prompt': 'soup', 'provider': 'gemini'})
+        body = response.get_data(as_text=True)
+        self.assertTrue(body.startswith('event: error'))
+        self.assertIn('API key for Gemini not found in your settings.', body)
+
+    # --- Background LLM job tests ---
+    def _wait_for_job(self, status_url, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            db.session.commit() # Each poll sees the workers' writes, like a request with a fresh session
+            payload = self.client.get(status_url).get_json()
+            if 'html' in payload:
+                return payload
+            time.sleep(0.02)
+        self.fail(f"Job at {status_url} did not finish")
+
+    @patch('flask_login.utils._get_user')
+    def test_llm_job_generate_inline(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        app.config['LLM_JOB_WORKERS'] = 0 # Run the job during the submit request
+        try:
+            response = self.client.post('/llm/jobs', data={'kind': 'generate', 'prompt': 'a quick pasta dish', 'provider': 'placeholder'})
+        finally:
+            app.config['LLM_JOB_WORKERS'] = 4
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        payload = self.client.get(url_for('llm_job_status', job_id=job_id)).get_json()
+        self.assertEqual(payload['status'], 'succeeded')
+        self.assertEqual(payload['result']['name'], 'AI Generated Pasta Dish (Placeholder)')
+        self.assertIn('<h2>AI Generated Recipe: AI Generated Pasta Dish (Placeholder)</h2>', payload['html'])
+        self.assertIn('Save This AI Recipe', payload['html'])
+
+    @patch('flask_login.utils._get_user')
+    def test_llm_job_modify_in_worker_thread(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        recipe = self._add_test_recipe(name="Chicken Soup", ingredients="Chicken\nNoodles", instructions="Boil it.")
+        response = self.client.post('/llm/jobs', data={'kind': 'modify', 'recipe_id': recipe.id,
+                                                       'prompt': 'make it vegetarian', 'provider': 'placeholder'})
+        self.assertEqual(response.status_code, 202)
+        self.assertIn(response.get_json()['status'], ('queued', 'running', 'succeeded'))
+
+        payload = self._wait_for_job(response.get_json()['status_url'])
+        self.assertEqual(payload['status'], 'succeeded')
+        self.assertIn('Chicken Soup (Vegetarian AI Remix - Placeholder)', payload['html'])
+        self.assertIn('Based on your prompt: "make it vegetarian"', payload['html'])
+        self.assertIn('Save This Modified Recipe', payload['html'])
+
+    @patch('flask_login.utils._get_user')
+    def test_llm_job_rejections(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        response = self.client.post('/llm/jobs', data={'prompt': '', 'provider': 'placeholder'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/llm/jobs', data={'prompt': 'soup', 'provider': 'gemini'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('API key for Gemini not found', response.get_json()['error'])
+        response = self.client.post('/llm/jobs', data={'kind': 'modify', 'recipe_id': 999, 'prompt': 'soup'})
+        self.assertEqual(response.status_code, 404)
+
+        app.config['LLM_JOB_QUEUE_LIMIT'] = 0
+        try:
+            response = self.client.post('/llm/jobs', data={'prompt': 'soup', 'provider': 'placeholder'})
+        finally:
+            app.config['LLM_JOB_QUEUE_LIMIT'] = 32
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '5')
+        self.assertEqual(GenerationJob.query.count(), 0)
+
+        for _ in range(app.config['LLM_JOB_MAX_PER_USER']):
+            db.session.add(GenerationJob(user_id=user.id, kind='generate', provider='placeholder', prompt='soup'))
+        db.session.commit()
+        response = self.client.post('/llm/jobs', data={'prompt': 'soup', 'provider': 'placeholder'})
+        self.assertEqual(response.status_code, 429)
+
+    @patch('flask_login.utils._get_user')
+    def test_llm_job_rejected_while_provider_circuit_open(self, mock_get_user):
+        user = self._create_test_user()
+        db.session.add(UserSettings(user_id=user.id, gemini_api_key="fake_gemini_key_for_test"))
+        db.session.commit()
+        mock_get_user.return_value = user
+
+        guards, llm_client.guards = llm_client.guards, ProviderGuards(breaker={'min_calls': 1, 'reset_timeout': 30})
+        try:
+            with patch('builtins.print'):
+                llm_client.guards.get('gemini', GEMINI_MODEL_ID).record(False)
+            response = self.client.post('/llm/jobs', data={'prompt': 'soup', 'provider': 'gemini'})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '30')
+            self.assertIn('Gemini is temporarily unavailable', response.get_json()['error'])
+            self.assertEqual(GenerationJob.query.count(), 0)
+
+            response = self.client.post('/generate-recipe-llm', data={'prompt': 'soup', 'provider': 'gemini'})
+            self.assertEqual(response.status_code, 200) # The form, not a redirect to a job
+            self.assertIn('Gemini is temporarily unavailable', response.get_data(as_text=True))
+            self.assertEqual(GenerationJob.query.count(), 0)
+        finally:
+            llm_client.guards = guards
+
+    @patch('flask_login.utils._get_user')
+    def test_llm_job_status_is_private_and_expires(self, mock_get_user):
+        owner = self._create_test_user(email="owner@example.com")
+        other = self._create_test_user(email="other@example.com")
+        job = GenerationJob(user_id=owner.id, kind='generate', provider='gemini', prompt='soup',
+                            created_at=datetime.utcnow() - timedelta(seconds=app.config['LLM_JOB_TIMEOUT'] + 1))
+        db.session.add(job)
+        db.session.commit()
+
+        mock_get_user.return_value = other
+        self.assertEqual(self.client.get(url_for('llm_job_status', job_id=job.id)).status_code, 404)
+
+        mock_get_user.return_value = owner
+        payload = self.client.get(url_for('llm_job_status', job_id=job.id)).get_json()
+        self.assertEqual(payload['status'], 'failed')
+        self.assertIn('<strong>Error:</strong> AI request expired', payload['html'])
+
+    def test_llm_job_outcome_written_once(self):
+        from app.jobs import _execute_job, expire_stale_job
+        user = self._create_test_user()
+        finished = GenerationJob(user_id=user.id, kind='generate', provider='placeholder', prompt='soup',
+                                 status=GenerationJob.SUCCEEDED, result_json='{"name": "Soup"}')
+        racing = GenerationJob(user_id=user.id, kind='generate', provider='placeholder', prompt='stew')
+        db.session.add_all([finished, racing])
+        db.session.commit()
+
+        call = Mock(return_value={'name': 'Again'})
+        _execute_job(finished.id, call)
+        call.assert_not_called() # A finished job is never run again
+        self.assertEqual(finished.result, {'name': 'Soup'})
+
+        def expire_then_answer():
+            # The status page expires the job while the provider call is still in flight
+            expire_stale_job(db.session.get(GenerationJob, racing.id), -1)
+            return {'name': 'Late Stew'}
+        with patch('builtins.print'):
+            _execute_job(racing.id, expire_then_answer)
+        db.session.refresh(racing)
+        self.assertEqual(racing.status, GenerationJob.FAILED)
+        self.assertEqual(racing.error, 'AI request expired')
+        self.assertIsNone(racing.result_json)
+
+        expire_stale_job(finished, -1) # Expiry never overwrites a finished job
+        self.assertEqual(finished.status, GenerationJob.SUCCEEDED)
+
+    @patch('flask_login.utils._get_user')
+    def test_llm_job_slot_released_when_pool_is_shut_down(self, mock_get_user):
+        from app.jobs import job_runner
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        pending = job_runner.pending
+        with patch('app.jobs.ThreadPoolExecutor.submit', side_effect=RuntimeError('cannot schedule new futures after shutdown')):
+            response = self.client.post('/llm/jobs', data={'prompt': 'soup', 'provider': 'placeholder'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(job_runner.pending, pending)
+        job = GenerationJob.query.one()
+        self.assertEqual((job.status, job.error), (GenerationJob.FAILED, 'AI request could not be started'))
+
     # --- Authentication Flow Tests ---
     @patch('requests.Session.get') # Corrected: Patch requests.Session.get which OAuth2Session uses
     def test_google_oauth_callback_new_user(self, mock_session_get):
@@ -500,7 +1119,8 @@ class AppTestCase(unittest.TestCase):
         user = self._create_test_user()
         mock_get_user.return_value = user
         recipe = self._add_test_recipe(name="My Viewable Recipe", description="Desc for view", ingredients="View Ing 1\nView Ing 2", instructions="View Inst 1")
-        response = self.client.get(url_for('view_recipe', recipe_id=recipe.id))
+        with self.assertMaxQueries(2):
+            response = self.client.get(url_for('view_recipe', recipe_id=recipe.id))
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'My Viewable Recipe', response.data)
         self.assertIn(b'Desc for view', response.data)
@@ -527,10 +1147,11 @@ class AppTestCase(unittest.TestCase):
         recipe = self._add_test_recipe(name="Chicken Soup", ingredients="Chicken\nNoodles\nBroth", description="A classic soup.", instructions="Boil it.")
         modification_prompt = "make it vegetarian"
 
-        response_modification = self.client.post(
-            url_for('submit_llm_modification', recipe_id=recipe.id),
-            data={'prompt': modification_prompt, 'provider': 'placeholder'}
-        )
+        with patch.dict(app.config, {'LLM_JOB_WORKERS': 0}): # Job runs during the POST; follow it to its page
+            response_modification = self.client.post(
+                url_for('submit_llm_modification', recipe_id=recipe.id),
+                data={'prompt': modification_prompt, 'provider': 'placeholder'}, follow_redirects=True
+            )
         self.assertEqual(response_modification.status_code, 200)
         self.assertIn(b'AI Modified Recipe Suggestion', response_modification.data)
         self.assertIn(b'Chicken Soup (Vegetarian AI Remix - Placeholder)', response_modification.data)
@@ -545,10 +1166,10 @@ class AppTestCase(unittest.TestCase):
         db.session.commit()
         # user.settings = mock_user_settings_gemini # Not needed, route re-fetches
 
-        with patch('app.routes.current_user', user):
+        with patch('app.routes.current_user', user), patch.dict(app.config, {'LLM_JOB_WORKERS': 0}):
             response_gemini_mod = self.client.post(
                 url_for('submit_llm_modification', recipe_id=recipe.id),
-                data={'prompt': modification_prompt, 'provider': 'gemini'}
+                data={'prompt': modification_prompt, 'provider': 'gemini'}, follow_redirects=True
             )
         self.assertEqual(response_gemini_mod.status_code, 200)
         self.assertIn(b'<strong>Error:</strong> Gemini API Error', response_gemini_mod.data)
@@ -585,12 +1206,158 @@ class AppTestCase(unittest.TestCase):
         self.assertIn(b'Tofu\nNoodles\nBroth\n1 dash of AI Vegetarian Magic</textarea>', response_prefilled_form.data)
         self.assertIn(b'Boil it.\nAI Chef&#39;s Note: Ensure all animal products are lovingly replaced with plant-based alternatives.</textarea>', response_prefilled_form.data)
 
+    def test_user_loader_caches_snapshot_until_profile_saves(self):
+        user = self._create_test_user(email="cached@example.com")
+        db.session.add(UserSettings(user_id=user.id, theme='dark'))
+        db.session.commit()
+        with self.client.session_transaction() as sess: # Real login: the user_loader runs on each request
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+
+        def user_queries(path):
+            db.session.expunge_all() # As in production, each request starts with an empty session...
+            g.pop('_login_user', None) # ...and no user remembered by Flask-Login on the shared app context
+            with QueryRecorder(db.engine) as recorder:
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            return response, sum('FROM user' in statement for statement in recorder.statements)
+
+        response, loads = user_queries('/profile')
+        self.assertEqual(loads, 1)
+        self.assertIn(b'data-theme="dark"', response.data)
+        response, loads = user_queries('/profile')
+        self.assertEqual(loads, 0) # Served from the snapshot
+        self.assertIn(b'data-theme="dark"', response.data)
+        self.assertIsInstance(user_cache.get(user.id)[1], UserSnapshot)
+
+        g.pop('_login_user', None)
+        self.assertEqual(self.client.post('/profile', data={'theme': 'light'}).status_code, 302)
+        response, loads = user_queries('/profile')
+        self.assertEqual(loads, 1) # Saving dropped the stale snapshot
+        self.assertIn(b'data-theme="light"', response.data)
+        _, loads = user_queries('/profile')
+        self.assertEqual(loads, 0)
+
+        user_cache.set(user.id, ('another-worker', user_cache.get(user.id)[1])) # Snapshot stamped by another session
+        _, loads = user_queries('/profile')
+        self.assertEqual(loads, 1)
+
+    @patch('flask_login.utils._get_user')
+    def test_theme_rendered_from_session(self, mock_get_user):
+        user = self._create_test_user(email="theme@example.com")
+        mock_get_user.return_value = user
+        self.assertEqual(self.client.post('/profile', data={'theme': 'dark'}).status_code, 302)
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['render_prefs'], {'user_id': str(user.id), 'theme': 'dark'})
+
+        db.session.expire(user, ['settings']) # Touching user.settings now would have to query
+        with QueryRecorder(db.engine) as recorder:
+            response = self.client.get('/')
+        self.assertIn(b'data-theme="dark"', response.data)
+        self.assertFalse([s for s in recorder.statements if 'user_settings' in s])
+
+        other = self._create_test_user(email="other_theme@example.com")
+        db.session.add(UserSettings(user_id=other.id, theme='light'))
+        db.session.commit()
+        mock_get_user.return_value = other # Same browser, different account: not the first user's theme
+        self.assertIn(b'data-theme="light"', self.client.get('/').data)
+        mock_get_user.return_value = None
+        self.client.get('/auth/logout')
+        with self.client.session_transaction() as sess:
+            self.assertNotIn('render_prefs', sess)
+
+    @patch('flask_login.utils._get_user')
+    def test_recipe_pages_conditional_get(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        recipe = self._add_test_recipe(name="Cached Soup", ingredients="Broth")
+        self.assertEqual(recipe.version, 1)
+        url = url_for('view_recipe', recipe_id=recipe.id)
+
+        first = self.client.get(url)
+        etag, weak = first.get_etag()
+        self.assertFalse(weak)
+        self.assertIn('private', first.headers['Cache-Control'])
+        with patch('app.routes.render_template') as render:
+            response = self.client.get(url, headers={'If-None-Match': f'"{etag}"'})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+            render.assert_not_called()
+        # No date validator: If-Modified-Since can't tell whose page (name, theme) the client has
+        self.assertNotIn('Last-Modified', first.headers)
+        self.assertEqual(self.client.get(url, headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}).status_code, 200)
+
+        list_page = self.client.get('/recipes')
+        list_etag, weak = list_page.get_etag()
+        self.assertTrue(weak)
+        self.assertEqual(self.client.get('/recipes', headers={'If-None-Match': f'W/"{list_etag}"'}).status_code, 304)
+
+        self.client.post(f'/recipe/{recipe.id}/edit', data=dict(name='Cached Soup', description='', ingredients='Broth\nSalt',
+                                                                 instructions='Heat'))
+        self.assertEqual(db.session.get(Recipe, recipe.id).version, 2)
+        response = self.client.get(url, headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get_etag()[0], etag)
+        self.assertEqual(self.client.get('/recipes', headers={'If-None-Match': f'W/"{list_etag}"'}).status_code, 200)
+
+        # A different theme renders different HTML, so the same recipe version must not match
+        etag = response.get_etag()[0]
+        with self.client.session_transaction() as sess:
+            sess['render_prefs'] = {'user_id': str(user.id), 'theme': 'dark'}
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': f'"{etag}"'}).status_code, 200)
+
+        # Optimistic locking: an UPDATE from a stale version is refused
+        stale = db.session.get(Recipe, recipe.id)
+        db.session.execute(db.text("UPDATE recipe SET version = version + 1 WHERE id = :id"), {'id': recipe.id})
+        stale.name = 'Lost update'
+        with self.assertRaises(StaleDataError):
+            db.session.commit()
+        db.session.rollback()
+
+    @patch('flask_login.utils._get_user')
+    def test_recipe_list_fragment_cache(self, mock_get_user):
+        user = self._create_test_user()
+        mock_get_user.return_value = user
+        soup = self._add_test_recipe(name="Fragment Soup", description="<b>Hot</b>")
+        stew = self._add_test_recipe(name="Fragment Stew")
+        self._add_test_recipe(name="Fragment Salad")
+        app.config['RECIPE_FRAGMENT_CACHE_HEADER'] = True
+        self.addCleanup(app.config.__setitem__, 'RECIPE_FRAGMENT_CACHE_HEADER', False)
+
+        first = self.client.get('/recipes')
+        self.assertEqual(first.headers['X-Fragment-Cache'], 'hits=0; misses=3; hit-rate=0.00')
+        self.assertIn(b'&lt;b&gt;Hot&lt;/b&gt;', first.data)
+        second = self.client.get('/recipes')
+        self.assertEqual(second.headers['X-Fragment-Cache'], 'hits=3; misses=0; hit-rate=1.00')
+        self.assertEqual(second.data, first.data)
+
+        self.client.post(f'/recipe/{soup.id}/edit', data=dict(name='Fragment Chowder', description='', ingredients='Clams',
+                                                              instructions='Simmer'))
+        self.assertIsNone(fragment_cache.get(soup.id))
+        response = self.client.get('/recipes')
+        self.assertEqual(response.headers['X-Fragment-Cache'], 'hits=2; misses=1; hit-rate=0.67')
+        self.assertIn(b'Fragment Chowder', response.data)
+        self.assertNotIn(b'Fragment Soup', response.data)
+
+        # A version bumped elsewhere (another worker) is a miss even without the explicit invalidation
+        db.session.execute(db.text("UPDATE recipe SET name = 'Fragment Ragout', version = version + 1 WHERE id = :id"),
+                           {'id': stew.id})
+        db.session.commit()
+        response = self.client.get('/recipes')
+        self.assertIn(b'Fragment Ragout', response.data)
+        self.assertEqual(response.headers['X-Fragment-Cache'], 'hits=2; misses=1; hit-rate=0.67')
+
+        self.client.post(f'/recipe/{stew.id}/delete')
+        self.assertIsNone(fragment_cache.get(stew.id))
+        self.assertNotIn('X-Fragment-Cache', self.client.get(url_for('view_recipe', recipe_id=soup.id)).headers)
+
     @patch('flask_login.utils._get_user')
     def test_profile_page(self, mock_get_user):
         user = self._create_test_user(email="profile_user@example.com", google_id_suffix="_profile")
         mock_get_user.return_value = user
 
-        response = self.client.get('/profile')
+        with self.assertMaxQueries(2):
+            response = self.client.get('/profile')
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'User Profile', response.data)
         self.assertIn(b'Hugging Face API Key:', response.data)
@@ -659,6 +1426,141 @@ class AppTestCase(unittest.TestCase):
         # Check that the textarea for restrictions is empty
         self.assertIn(b'<textarea class="form-control" id="dietary_restrictions" name="dietary_restrictions" rows="3"></textarea>', response_clear_all.data)
 
+    @patch('flask_login.utils._get_user')
+    def test_bulk_import_and_export(self, mock_get_user):
+        mock_get_user.return_value = self._create_test_user()
+        lines = [json.dumps({'name': 'Bulk Soup', 'description': 'Warm', 'ingredients': '2 cups water\n1 onion',
+                             'instructions': 'Boil.'}),
+                 '{not json',
+                 json.dumps({'name': 'No Steps', 'ingredients': '1 egg'}),
+                 '',
+                 json.dumps({'name': 'Bulk Salad', 'ingredients': '1 lettuce', 'instructions': 'Toss.', 'extra': 1})]
+        with patch.dict(app.config, {'RECIPE_IMPORT_BATCH_SIZE': 1}): # Several batches
+            response = self.client.post('/recipes/import', data={
+                'file': (io.BytesIO('\n'.join(lines).encode('utf-8')), 'catalog.jsonl')},
+                content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Imported 2 recipes, skipped 2 invalid rows.', response.data)
+        self.assertIn(b'Line 2: Invalid JSON', response.data)
+        self.assertIn(b'Line 3: Missing instructions', response.data)
+        soup = Recipe.query.filter_by(name='Bulk Soup').one()
+        item_values = lambda items: [(i.position, i.raw_text, i.normalized_name, i.quantity, i.unit) for i in items]
+        self.assertEqual(item_values(soup.ingredient_items), item_values(build_ingredient_items(soup.ingredients)))
+        self.assertEqual(len(soup.ingredient_items), 2) # Same rows the ORM listener builds
+        self.assertEqual([r.name for r in search_recipes('lettuce')], ['Bulk Salad']) # FTS triggers saw the bulk insert
+
+        csv_file = io.BytesIO('\ufeffname,ingredients,instructions\n"Pie, Apple","3 apples\n1 crust",Bake.\n,x,y\n'.encode('utf-8'))
+        response = self.client.post('/recipes/import', data={'file': (csv_file, 'pies.csv')}, content_type='multipart/form-data')
+        self.assertIn(b'Imported 1 recipes, skipped 1 invalid rows.', response.data)
+        self.assertEqual(Recipe.query.filter_by(name='Pie, Apple').one().ingredients, '3 apples\n1 crust')
+
+        response = self.client.get('/recipes/export?format=jsonl')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        exported = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['name'] for row in exported], ['Bulk Soup', 'Bulk Salad', 'Pie, Apple'])
+        self.assertEqual(exported[0], {'id': soup.id, 'name': 'Bulk Soup', 'description': 'Warm',
+                                       'ingredients': '2 cups water\n1 onion', 'instructions': 'Boil.'})
+        response = self.client.get('/recipes/export?format=csv')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(rows[2]['name'], 'Pie, Apple')
+        self.assertEqual(rows[2]['ingredients'], '3 apples\n1 crust')
+        self.assertEqual(self.client.get('/recipes/export?format=xml').status_code, 400)
+
+        # Databases without ordered bulk RETURNING (MySQL) get each recipe's id from its own INSERT
+        with patch.object(db.engine.dialect, 'insert_executemany_returning_sort_by_parameter_order', False), \
+                QueryRecorder(db.engine) as recorder:
+            result = import_recipes(io.StringIO('\n'.join(json.dumps({'name': f'Plain {n}', 'ingredients': f'{n} eggs',
+                                                                        'instructions': 'Mix.'}) for n in (2, 3))))
+        self.assertEqual(result.imported, 2)
+        self.assertFalse([statement for statement in recorder.statements if 'RETURNING' in statement])
+        for n in (2, 3):
+            recipe = Recipe.query.filter_by(name=f'Plain {n}').one()
+            self.assertEqual([(i.normalized_name, i.quantity) for i in recipe.ingredient_items], [('eggs', n)])
+
+    def test_recipes_cli_import_export(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source, target = os.path.join(directory, 'in.csv'), os.path.join(directory, 'out.jsonl')
+        with open(source, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'description', 'ingredients', 'instructions'])
+            for i in range(5):
+                writer.writerow([f'CLI Recipe {i}', '', f'{i + 1} eggs', 'Cook.'])
+            writer.writerow(['', '', '', ''])
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['recipes', 'import', source, '--batch-size', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Imported 5 recipes, skipped 1 invalid rows.', result.output)
+        self.assertIn('line 7: Missing name, ingredients, instructions', result.output)
+        result = runner.invoke(args=['recipes', 'export', target])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with open(target) as f:
+            exported = [json.loads(line) for line in f]
+        self.assertEqual([row['name'] for row in exported], [f'CLI Recipe {i}' for i in range(5)])
+        self.assertIsNone(exported[0]['description'])
+
+    def test_create_app_factory(self):
+        other = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'RECIPES_PER_PAGE': 3, 'TESTING': True})
+        self.assertIsNot(other, app)
+        self.assertEqual(other.config['RECIPES_PER_PAGE'], 3)
+        self.assertEqual(other.config['LLM_BATCH_MAX_PROMPTS'], app.config['LLM_BATCH_MAX_PROMPTS']) # Defaults from Config
+        endpoints = {rule.endpoint for rule in other.url_map.iter_rules()}
+        self.assertEqual(endpoints, {rule.endpoint for rule in app.url_map.iter_rules()})
+        self.assertIn('index', endpoints) # Plain endpoint names, not blueprint-prefixed
+        self.assertEqual(other.test_client().get('/').status_code, 200)
+
+        # Each app gets its own LLM client, caches and metrics exporter; building one changes nothing in another
+        for name in ('llm_client', 'user_cache', 'fragment_cache', 'metrics'):
+            self.assertIsNot(other.extensions[name], app.extensions[name])
+        self.assertIs(app.extensions['llm_client'], llm_client)
+        size = user_cache.maxsize
+        with patch('builtins.print'):
+            third = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'USER_CACHE_SIZE': 5,
+                                'LLM_CACHE_ENABLED': False, 'METRICS_MULTIPROC_DIR': None, 'LLM_HEDGE_DELAY': 0.1})
+        self.assertEqual((third.extensions['user_cache'].maxsize, user_cache.maxsize), (5, size))
+        self.assertIsNone(third.extensions['llm_client'].response_cache)
+        self.assertEqual(llm_client.hedge_delay, app.config['LLM_HEDGE_DELAY'])
+
+    def test_import_leaves_google_sdk_unloaded(self):
+        # Importing the package builds no app, and the Gemini SDK is imported by the first Gemini call,
+        # not by workers/CLI commands that never use it
+        code = ("import sys, app; built = 'app.routes' in sys.modules; app.create_app({'LLM_CACHE_PATH': ''}); "
+                "print(built, sorted(m for m in ('google.generativeai', 'google.api_core') if m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.stdout.strip().splitlines()[-1], 'False []')
+
+    @patch('flask_login.utils._get_user')
+    def test_metrics_endpoint(self, mock_get_user):
+        mock_get_user.return_value = self._create_test_user()
+        self.client.get('/recipes')
+        self.client.get('/no-such-page')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertRegex(text, r'http_requests_total\{endpoint="recipes",method="GET",status="200"\} \d+')
+        self.assertRegex(text, r'http_requests_total\{endpoint="unmatched",method="GET",status="404"\} \d+')
+        self.assertRegex(text, r'http_request_sql_queries_count\{endpoint="recipes"\} \d+')
+        self.assertIn('sql_query_duration_seconds_bucket{statement="SELECT",le="+Inf"}', text)
+        self.assertIn('# TYPE llm_provider_calls_total counter', text)
+
+        app.config['METRICS_AUTH_TOKEN'] = 'scrape-secret'
+        try:
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+            self.assertEqual(response.status_code, 200)
+        finally:
+            app.config['METRICS_AUTH_TOKEN'] = None
+
+        # Outside debug/testing the endpoint is only served with a token configured
+        app.config['TESTING'] = False
+        try:
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            app.config['METRICS_AUTH_TOKEN'] = 'scrape-secret'
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+            self.assertEqual(response.status_code, 200)
+        finally:
+            app.config['TESTING'] = True
+            app.config['METRICS_AUTH_TOKEN'] = None
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.caching import LRUCache, SQLiteCache, TieredCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a') # 'b' is now the oldest
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire_after_ttl(self):
+        cache = LRUCache(maxsize=4, ttl=10)
+        with patch('app.caching.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with patch('app.caching.time.monotonic', return_value=109.0):
+            self.assertEqual(cache.get('a'), 1)
+        with patch('app.caching.time.monotonic', return_value=110.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class TieredCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_persistent_hits_are_promoted_to_memory(self):
+        writer = TieredCache(LRUCache(4), SQLiteCache(self.path, ttl=60))
+        writer.set('k', {'name': 'Soup'})
+        writer.close()
+
+        reader = TieredCache(LRUCache(4), SQLiteCache(self.path, ttl=60))
+        self.assertEqual(reader.get('k'), {'name': 'Soup'})
+        self.assertEqual(reader.get('k'), {'name': 'Soup'})
+        self.assertIsNone(reader.get('missing'))
+        reader.close()
+        self.assertEqual(reader.stats, {'memory_hits': 1, 'persistent_hits': 1, 'misses': 1, 'stores': 0})
+        self.assertAlmostEqual(reader.hit_ratio(), 2 / 3)
+
+    def test_expired_persistent_entries_are_misses(self):
+        cache = SQLiteCache(self.path, ttl=60)
+        with patch('app.caching.time.time', return_value=1000.0):
+            cache.set('k', [1, 2])
+        with patch('app.caching.time.time', return_value=1059.0):
+            self.assertEqual(cache.get('k'), [1, 2])
+        with patch('app.caching.time.time', return_value=1060.0):
+            self.assertIsNone(cache.get('k'))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import create_app, db
+from app.db_tuning import engine_options, sqlite_pragmas
+
+
+class DBTuningTestCase(unittest.TestCase):
+    def _app(self, **config):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return create_app(dict(config, LLM_CACHE_PATH='')) # No LLM cache file in instance/ for throwaway apps
+
+    def test_sqlite_connections_get_pragmas(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        app = self._app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'tuned.db')}",
+                        SQLITE_BUSY_TIMEOUT_MS=1234)
+        with app.app_context():
+            with db.engine.connect() as conn:
+                pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                self.assertEqual(pragma('journal_mode'), 'wal')
+                self.assertEqual(pragma('synchronous'), 1) # NORMAL
+                self.assertEqual(pragma('busy_timeout'), 1234)
+                self.assertEqual(pragma('foreign_keys'), 1)
+                self.assertEqual(pragma('cache_size'), -app.config['SQLITE_CACHE_SIZE_KB'])
+            db.engine.dispose()
+
+    def test_default_profile_leaves_driver_defaults(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        app = self._app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'plain.db')}",
+                        DB_ENGINE_PROFILE='default')
+        with app.app_context():
+            with db.engine.connect() as conn:
+                self.assertEqual(conn.exec_driver_sql("PRAGMA journal_mode").scalar(), 'delete')
+                self.assertEqual(conn.exec_driver_sql("PRAGMA foreign_keys").scalar(), 0)
+            db.engine.dispose()
+
+    def test_server_database_pool_options(self):
+        app = self._app(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:')
+        self.assertEqual(engine_options(app), {}) # SQLite is tuned through PRAGMAs instead
+        app.config.update(SQLALCHEMY_DATABASE_URI='postgresql://app@db/recipes', DB_POOL_SIZE=5, DB_POOL_RECYCLE=600)
+        self.assertEqual(engine_options(app), {'pool_size': 5, 'max_overflow': 20, 'pool_timeout': 30,
+                                               'pool_recycle': 600, 'pool_pre_ping': True})
+        app.config['DB_ENGINE_PROFILE'] = 'default'
+        self.assertEqual(engine_options(app), {})
+        self.assertNotIn("PRAGMA foreign_keys = ON", sqlite_pragmas({'SQLITE_FOREIGN_KEYS': False}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from app.ingredients import parse_ingredient_line, consolidate, format_grocery_item
+
+
+class TestIngredientParsing(unittest.TestCase):
+
+    def test_plain_line_has_no_quantity(self):
+        self.assertEqual(parse_ingredient_line("Tomato Sauce"), ("tomato sauce", None, None))
+        self.assertEqual(parse_ingredient_line("- Lettuce"), ("lettuce", None, None))
+        self.assertEqual(parse_ingredient_line("Salt to taste"), ("salt", None, None))
+
+    def test_fractions_and_mixed_numbers(self):
+        self.assertAlmostEqual(parse_ingredient_line("1/2 cup milk").quantity, 118.294)
+        self.assertAlmostEqual(parse_ingredient_line("1 1/2 cups milk").quantity, 354.882)
+        self.assertAlmostEqual(parse_ingredient_line("1½ cups milk").quantity, 354.882)
+        self.assertAlmostEqual(parse_ingredient_line("½ tsp salt").quantity, 2.46446)
+
+    def test_unit_aliases_share_a_base_unit(self):
+        cups = parse_ingredient_line("2 cups flour")
+        tbsp = parse_ingredient_line("3 Tablespoons of flour")
+        self.assertEqual((cups.name, cups.unit), ("flour", "ml"))
+        self.assertEqual((tbsp.name, tbsp.unit), ("flour", "ml"))
+        self.assertEqual(parse_ingredient_line("8 oz beef").unit, "g")
+        self.assertEqual(parse_ingredient_line("1 lbs beef").unit, "g")
+
+    def test_ranges_use_upper_bound(self):
+        self.assertEqual(parse_ingredient_line("2-3 cloves garlic, minced"), ("garlic", 3.0, "clove"))
+        self.assertEqual(parse_ingredient_line("3 to 4 eggs"), ("eggs", 4.0, None))
+
+    def test_parenthetical_notes_are_ignored(self):
+        self.assertEqual(parse_ingredient_line("1 (14 oz) can diced tomatoes"), ("diced tomatoes", 1.0, "can"))
+
+    def test_consolidate_sums_per_ingredient_and_unit_family(self):
+        items = consolidate(["2 cups flour", "4 tbsp flour", "1 lb beef", "8 oz beef", "Salt", "salt", "2 eggs", "eggs"])
+        formatted = [format_grocery_item(*item) for item in items]
+        self.assertEqual(formatted, ["Beef (1.5 lb)", "Eggs (2 + x1)", "Flour (2.25 cups)", "Salt (x2)"])
+
+
+if __name__ == '__main__':
+    unittest.main()
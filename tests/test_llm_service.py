@@ -1,9 +1,19 @@
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, ANY
 from app.llm_service import LLMServiceClient # Import the class to test
+from app.recipe_parser import IncrementalRecipeParser
 import app.llm_service as llm_service_module # To patch the global client if needed by routes
 import requests # To mock requests.exceptions if needed
 import google.auth.exceptions # To mock google auth exceptions
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 
 # Example structured output for mocking
 mock_hf_good_output = "Recipe Name: HF Test Pasta\nDescription: A delicious pasta from HF.\nIngredients:\nPasta\nSauce\nCheese\nInstructions:\n1. Cook pasta.\n2. Add sauce.\n3. Add cheese."
@@ -22,7 +32,7 @@ class TestLLMService(unittest.TestCase):
 
     # --- Tests for generate_recipe ---
 
-    @patch('app.llm_service.requests.post')
+    @patch('app.llm_service.requests.Session.post')
     def test_generate_recipe_huggingface_success(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -42,7 +52,7 @@ class TestLLMService(unittest.TestCase):
         self.assertIn("Cook pasta", result['instructions'])
         self.assertTrue(result.get('is_ai_generated'))
 
-    @patch('app.llm_service.requests.post')
+    @patch('app.llm_service.requests.Session.post')
     def test_generate_recipe_huggingface_api_error(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 401 # Unauthorized
@@ -59,7 +69,7 @@ class TestLLMService(unittest.TestCase):
         self.assertEqual(result['error'], 'Hugging Face API Error')
         self.assertIn('Invalid API Key or unauthorized', result['details'])
 
-    @patch('app.llm_service.requests.post')
+    @patch('app.llm_service.requests.Session.post')
     def test_generate_recipe_huggingface_timeout(self, mock_post):
         mock_post.side_effect = requests.exceptions.Timeout
 
@@ -72,8 +82,8 @@ class TestLLMService(unittest.TestCase):
         self.assertEqual(result['details'], 'Request timed out.')
 
     @patch('app.llm_service.genai.GenerativeModel')
-    @patch('app.llm_service.genai.configure')
-    def test_generate_recipe_gemini_success(self, mock_configure, mock_generative_model):
+    @patch('app.llm_service.glm.GenerativeServiceClient')
+    def test_generate_recipe_gemini_success(self, mock_service_client, mock_generative_model):
         mock_model_instance = Mock()
         mock_gemini_response = Mock()
         mock_gemini_response.text = mock_gemini_good_output
@@ -86,7 +96,7 @@ class TestLLMService(unittest.TestCase):
         api_keys = {'gemini': self.gemini_api_key}
         result = self.client.generate_recipe(user_prompt, provider="gemini", api_keys=api_keys)
 
-        mock_configure.assert_called_once_with(api_key=self.gemini_api_key)
+        mock_service_client.assert_called_once_with(client_options={'api_key': self.gemini_api_key})
         mock_model_instance.generate_content.assert_called_once()
         self.assertEqual(result['name'], "Gemini Test Salad")
         self.assertIn("fresh salad from Gemini", result['description'])
@@ -95,10 +105,10 @@ class TestLLMService(unittest.TestCase):
         self.assertTrue(result.get('is_ai_generated'))
 
     @patch('app.llm_service.genai.GenerativeModel')
-    @patch('app.llm_service.genai.configure')
-    def test_generate_recipe_gemini_api_key_error(self, mock_configure, mock_generative_model):
-        # Simulate an API key error during configure or model instantiation
-        mock_configure.side_effect = google.auth.exceptions.RefreshError("Invalid API Key")
+    @patch('app.llm_service.glm.GenerativeServiceClient')
+    def test_generate_recipe_gemini_api_key_error(self, mock_service_client, mock_generative_model):
+        # Simulate an API key error while building the per-key client
+        mock_service_client.side_effect = google.auth.exceptions.RefreshError("Invalid API Key")
 
         user_prompt = "a test dish"
         api_keys = {'gemini': self.gemini_api_key}
@@ -109,8 +119,8 @@ class TestLLMService(unittest.TestCase):
         self.assertIn('Failed to authenticate', result['details'])
 
     @patch('app.llm_service.genai.GenerativeModel')
-    @patch('app.llm_service.genai.configure')
-    def test_generate_recipe_gemini_content_blocked(self, mock_configure, mock_generative_model):
+    @patch('app.llm_service.glm.GenerativeServiceClient')
+    def test_generate_recipe_gemini_content_blocked(self, mock_service_client, mock_generative_model):
         mock_model_instance = Mock()
         mock_gemini_response = Mock()
         mock_gemini_response.text = None # No text if blocked
@@ -146,7 +156,7 @@ class TestLLMService(unittest.TestCase):
 
     # --- Tests for modify_recipe (similar structure) ---
 
-    @patch('app.llm_service.requests.post')
+    @patch('app.llm_service.requests.Session.post')
     def test_modify_recipe_huggingface_success(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -166,8 +176,8 @@ class TestLLMService(unittest.TestCase):
         self.assertTrue(result.get('is_ai_modified'))
 
     @patch('app.llm_service.genai.GenerativeModel')
-    @patch('app.llm_service.genai.configure')
-    def test_modify_recipe_gemini_success(self, mock_configure, mock_generative_model):
+    @patch('app.llm_service.glm.GenerativeServiceClient')
+    def test_modify_recipe_gemini_success(self, mock_service_client, mock_generative_model):
         mock_model_instance = Mock()
         modified_text = "Recipe Name: Gemini Modified Cake\nDescription: Cake, now gluten-free.\nIngredients:\n- GF Flour\n- Sugar\nInstructions:\n1. Mix GF flour and sugar.\n2. Bake."
         mock_gemini_response = Mock(text=modified_text, parts=[Mock(text=modified_text)], prompt_feedback=None)
@@ -179,7 +189,7 @@ class TestLLMService(unittest.TestCase):
         api_keys = {'gemini': self.gemini_api_key}
         result = self.client.modify_recipe(original_recipe, user_prompt, provider="gemini", api_keys=api_keys)
 
-        mock_configure.assert_called_once_with(api_key=self.gemini_api_key)
+        mock_service_client.assert_called_once_with(client_options={'api_key': self.gemini_api_key})
         self.assertEqual(result['name'], "Gemini Modified Cake")
         self.assertIn("gluten-free", result['description'])
         self.assertTrue(result.get('is_ai_modified'))
@@ -220,6 +230,486 @@ class TestLLMService(unittest.TestCase):
         self.assertIn('error', result)
         self.assertEqual(result['error'], 'Invalid text received for parsing from TestProvider')
 
+    def test_parse_recipe_text_markdown_headers(self):
+        text = ("## Lemon Chicken\n\n**Description:** Bright and easy.\nWeeknight friendly.\n\n"
+                "### Ingredients\n* 6 chicken thighs\n\u2022 2 lemons\n+ Salt\n\n"
+                "**Instructions**\n1. Heat the oven.\n2. Roast for 40 minutes.")
+        result = self.client._parse_recipe_text(text, "Gemini")
+        self.assertEqual(result, {'name': "Lemon Chicken", 'description': "Bright and easy.\nWeeknight friendly.",
+                                  'ingredients': "- 6 chicken thighs\n- 2 lemons\n- Salt",
+                                  'instructions': "1. Heat the oven.\n2. Roast for 40 minutes."})
+
+        text = "- **Recipe Name:** Soup\n- **Ingredients:** Water\n__Method__\nBoil.\nSteps matter here too."
+        result = self.client._parse_recipe_text(text, "Gemini")
+        self.assertEqual((result['name'], result['ingredients']), ("Soup", "Water"))
+        self.assertEqual(result['instructions'], "Boil.\nSteps matter here too.") # Keyword but not a header line
+
+    # --- Tests for the pooled HTTP session ---
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_huggingface_calls_reuse_pooled_session(self, mock_post):
+        mock_response = Mock()
+        mock_response.json.return_value = [{'generated_text': mock_hf_good_output}]
+        mock_post.return_value = mock_response
+        client = LLMServiceClient(hf_api_base_url="http://127.0.0.1:9/models/", pool_maxsize=4, max_retries=3)
+        api_keys = {'hugging_face': self.hf_api_key}
+
+        client.generate_recipe("a pasta dish", provider="hugging_face", api_keys=api_keys)
+        session = client._http_session
+        client.generate_recipe("another pasta dish", provider="hugging_face", api_keys=api_keys)
+
+        self.assertIs(client._http_session, session) # Same session (and connection pool) for both calls
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertTrue(mock_post.call_args[0][0].startswith("http://127.0.0.1:9/models/"))
+        adapter = session.get_adapter("https://api-inference.huggingface.co/models/x")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(tuple(adapter.max_retries.status_forcelist), (502,)) # Never 504: the model may still be working
+
+        client.close()
+        self.assertIsNone(client._http_session)
+        client.configure_http_pool(pool_maxsize=8)
+        self.assertEqual(client._get_http_session().get_adapter("http://x/")._pool_maxsize, 8)
+        client.close()
+
+    # --- Tests for streaming generation ---
+
+    def test_incremental_parser_matches_whole_text_parse(self):
+        whole = self.client._parse_recipe_text(mock_gemini_good_output, "Gemini")
+        for size in (1, 3, 7, 50):
+            parser = IncrementalRecipeParser(default_name="Gemini Generated Recipe")
+            events = []
+            for start in range(0, len(mock_gemini_good_output), size):
+                events.extend(parser.feed(mock_gemini_good_output[start:start + size]))
+            events.extend(parser.close())
+            self.assertEqual(parser.recipe_data(), whole)
+            self.assertEqual(events[0], ('name', 'Gemini Test Salad'))
+            self.assertIn(('ingredient', '- Tomato'), events)
+            self.assertEqual(events[-1], ('instruction', '3. Serve.'))
+
+    def test_incremental_parser_reports_lines_as_soon_as_complete(self):
+        parser = IncrementalRecipeParser()
+        self.assertEqual(parser.feed("Recipe Name: Sou"), [])
+        self.assertEqual(parser.feed("p\nIngredients:\n2 cups wa"), [('name', 'Soup')])
+        self.assertEqual(parser.feed("ter\n"), [('ingredient', '2 cups water')])
+        self.assertEqual(parser.close(), [])
+
+    @patch('app.llm_service.genai.GenerativeModel')
+    @patch('app.llm_service.glm.GenerativeServiceClient')
+    def test_stream_recipe_gemini_yields_ingredients_before_stream_ends(self, mock_service_client, mock_generative_model):
+        pieces = [mock_gemini_good_output[i:i + 12] for i in range(0, len(mock_gemini_good_output), 12)]
+        consumed = []
+
+        def chunks():
+            for piece in pieces:
+                consumed.append(piece)
+                yield Mock(parts=[Mock(text=piece)])
+
+        mock_model_instance = Mock()
+        mock_model_instance.generate_content.return_value = Mock(__iter__=lambda self: chunks(), prompt_feedback=None)
+        mock_generative_model.return_value = mock_model_instance
+
+        stream = self.client.stream_recipe("a salad", provider="gemini", api_keys={'gemini': self.gemini_api_key})
+        first_ingredient_at = None
+        events = []
+        for event, data in stream:
+            events.append((event, data))
+            if event == 'ingredient' and first_ingredient_at is None:
+                first_ingredient_at = len(consumed)
+
+        mock_model_instance.generate_content.assert_called_once_with(ANY, stream=True)
+        self.assertLess(first_ingredient_at, len(pieces) - 3) # Well before the response is complete
+        self.assertEqual([d for e, d in events if e == 'ingredient'], ['- Lettuce', '- Tomato', '- Cucumber'])
+        event, recipe = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertEqual(recipe['name'], "Gemini Test Salad")
+        self.assertTrue(recipe['is_ai_generated'])
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_stream_recipe_huggingface_server_sent_tokens(self, mock_post):
+        tokens = [mock_hf_good_output[i:i + 5] for i in range(0, len(mock_hf_good_output), 5)]
+        lines = [f'data: {{"token": {{"text": {json.dumps(t)}, "special": false}}}}' for t in tokens]
+        lines.insert(0, '')
+        lines.append('data: {"token": {"text": "</s>", "special": true}}')
+        mock_response = Mock()
+        mock_response.iter_lines.return_value = iter(lines)
+        mock_post.return_value = mock_response
+
+        events = list(self.client.stream_recipe("a pasta dish", provider="hugging_face", api_keys={'hugging_face': self.hf_api_key}))
+
+        self.assertTrue(mock_post.call_args[1]['stream'])
+        self.assertTrue(mock_post.call_args[1]['json']['stream'])
+        self.assertIn(('ingredient', 'Sauce'), events)
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['instructions'], "1. Cook pasta.\n2. Add sauce.\n3. Add cheese.")
+        mock_response.close.assert_called_once()
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_stream_recipe_huggingface_unauthorized(self, mock_post):
+        mock_response = Mock(status_code=401)
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=mock_response)
+        mock_post.return_value = mock_response
+
+        events = list(self.client.stream_recipe("soup", provider="hugging_face", api_keys={'hugging_face': self.hf_api_key}))
+
+        self.assertEqual(len(events), 1)
+        event, error = events[0]
+        self.assertEqual(event, 'error')
+        self.assertEqual(error['details'], 'Invalid API Key or unauthorized.')
+
+    def test_stream_recipe_placeholder(self):
+        events = list(self.client.stream_recipe("a pasta dish"))
+        self.assertEqual(events[0], ('name', "AI Generated Pasta Dish (Placeholder)"))
+        self.assertEqual(events[-1][0], 'done')
+
+    # --- Tests for "fastest" provider hedging ---
+
+    def _fake_provider(self, output, delay=0.0, calls=None, name=None):
+        def call(prompt, api_key):
+            if calls is not None:
+                calls.append(name)
+            time.sleep(delay)
+            return output
+        return call
+
+    def test_fastest_hedges_slow_primary(self):
+        client = LLMServiceClient(hedge_delay=0.05)
+        calls = []
+        api_keys = {'gemini': self.gemini_api_key, 'hugging_face': self.hf_api_key}
+        with patch.object(client, '_call_gemini_api', self._fake_provider(mock_gemini_good_output, 0.5, calls, 'gemini')), \
+             patch.object(client, '_call_huggingface_inference_api', lambda model, prompt, key: self._fake_provider(mock_hf_good_output, 0, calls, 'hugging_face')(prompt, key)):
+            started = time.monotonic()
+            result = client.generate_recipe("pasta", provider="fastest", api_keys=api_keys)
+            elapsed = time.monotonic() - started
+        client.close()
+
+        self.assertEqual(result['name'], "HF Test Pasta")
+        self.assertEqual(result['provider_name'], "Hugging Face")
+        self.assertLess(elapsed, 0.4) # Didn't wait out the slow primary
+        self.assertEqual(calls, ['gemini', 'hugging_face'])
+        stats = client.hedge_stats.snapshot()
+        self.assertEqual(stats['wins'], {'hugging_face': 1})
+        self.assertEqual(stats['hedged'], 1)
+
+    def test_fastest_fast_primary_never_starts_backup(self):
+        client = LLMServiceClient(hedge_delay=0.5)
+        calls = []
+        api_keys = {'gemini': self.gemini_api_key, 'hugging_face': self.hf_api_key}
+        with patch.object(client, '_call_gemini_api', self._fake_provider(mock_gemini_good_output, 0, calls, 'gemini')), \
+             patch.object(client, '_call_huggingface_inference_api', Mock(side_effect=AssertionError("backup started"))):
+            result = client.generate_recipe("salad", provider="fastest", api_keys=api_keys)
+        client.close()
+
+        self.assertEqual(result['name'], "Gemini Test Salad")
+        self.assertEqual(calls, ['gemini'])
+        stats = client.hedge_stats.snapshot()
+        self.assertEqual((stats['wins'], stats['hedged'], stats['primary_samples']), ({'gemini': 1}, 0, 1))
+
+    def test_fastest_unparseable_primary_falls_through_to_backup(self):
+        client = LLMServiceClient(hedge_delay=5)
+        api_keys = {'gemini': self.gemini_api_key, 'hugging_face': self.hf_api_key}
+        with patch.object(client, '_call_gemini_api', self._fake_provider("Sorry, I can't help with that.")), \
+             patch.object(client, '_call_huggingface_inference_api', lambda model, prompt, key: mock_hf_good_output):
+            started = time.monotonic()
+            result = client.generate_recipe("pasta", provider="fastest", api_keys=api_keys)
+        client.close()
+
+        self.assertEqual(result['name'], "HF Test Pasta")
+        self.assertLess(time.monotonic() - started, 1) # Backup started as soon as the primary failed
+
+    def test_fastest_all_providers_fail(self):
+        client = LLMServiceClient(hedge_delay=0)
+        api_keys = {'gemini': self.gemini_api_key, 'hugging_face': self.hf_api_key}
+        with patch.object(client, '_call_gemini_api', lambda prompt, key: {'error': 'Gemini API Error', 'details': 'down'}), \
+             patch.object(client, '_call_huggingface_inference_api', lambda model, prompt, key: {'error': 'Hugging Face API Error', 'details': 'down'}):
+            result = client.generate_recipe("pasta", provider="fastest", api_keys=api_keys)
+        client.close()
+        self.assertIn(result['error'], ('Gemini API Error', 'Hugging Face API Error'))
+
+    def test_fastest_single_key_uses_that_provider(self):
+        with patch.object(self.client, '_call_gemini_api', lambda prompt, key: mock_gemini_good_output):
+            result = self.client.generate_recipe("salad", provider="fastest", api_keys={'gemini': self.gemini_api_key})
+        self.assertEqual(result['name'], "Gemini Test Salad")
+        result = self.client.generate_recipe("salad", provider="fastest", api_keys={})
+        self.assertEqual(result['error'], 'Fastest API Error')
+
+    # --- Tests for batch generation ---
+
+    def test_generate_recipes_batch_runs_concurrently_in_order(self):
+        client = LLMServiceClient(provider_concurrency=3)
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def slow_gemini(prompt, key):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            if "broken" in prompt:
+                return {'error': 'Gemini API Error', 'details': 'quota'}
+            dish = re.search(r"dinner \d", prompt).group(0)
+            return mock_gemini_good_output.replace("Gemini Test Salad", dish)
+
+        prompts = [f"dinner {n}" for n in range(5)] + ["broken dinner"]
+        with patch.object(client, '_call_gemini_api', slow_gemini):
+            results = client.generate_recipes_batch(prompts, provider="gemini", api_keys={'gemini': self.gemini_api_key},
+                                                    max_concurrency=6, use_cache=False)
+        client.close()
+
+        self.assertEqual([r['name'] for r in results[:5]], prompts[:5]) # Prompt order, whatever finished first
+        self.assertEqual(results[5]['error'], 'Gemini API Error') # Per-item error, the rest still succeeded
+        self.assertEqual(peak[0], 3) # Calls overlapped, capped by the provider semaphore below the batch's own limit of 6
+
+    def test_generate_recipes_batch_max_concurrency_and_exceptions(self):
+        client = LLMServiceClient(provider_concurrency=8)
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def generate(user_prompt, provider, api_keys, use_cache):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            if user_prompt == "boom":
+                raise RuntimeError("unexpected")
+            return {'name': user_prompt}
+
+        with patch.object(client, 'generate_recipe', lambda p, provider, api_keys, use_cache: generate(p, provider, api_keys, use_cache)), \
+             patch('builtins.print'):
+            results = client.generate_recipes_batch(["a", "boom", "c", "d"], provider="gemini", api_keys={}, max_concurrency=2)
+        client.close()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual([r.get('name') for r in results], ["a", None, "c", "d"])
+        self.assertEqual((results[1]['error'], results[1]['details']), ('AI request failed', 'unexpected'))
+        self.assertEqual(client.generate_recipes_batch([]), [])
+
+    # --- Tests for circuit breakers and adaptive timeouts ---
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_hf_outage_opens_circuit_and_fails_fast(self, mock_post):
+        client = LLMServiceClient(breaker={'min_calls': 3, 'reset_timeout': 60})
+        mock_post.side_effect = requests.exceptions.Timeout("read timed out")
+        api_keys = {'hugging_face': self.hf_api_key}
+        with patch('builtins.print'):
+            for _ in range(3):
+                result = client.generate_recipe("soup", provider="hugging_face", api_keys=api_keys, use_cache=False)
+                self.assertEqual(result['details'], 'Request timed out.')
+            result = client.generate_recipe("soup", provider="hugging_face", api_keys=api_keys, use_cache=False)
+
+        self.assertEqual(mock_post.call_count, 3) # Fourth call never reached the network
+        self.assertEqual(result['error'], 'Hugging Face Temporarily Unavailable')
+        self.assertIn('Try again in 60 seconds', result['details'])
+        self.assertGreater(client.circuit_retry_after('hugging_face'), 59)
+        self.assertEqual(client.circuit_retry_after('gemini'), 0.0)
+        self.assertEqual(client.circuit_retry_after('placeholder'), 0.0)
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_hf_rejected_key_does_not_open_circuit(self, mock_post):
+        client = LLMServiceClient(breaker={'min_calls': 2})
+        mock_response = Mock(status_code=401, text="Unauthorized")
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=mock_response)
+        mock_post.return_value = mock_response
+        with patch('builtins.print'):
+            for _ in range(5):
+                result = client.generate_recipe("soup", provider="hugging_face", api_keys={'hugging_face': "bad"})
+        self.assertEqual(result['details'], 'Invalid API Key or unauthorized.')
+        self.assertEqual(mock_post.call_count, 5)
+        self.assertEqual(client.circuit_retry_after('hugging_face'), 0.0)
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_hf_timeout_adapts_to_observed_latency(self, mock_post):
+        client = LLMServiceClient(timeout={'minimum': 2, 'maximum': 45, 'min_samples': 3})
+        mock_post.return_value = self._hf_response()
+        with patch('builtins.print'), patch('app.llm_service.time.monotonic', side_effect=[0.0, 4.0] * 4):
+            for n in range(4):
+                client.generate_recipe(f"soup {n}", provider="hugging_face", api_keys={'hugging_face': self.hf_api_key})
+        timeouts = [call.kwargs['timeout'] for call in mock_post.call_args_list]
+        self.assertEqual(timeouts[:3], [(10, 45)] * 3) # Default until enough latencies are seen
+        self.assertEqual(timeouts[3], (10, 6.0)) # 4s p99 x 1.5
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_provider_calls_are_counted_by_outcome(self, mock_post):
+        calls = lambda outcome: llm_service_module.LLM_CALLS._values.get(('hugging_face', 'call', outcome), 0)
+        parses = lambda result: llm_service_module.LLM_PARSES._values.get(('Hugging Face', result), 0)
+        before = {outcome: calls(outcome) for outcome in ('ok', 'timeout', 'circuit_open')}
+        ok_parses = parses('ok')
+        client = LLMServiceClient(breaker={'min_calls': 1})
+        api_keys = {'hugging_face': self.hf_api_key}
+        mock_post.return_value = self._hf_response()
+        with patch('builtins.print'):
+            client.generate_recipe("soup", provider="hugging_face", api_keys=api_keys, use_cache=False)
+            mock_post.side_effect = requests.exceptions.Timeout("read timed out")
+            client.generate_recipe("soup", provider="hugging_face", api_keys=api_keys, use_cache=False)
+            client.generate_recipe("soup", provider="hugging_face", api_keys=api_keys, use_cache=False)
+        self.assertEqual(calls('ok') - before['ok'], 1)
+        self.assertEqual(calls('timeout') - before['timeout'], 1)
+        self.assertEqual(calls('circuit_open') - before['circuit_open'], 1)
+        self.assertEqual(parses('ok') - ok_parses, 1)
+
+    def test_gemini_service_client_gets_adaptive_deadline(self):
+        service_client = Mock()
+        with patch('app.llm_service.glm.GenerativeServiceClient', return_value=service_client):
+            model = self.client.gemini_models.get(self.gemini_api_key)
+        model._client.generate_content("request")
+        service_client.generate_content.assert_called_once_with("request", timeout=45.0, retry=None)
+        model._client.stream_generate_content("request", timeout=5)
+        service_client.stream_generate_content.assert_called_once_with("request", timeout=5, retry=None)
+
+    @patch('app.llm_service.genai.GenerativeModel')
+    @patch('app.llm_service.glm.GenerativeServiceClient')
+    def test_gemini_server_errors_open_circuit_for_streams_too(self, mock_service_client, mock_generative_model):
+        from google.api_core.exceptions import ServiceUnavailable
+        client = LLMServiceClient(breaker={'min_calls': 2})
+        mock_model_instance = Mock()
+        mock_model_instance.generate_content.side_effect = ServiceUnavailable("backend unavailable")
+        mock_generative_model.return_value = mock_model_instance
+        api_keys = {'gemini': self.gemini_api_key}
+        with patch('builtins.print'):
+            for _ in range(2):
+                self.assertEqual(client.generate_recipe("salad", provider="gemini", api_keys=api_keys)['error'], 'Gemini API Error')
+            events = list(client.stream_recipe("salad", provider="gemini", api_keys=api_keys))
+        self.assertEqual(events[-1][0], 'error')
+        self.assertEqual(events[-1][1]['error'], 'Gemini Temporarily Unavailable')
+        self.assertEqual(mock_model_instance.generate_content.call_count, 2)
+
+    # --- Tests for the per-key Gemini client pool ---
+
+    @patch('app.llm_service.genai.GenerativeModel')
+    @patch('app.llm_service.glm.GenerativeServiceClient')
+    def test_gemini_model_built_once_per_key(self, mock_service_client, mock_generative_model):
+        mock_model_instance = Mock()
+        mock_model_instance.generate_content.return_value = Mock(parts=[Mock(text=mock_gemini_good_output)], prompt_feedback=None)
+        mock_generative_model.return_value = mock_model_instance
+
+        for prompt in ("a salad", "a soup", "a stew"):
+            self.client.generate_recipe(prompt, provider="gemini", api_keys={'gemini': self.gemini_api_key})
+        self.client.generate_recipe("a salad", provider="gemini", api_keys={'gemini': "second_key"})
+
+        self.assertEqual(mock_service_client.call_count, 2) # One client per distinct key
+        self.assertEqual(mock_model_instance.generate_content.call_count, 4)
+        self.assertEqual(len(self.client.gemini_models), 2)
+
+    def test_gemini_keys_never_cross_between_threads(self):
+        # Stubbed SDK: each service client remembers the key it was built with and the fake model
+        # answers with whatever key its bound client holds, after a random delay to force interleaving.
+        class FakeServiceClient:
+            def __init__(self, client_options):
+                self.api_key = client_options['api_key']
+
+        class FakeModel:
+            def __init__(self, model_name):
+                self._client = None
+
+            def generate_content(self, prompt):
+                time.sleep(random.uniform(0, 0.002))
+                key = self._client.api_key
+                text = f"Recipe Name: Recipe for {key}\nIngredients:\n{key}\nInstructions:\n1. Serve."
+                return SimpleNamespace(parts=[SimpleNamespace(text=text)], prompt_feedback=None)
+
+        client = LLMServiceClient(gemini_pool_size=3) # Fewer slots than keys, so models are evicted and rebuilt
+        keys = [f"user-{i}-key" for i in range(8)]
+        mismatches = []
+        lock = threading.Lock()
+
+        def worker(n):
+            key = keys[n % len(keys)]
+            result = client.generate_recipe(f"dish {n}", provider="gemini", api_keys={'gemini': key})
+            if result.get('name') != f"Recipe for {key}":
+                with lock:
+                    mismatches.append((key, result.get('name')))
+
+        with patch('app.llm_service.glm.GenerativeServiceClient', FakeServiceClient), \
+             patch('app.llm_service.genai.GenerativeModel', FakeModel), \
+             patch('app.llm_service.genai.configure', side_effect=AssertionError("global configure used")) as mock_configure, \
+             patch('builtins.print'):
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                list(pool.map(worker, range(800)))
+
+        mock_configure.assert_not_called()
+        self.assertEqual(mismatches, [])
+        self.assertLessEqual(len(client.gemini_models), 3)
+
+    # --- Tests for the response cache ---
+
+    def _hf_response(self, text=mock_hf_good_output):
+        mock_response = Mock()
+        mock_response.json.return_value = [{'generated_text': text}]
+        return mock_response
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_generate_recipe_cached_by_normalized_prompt(self, mock_post):
+        mock_post.return_value = self._hf_response()
+        self.client.configure_response_cache(memory_size=8, path=None)
+        api_keys = {'hugging_face': self.hf_api_key}
+
+        first = self.client.generate_recipe("Chicken  pasta ", provider="hugging_face", api_keys=api_keys)
+        second = self.client.generate_recipe("chicken pasta", provider="hugging_face", api_keys=api_keys)
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(self.client.cache_stats()['memory_hits'], 1)
+        self.assertEqual(self.client.cache_stats()['misses'], 1)
+
+        # The bypass flag asks the provider again and refreshes the stored answer
+        self.client.generate_recipe("chicken pasta", provider="hugging_face", api_keys=api_keys, use_cache=False)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(self.client.cache_stats()['stores'], 2)
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_generate_recipe_does_not_cache_failures(self, mock_post):
+        mock_post.return_value = self._hf_response("Just some unstructured text")
+        self.client.configure_response_cache(memory_size=8, path=None)
+        api_keys = {'hugging_face': self.hf_api_key}
+
+        for _ in range(2):
+            result = self.client.generate_recipe("soup", provider="hugging_face", api_keys=api_keys)
+            self.assertIn('error', result)
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(self.client.cache_stats()['stores'], 0)
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_modify_recipe_cache_keyed_on_original_recipe(self, mock_post):
+        mock_post.return_value = self._hf_response()
+        self.client.configure_response_cache(memory_size=8, path=None)
+        api_keys = {'hugging_face': self.hf_api_key}
+        original = {"name": "Soup", "description": "Warm", "ingredients": "Water", "instructions": "Boil"}
+
+        self.client.modify_recipe(original, "make it spicy", provider="hugging_face", api_keys=api_keys)
+        self.client.modify_recipe(dict(original), "Make it spicy", provider="hugging_face", api_keys=api_keys)
+        self.assertEqual(mock_post.call_count, 1)
+
+        edited = dict(original, ingredients="Water\nSalt")
+        self.client.modify_recipe(edited, "make it spicy", provider="hugging_face", api_keys=api_keys)
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('app.llm_service.requests.Session.post')
+    def test_response_cache_persists_across_clients(self, mock_post):
+        mock_post.return_value = self._hf_response()
+        api_keys = {'hugging_face': self.hf_api_key}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'llm_cache.sqlite3')
+            self.client.configure_response_cache(memory_size=8, path=path)
+            self.client.generate_recipe("a pasta dish", provider="hugging_face", api_keys=api_keys)
+            self.client.close()
+
+            restarted = LLMServiceClient()
+            restarted.configure_response_cache(memory_size=8, path=path)
+            result = restarted.generate_recipe("a pasta dish", provider="hugging_face", api_keys=api_keys)
+            restarted.close()
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(result['name'], "HF Test Pasta")
+        self.assertEqual(restarted.cache_stats()['persistent_hits'], 1)
+
+    def test_placeholder_and_missing_key_bypass_cache(self):
+        self.client.configure_response_cache(memory_size=8, path=None)
+        self.client.generate_recipe("a pasta dish", provider="placeholder")
+        self.client.generate_recipe("a pasta dish", provider="gemini", api_keys={})
+        self.assertEqual(self.client.cache_stats(), {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0, 'stores': 0})
+
 
 if __name__ == '__main__':
     unittest.main()
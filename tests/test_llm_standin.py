@@ -0,0 +1,105 @@
+import random
+import unittest
+from unittest.mock import patch
+
+from app.llm_service import LLMServiceClient
+from app.llm_standin import (StandInBehaviour, create_standin_app, parse_distribution, recipe_text,
+                             split_tokens, start_standin_server)
+
+
+class StandInHelpersTestCase(unittest.TestCase):
+    def test_parse_distribution(self):
+        rng = random.Random(1)
+        self.assertEqual(parse_distribution('fixed:1.5')(rng), 1.5)
+        self.assertTrue(all(0.5 <= parse_distribution('uniform:0.5,3')(rng) <= 3 for _ in range(50)))
+        self.assertGreaterEqual(min(parse_distribution('normal:0.1,5')(rng) for _ in range(50)), 0.0) # Never negative
+        lognormal = sorted(parse_distribution('lognormal:2,0.5')(rng) for _ in range(2001))
+        self.assertAlmostEqual(lognormal[1000], 2, delta=0.2) # Median as configured
+        for bad in ('gauss:1', 'fixed', 'uniform:1', 'fixed:abc'):
+            with self.assertRaises(ValueError):
+                parse_distribution(bad)
+
+    def test_canned_recipe_is_stable_per_prompt(self):
+        self.assertEqual(recipe_text("soup"), recipe_text("soup"))
+        self.assertTrue(recipe_text("soup").startswith("Recipe Name: Stand-in "))
+        self.assertIn("\n- ", recipe_text("soup", gemini_style=True))
+        self.assertEqual("".join(split_tokens(recipe_text("stew"))), recipe_text("stew"))
+
+
+class StandInEndpointsTestCase(unittest.TestCase):
+    def _client(self, **behaviour):
+        behaviour.setdefault('latency', 'fixed:0')
+        behaviour.setdefault('token_delay', 0)
+        return create_standin_app(StandInBehaviour(seed=1, **behaviour)).test_client()
+
+    def test_huggingface_shape(self):
+        client = self._client()
+        response = client.post('/models/mistralai/Mistral-7B-Instruct-v0.1', json={'inputs': 'soup'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0]['generated_text'], recipe_text('soup'))
+
+        response = client.post('/models/some-model', json={'inputs': 'soup', 'stream': True})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        body = response.get_data(as_text=True)
+        self.assertTrue(body.startswith('data: {"token": {"id": 0, "text": "Recipe "'))
+        self.assertIn('"special": true', body)
+
+    def test_huggingface_model_loading(self):
+        client = self._client(loading_seconds=60)
+        response = client.post('/models/m', json={'inputs': 'soup'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()['error'], "Model m is currently loading")
+        self.assertGreater(response.get_json()['estimated_time'], 50)
+
+        with patch('app.llm_standin.time.sleep') as mock_sleep:
+            response = client.post('/models/m', json={'inputs': 'soup', 'options': {'wait_for_model': True}})
+        self.assertEqual(response.status_code, 200) # Held until "loaded" instead
+        self.assertGreater(mock_sleep.call_args_list[0][0][0], 50)
+
+    def test_injected_errors_and_stats(self):
+        client = self._client(error_rate=1.0, error_status=503)
+        self.assertEqual(client.post('/models/m', json={'inputs': 'soup'}).status_code, 503)
+        response = client.post('/v1beta/models/gemini-pro:generateContent', json={'contents': []})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()['error']['status'], 'UNAVAILABLE')
+        stats = client.get('/stats').get_json()
+        self.assertEqual((stats['requests'], stats['errors']), (2, 2))
+
+    def test_gemini_shape(self):
+        client = self._client()
+        payload = {'contents': [{'role': 'user', 'parts': [{'text': 'salad'}]}]}
+        response = client.post('/v1beta/models/gemini-pro:generateContent', json=payload)
+        self.assertEqual(response.get_json()['candidates'][0]['content']['parts'][0]['text'],
+                         recipe_text('salad', gemini_style=True))
+        response = client.post('/v1beta/models/gemini-pro:streamGenerateContent', json=payload)
+        chunks = response.get_json() # A JSON array of partial responses
+        self.assertEqual("".join(c['candidates'][0]['content']['parts'][0]['text'] for c in chunks).rstrip("\n"),
+                         recipe_text('salad', gemini_style=True))
+        self.assertEqual(client.post('/v1beta/models/gemini-pro:embedContent', json=payload).status_code, 404)
+
+
+class StandInEndToEndTestCase(unittest.TestCase):
+    # Real HTTP from LLMServiceClient (requests for Hugging Face, the Gemini SDK's REST transport) to the stand-in
+    def setUp(self):
+        self.server, base_url = start_standin_server(StandInBehaviour(latency='fixed:0', token_delay=0, seed=1))
+        self.client = LLMServiceClient(hf_api_base_url=f"{base_url}/models", gemini_api_endpoint=base_url)
+        self.api_keys = {'gemini': 'standin-gemini', 'hugging_face': 'standin-hf'}
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+
+    def test_generate_and_stream_through_both_providers(self):
+        with patch('builtins.print'):
+            for provider in ('hugging_face', 'gemini'):
+                recipe = self.client.generate_recipe("soup", provider=provider, api_keys=self.api_keys, use_cache=False)
+                self.assertTrue(recipe['name'].startswith("Stand-in "), recipe)
+                self.assertTrue(recipe['is_ai_generated'])
+
+                events = list(self.client.stream_recipe("stew", provider=provider, api_keys=self.api_keys, use_cache=False))
+                self.assertEqual(events[-1][0], 'done', events[-1])
+                self.assertIn(('name', events[-1][1]['name']), events)
+
+
+if __name__ == '__main__':
+    unittest.main()
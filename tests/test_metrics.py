@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.metrics import MetricsRegistry, merge_snapshots, render_text
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def test_render_counters_gauges_and_histograms(self):
+        registry = MetricsRegistry()
+        requests = registry.counter('requests_total', 'Requests', ('endpoint',))
+        self.assertIs(registry.counter('requests_total', 'Requests', ('endpoint',)), requests) # Same name, same metric
+        requests.inc('index')
+        requests.inc('index', amount=2)
+        registry.gauge('queue_depth', 'Depth').set(4)
+        latency = registry.histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            latency.observe(value, 'a"b')
+
+        text = registry.render()
+        self.assertIn('# TYPE requests_total counter\nrequests_total{endpoint="index"} 3\n', text)
+        self.assertIn('queue_depth 4\n', text)
+        self.assertIn('latency_seconds_bucket{endpoint="a\\"b",le="0.1"} 1\n', text) # Escaped and cumulative
+        self.assertIn('latency_seconds_bucket{endpoint="a\\"b",le="1.0"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{endpoint="a\\"b",le="+Inf"} 4\n', text)
+        self.assertIn('latency_seconds_sum{endpoint="a\\"b"} 4.05\n', text)
+        self.assertIn('latency_seconds_count{endpoint="a\\"b"} 4\n', text)
+        with self.assertRaises(ValueError):
+            requests.inc()
+
+    def test_collectors_run_before_each_snapshot(self):
+        registry = MetricsRegistry()
+        gauge = registry.gauge('open_circuits', 'Open circuits')
+        state = {'open': 1}
+        registry.add_collector(lambda: gauge.set(state['open']))
+        registry.add_collector(lambda: 1 / 0) # Logged and skipped
+        self.assertIn('open_circuits 1\n', registry.render())
+        state['open'] = 0
+        self.assertIn('open_circuits 0\n', registry.render())
+
+    def test_merge_across_worker_snapshots(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = MetricsRegistry()
+        registry.configure_multiprocess(directory)
+        registry.counter('jobs_total', 'Jobs').inc(amount=2)
+        registry.gauge('busy', 'Busy workers', aggregate='sum').set(1)
+        registry.histogram('job_seconds', 'Job time', buckets=(1,)).observe(0.5)
+
+        # An exited worker: counters and histograms still count, its gauges don't
+        with open(os.path.join(directory, 'worker-999999999.json'), 'w') as f:
+            json.dump({'pid': 999999999, 'metrics': {
+                'jobs_total': {'type': 'counter', 'help': 'Jobs', 'labelnames': [], 'samples': [[[], 5]]},
+                'busy': {'type': 'gauge', 'help': 'Busy workers', 'labelnames': [], 'aggregate': 'sum', 'samples': [[[], 7]]},
+                'job_seconds': {'type': 'histogram', 'help': 'Job time', 'labelnames': [], 'buckets': [1],
+                                'samples': [[[], [0, 2, 6.0]]]}}}, f)
+        with open(os.path.join(directory, 'worker-1.json.tmp'), 'w') as f:
+            f.write('{partial') # In-progress writes are ignored
+
+        text = registry.render()
+        self.assertIn('jobs_total 7\n', text)
+        self.assertIn('busy 1\n', text)
+        self.assertIn('job_seconds_bucket{le="1.0"} 1\n', text)
+        self.assertIn('job_seconds_count 3\n', text)
+        self.assertIn('job_seconds_sum 6.5\n', text)
+        self.assertTrue(os.path.exists(os.path.join(directory, f'worker-{os.getpid()}.json')))
+
+    def test_live_gauges_merge_by_max_unless_summed(self):
+        pid = os.getpid()
+        gauge = lambda aggregate, value: {'pid': pid, 'metrics': {'g': {
+            'type': 'gauge', 'help': 'G', 'labelnames': [], 'aggregate': aggregate, 'samples': [[[], value]]}}}
+        self.assertIn('g 5\n', render_text(merge_snapshots([gauge('max', 2), gauge('max', 5)])))
+        self.assertIn('g 7\n', render_text(merge_snapshots([gauge('sum', 2), gauge('sum', 5)])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from app.query_budget import QueryBudgetExceeded, QueryRecorder, assert_max_queries, statement_shape
+
+
+class QueryBudgetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+
+    def test_statement_shape_masks_literals_and_in_lists(self):
+        self.assertEqual(statement_shape("SELECT * FROM recipe\n WHERE id = 42 AND name = 'it''s'"),
+                         "SELECT * FROM recipe WHERE id = ? AND name = ?")
+        self.assertEqual(statement_shape("SELECT * FROM t WHERE id IN (?, ?, ?) AND x = :x_1 AND y = %(y)s"),
+                         "SELECT * FROM t WHERE id IN (?...) AND x = ? AND y = ?")
+        self.assertEqual(statement_shape("SELECT anon_1.id FROM t AS anon_1"), "SELECT anon_1.id FROM t AS anon_1")
+
+    def test_recorder_counts_and_groups_repeats(self):
+        with QueryRecorder(self.engine) as outer:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                with QueryRecorder(self.engine) as inner:
+                    for n in range(3):
+                        conn.execute(text("SELECT :n"), {'n': n})
+        self.assertEqual((outer.count, inner.count), (4, 3))
+        self.assertEqual(outer.repeated(), [("SELECT ?", 4)])
+        self.assertIn("4x SELECT ?", outer.report())
+
+    def test_assert_max_queries(self):
+        with assert_max_queries(1, self.engine):
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        with self.assertRaises(QueryBudgetExceeded):
+            with assert_max_queries(1, self.engine):
+                with self.engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    conn.execute(text("SELECT 2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
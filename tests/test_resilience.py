@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import patch
+
+from app.resilience import (CLOSED, HALF_OPEN, OPEN, AdaptiveTimeout, CircuitBreaker, CircuitOpenError,
+                            ProviderGuards)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def _breaker(self):
+        return CircuitBreaker('test/model', window=10, failure_rate=0.5, min_calls=4, reset_timeout=30)
+
+    def test_opens_when_failure_rate_reached(self):
+        breaker = self._breaker()
+        with patch('builtins.print'):
+            for healthy in (True, False, True, False): # 2 of 4 failed
+                breaker.acquire()
+                breaker.record(healthy)
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.acquire()
+        self.assertGreater(raised.exception.retry_after, 29)
+        self.assertEqual(breaker.snapshot()['times_opened'], 1)
+
+    def test_needs_min_calls_before_opening(self):
+        breaker = self._breaker()
+        for _ in range(3):
+            breaker.record(False)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_abandoned_calls_are_not_counted(self):
+        breaker = self._breaker()
+        for _ in range(10):
+            breaker.record(None)
+        self.assertEqual(breaker.snapshot()['window_calls'], 0)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        breaker = self._breaker()
+        with patch('app.resilience.time.monotonic', return_value=100.0), patch('builtins.print'):
+            for _ in range(4):
+                breaker.record(False)
+        self.assertEqual(breaker.retry_after(), 0.0) # Real clock is far past the simulated opening
+
+        with patch('app.resilience.time.monotonic', return_value=131.0), patch('builtins.print'):
+            self.assertEqual(breaker.state, HALF_OPEN)
+            self.assertTrue(breaker.acquire()) # The single probe
+            with self.assertRaises(CircuitOpenError):
+                breaker.acquire() # Everyone else still fails fast
+            breaker.record(False, probe=True)
+            self.assertEqual(breaker.state, OPEN)
+
+        with patch('app.resilience.time.monotonic', return_value=162.0), patch('builtins.print'):
+            self.assertTrue(breaker.acquire())
+            breaker.record(True, probe=True)
+            self.assertEqual(breaker.state, CLOSED)
+            self.assertFalse(breaker.acquire())
+
+    def test_abandoned_probe_frees_its_slot(self):
+        breaker = self._breaker()
+        with patch('app.resilience.time.monotonic', return_value=100.0), patch('builtins.print'):
+            for _ in range(4):
+                breaker.record(False)
+        with patch('app.resilience.time.monotonic', return_value=131.0):
+            self.assertTrue(breaker.acquire())
+            breaker.record(None, probe=True)
+            self.assertTrue(breaker.acquire())
+
+
+class AdaptiveTimeoutTestCase(unittest.TestCase):
+    def test_uses_maximum_until_enough_samples(self):
+        timeout = AdaptiveTimeout(minimum=1, maximum=45, min_samples=5)
+        for _ in range(4):
+            timeout.observe(2.0)
+        self.assertEqual(timeout.current(), 45)
+        timeout.observe(2.0)
+        self.assertEqual(timeout.current(), 3.0) # 2s p99 x 1.5
+
+    def test_follows_tail_latency_within_bounds(self):
+        timeout = AdaptiveTimeout(minimum=5, maximum=45, quantile=0.9, multiplier=2, min_samples=10)
+        for seconds in [1.0] * 9 + [4.0]:
+            timeout.observe(seconds)
+        self.assertEqual(timeout.current(), 8.0)
+        timeout.observe(100.0)
+        timeout.observe(100.0)
+        self.assertEqual(timeout.current(), 45) # Clamped to the ceiling
+
+        fast = AdaptiveTimeout(minimum=5, maximum=45, min_samples=1)
+        fast.observe(0.1)
+        self.assertEqual(fast.current(), 5) # and to the floor
+
+
+class ProviderGuardsTestCase(unittest.TestCase):
+    def test_one_guard_per_provider_and_model(self):
+        guards = ProviderGuards(breaker={'min_calls': 1}, timeout={'maximum': 20})
+        guard = guards.get('gemini', 'gemini-pro')
+        self.assertIs(guards.get('gemini', 'gemini-pro'), guard)
+        self.assertIsNot(guards.get('hugging_face', 'mistral'), guard)
+
+        guard.record(True, latency=1.5)
+        with patch('builtins.print'):
+            guards.get('hugging_face', 'mistral').record(False)
+        snapshot = guards.snapshot()
+        self.assertEqual(snapshot['gemini/gemini-pro']['state'], CLOSED)
+        self.assertEqual(snapshot['gemini/gemini-pro']['samples'], 1)
+        self.assertEqual(snapshot['gemini/gemini-pro']['timeout'], 20)
+        self.assertEqual(snapshot['hugging_face/mistral']['state'], OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()